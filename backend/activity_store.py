@@ -0,0 +1,253 @@
+"""Local SQLite store of activities with incremental sync from Garmin Connect."""
+
+import datetime
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Path of the SQLite database, the store is disabled when unset
+ACTIVITY_STORE_PATH = os.getenv("ACTIVITY_STORE_PATH")
+# Minimum seconds between two incremental syncs of the same account
+ACTIVITY_SYNC_INTERVAL = float(os.getenv("ACTIVITY_SYNC_INTERVAL", "60"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS activities (
+    display_name TEXT NOT NULL,
+    activity_id INTEGER NOT NULL,
+    start_time_gmt TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (display_name, activity_id)
+);
+CREATE INDEX IF NOT EXISTS activities_by_start
+    ON activities (display_name, start_time_gmt DESC, activity_id DESC);
+CREATE TABLE IF NOT EXISTS sync_state (
+    display_name TEXT PRIMARY KEY,
+    backfill_complete INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class ActivityStore:
+    """
+    Activities keyed by account display name and activity id.
+
+    Past activities never change upstream, so the store only pulls activities
+    newer than the newest one it already holds, and backfills older ones on
+    demand when a caller asks for more than it has.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        sync_interval: float = ACTIVITY_SYNC_INTERVAL,
+        page_size: int = 100,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.page_size = page_size
+        self._timer = timer
+        self._local = threading.local()
+        self._last_sync: Dict[str, float] = {}
+        self._account_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the SQLite connection owned by the calling thread of the calling process."""
+        conn = getattr(self._local, "conn", None)
+        # A connection inherited through fork must not be used by the child
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _account_lock(self, display_name: str) -> threading.Lock:
+        with self._lock:
+            return self._account_locks.setdefault(display_name, threading.Lock())
+
+    def count(self, display_name: str) -> int:
+        """Return the number of stored activities for an account."""
+        row = (
+            self._connection()
+            .execute("SELECT COUNT(*) FROM activities WHERE display_name = ?", (display_name,))
+            .fetchone()
+        )
+        return row[0]
+
+    def newest_start_time(self, display_name: str) -> Optional[str]:
+        """Return the startTimeGMT of the newest stored activity for an account."""
+        row = (
+            self._connection()
+            .execute(
+                "SELECT MAX(start_time_gmt) FROM activities WHERE display_name = ?",
+                (display_name,),
+            )
+            .fetchone()
+        )
+        return row[0]
+
+    def oldest_key(self, display_name: str) -> Optional[Tuple[str, int]]:
+        """Return the startTimeGMT and id of the oldest stored activity for an account."""
+        return (
+            self._connection()
+            .execute(
+                "SELECT start_time_gmt, activity_id FROM activities WHERE display_name = ?"
+                " ORDER BY start_time_gmt, activity_id LIMIT 1",
+                (display_name,),
+            )
+            .fetchone()
+        )
+
+    def is_backfill_complete(self, display_name: str) -> bool:
+        """Check whether the whole activity history of an account is stored."""
+        row = (
+            self._connection()
+            .execute(
+                "SELECT backfill_complete FROM sync_state WHERE display_name = ?",
+                (display_name,),
+            )
+            .fetchone()
+        )
+        return bool(row and row[0])
+
+    def add(self, display_name: str, activities: Iterable[Dict[str, Any]]) -> int:
+        """Store activities, skipping ones already present, and return how many were new."""
+        rows = [
+            (display_name, a["activityId"], a["startTimeGMT"], json.dumps(a)) for a in activities
+        ]
+        with self._connection() as conn:
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO activities"
+                " (display_name, activity_id, start_time_gmt, payload) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+        return cursor.rowcount
+
+    def _mark_backfill_complete(self, display_name: str) -> None:
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (display_name, backfill_complete) VALUES (?, 1)",
+                (display_name,),
+            )
+
+    def _pull(
+        self, display_name: str, activities: Iterator[Dict[str, Any]], stop=None
+    ) -> Tuple[int, int]:
+        """
+        Store activities in page-sized batches until 'stop' matches.
+        :return: Number of activities read and number of them that were new
+        """
+        read = added = 0
+        batch = []
+        for activity in activities:
+            if stop and stop(activity):
+                break
+            batch.append(activity)
+            read += 1
+            if len(batch) >= self.page_size:
+                added += self.add(display_name, batch)
+                batch = []
+        if batch:
+            added += self.add(display_name, batch)
+        return read, added
+
+    def _backfill(self, garmin, display_name: str, wanted: int) -> int:
+        """
+        Store up to 'wanted' activities older than the oldest stored one.
+        Pages back from that activity's day instead of using the stored count as an upstream
+        offset, which activities deleted or uploaded since the last sync would shift.
+        :return: Number of activities that were new
+        """
+        oldest = self.oldest_key(display_name)
+        end_date = None
+        if oldest is not None:
+            # Garmin filters on the local day, which is at most a day past the GMT one
+            day = datetime.date.fromisoformat(oldest[0][:10]) + datetime.timedelta(days=1)
+            end_date = day.isoformat()
+        older = (
+            activity
+            for activity in garmin.iter_activities(page_size=self.page_size, end_date=end_date)
+            if oldest is None or (activity["startTimeGMT"], activity["activityId"]) < oldest
+        )
+        read, added = self._pull(display_name, itertools.islice(older, wanted))
+        if read < wanted:
+            self._mark_backfill_complete(display_name)
+        return added
+
+    def sync(self, garmin, display_name: str, minimum: int = 0) -> int:
+        """
+        Bring the stored activities of an account up to date.
+        :param garmin: Logged-in GarminClient of the account
+        :param display_name: Display name of the account
+        :param minimum: Backfill older activities until at least this many are stored
+        :return: Number of activities pulled from Garmin
+        """
+        with self._account_lock(display_name):
+            pulled = 0
+            newest = self.newest_start_time(display_name)
+            last_sync = self._last_sync.get(display_name)
+            due = last_sync is None or self._timer() - last_sync >= self.sync_interval
+
+            if due:
+                # An empty store is filled by the backfill below unless the history is empty
+                if newest is not None or self.is_backfill_complete(display_name):
+                    # Newest activities come first, stop at the first one older than the store
+                    _, added = self._pull(
+                        display_name,
+                        garmin.iter_activities(page_size=min(self.page_size, 20)),
+                        stop=lambda a: newest is not None and a["startTimeGMT"] < newest,
+                    )
+                    pulled += added
+                self._last_sync[display_name] = self._timer()
+
+            stored = self.count(display_name)
+            if stored < minimum and not self.is_backfill_complete(display_name):
+                pulled += self._backfill(garmin, display_name, minimum - stored)
+
+            if pulled:
+                logger.info(f"Synced {pulled} activities for {display_name}")
+            return pulled
+
+    def iter_payloads(self, display_name: str, num: int) -> Iterator[str]:
+        """Yield the JSON payloads of the 'num' newest stored activities."""
+        cursor = self._connection().execute(
+            "SELECT payload FROM activities WHERE display_name = ?"
+            " ORDER BY start_time_gmt DESC, activity_id DESC LIMIT ?",
+            (display_name, num),
+        )
+        for (payload,) in cursor:
+            yield payload
+
+    def read_payloads(
+        self, display_name: str, num: int, after: Optional[Tuple[str, int]] = None
+    ) -> Tuple[List[str], Optional[Tuple[str, int]]]:
+        """
+        Read the JSON payloads of the 'num' newest stored activities older than 'after'.
+        Each call is a query of its own, so pages can be read from different threads.
+        :return: The payloads and the key to pass as 'after' to read the next page
+        """
+        query = "SELECT start_time_gmt, activity_id, payload FROM activities WHERE display_name = ?"
+        params: Tuple[Any, ...] = (display_name,)
+        if after is not None:
+            query += " AND (start_time_gmt, activity_id) < (?, ?)"
+            params += after
+        query += " ORDER BY start_time_gmt DESC, activity_id DESC LIMIT ?"
+        rows = self._connection().execute(query, params + (num,)).fetchall()
+        last = (rows[-1][0], rows[-1][1]) if rows else after
+        return [payload for _, _, payload in rows], last
+
+
+activity_store = ActivityStore(ACTIVITY_STORE_PATH) if ACTIVITY_STORE_PATH else None
@@ -0,0 +1,170 @@
+"""
+Admission control and load shedding of the requests served.
+
+Each request holds a slot of its route and one of its account, identified by
+its Authorization header, while it is handled. When either has none free the
+request waits in a bounded queue, for ADMISSION_QUEUE_TIMEOUT seconds at most
+and never past its deadline; once the queue is full or the wait runs out it is
+shed with a 503 and Retry-After. A burst against a slow upstream therefore
+fails fast instead of piling up workers, and one account cannot take every
+slot of a route. The queue lives on the event loop, so waiting requests hold
+no thread.
+"""
+
+import asyncio
+import os
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Hashable, Optional, Tuple
+
+# Requests handled at once per route (0 disables the limit)
+ADMISSION_ROUTE_LIMIT = int(os.getenv("ADMISSION_ROUTE_LIMIT", "32"))
+# Per-route overrides as comma-separated path=limit pairs
+ADMISSION_ROUTE_LIMITS = os.getenv("ADMISSION_ROUTE_LIMITS", "/activities/export=4")
+# Requests handled at once per account (0 disables the limit)
+ADMISSION_ACCOUNT_LIMIT = int(os.getenv("ADMISSION_ACCOUNT_LIMIT", "8"))
+# Requests waiting for a slot at once; further ones are shed right away
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "64"))
+# Longest a request waits for a slot before it is shed
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "1"))
+
+# Seconds shed clients are asked to wait before retrying
+RETRY_AFTER = 1
+
+# Served ahead of everything else, without taking a slot
+PRIORITY_PATHS = ("/health", "/metrics")
+# Long-lived event streams; their shared upstream polling is bounded by the feed instead
+EXEMPT_PATHS = PRIORITY_PATHS + ("/activities/stream",)
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed instead of admitted."""
+
+    def __init__(self, message: str, retry_after: float = RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_route_limits(value: Optional[str]) -> Dict[str, int]:
+    """Parse 'path=limit' pairs separated by commas, e.g. '/activities/export=4'."""
+    limits = {}
+    for pair in (value or "").split(","):
+        path, _, limit = pair.partition("=")
+        if path.strip() and limit.strip():
+            limits[path.strip()] = int(limit)
+    return limits
+
+
+class AdmissionController:
+    """Concurrency limits per route and per account, with a bounded queue of waiting requests."""
+
+    def __init__(
+        self,
+        route_limit: int = ADMISSION_ROUTE_LIMIT,
+        account_limit: int = ADMISSION_ACCOUNT_LIMIT,
+        queue_size: int = ADMISSION_QUEUE_SIZE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+        route_limits: Optional[Dict[str, int]] = None,
+    ):
+        """
+        Initialize the controller.
+        :param route_limits: Limits of particular routes, overriding 'route_limit'
+        """
+        self.route_limit = route_limit
+        self.account_limit = account_limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.route_limits = route_limits or {}
+        self._routes: Dict[str, int] = {}
+        self._accounts: Dict[Hashable, int] = {}
+        self._waiters: Deque[Tuple[str, Optional[Hashable], asyncio.Future]] = deque()
+
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+
+    def _fits(self, route: str, account: Optional[Hashable]) -> bool:
+        limit = self.route_limits.get(route, self.route_limit)
+        if limit > 0 and self._routes.get(route, 0) >= limit:
+            return False
+        if account is None or self.account_limit <= 0:
+            return True
+        return self._accounts.get(account, 0) < self.account_limit
+
+    def _take(self, route: str, account: Optional[Hashable]) -> None:
+        self._routes[route] = self._routes.get(route, 0) + 1
+        if account is not None:
+            self._accounts[account] = self._accounts.get(account, 0) + 1
+
+    def _release(self, route: str, account: Optional[Hashable]) -> None:
+        """Free a slot and hand it to the first waiting requests that now fit."""
+        for counts, key in ((self._routes, route), (self._accounts, account)):
+            if key is None:
+                continue
+            counts[key] -= 1
+            if not counts[key]:
+                del counts[key]
+        for waiter in list(self._waiters):
+            waiting_route, waiting_account, future = waiter
+            if not future.done() and self._fits(waiting_route, waiting_account):
+                self._take(waiting_route, waiting_account)
+                future.set_result(None)
+                self._waiters.remove(waiter)
+
+    async def _wait(self, route: str, account: Optional[Hashable], timeout: float) -> None:
+        """Queue for a slot, which _release takes on the request's behalf."""
+        if len(self._waiters) >= self.queue_size or timeout <= 0:
+            raise Overloaded("Too many requests, try again shortly")
+        waiter = (route, account, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(waiter[2], timeout)
+        except asyncio.TimeoutError:
+            raise Overloaded("Too many requests, try again shortly") from None
+        except BaseException:
+            # Cancelled, e.g. by a client disconnect, possibly right after a slot was granted
+            if waiter[2].done() and not waiter[2].cancelled():
+                self._release(route, account)
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    @asynccontextmanager
+    async def admit(
+        self, route: str, account: Optional[Hashable], deadline: Optional[float] = None
+    ) -> AsyncIterator[None]:
+        """
+        Hold a slot of 'route' and 'account' for the block.
+        :param deadline: Seconds left before the request's deadline, which caps the wait
+        :raise Overloaded: When the request is shed
+        """
+        # Freed slots go to waiting requests first, so one that fits jumps no queue
+        if self._fits(route, account):
+            self._take(route, account)
+        else:
+            timeout = self.queue_timeout if deadline is None else min(self.queue_timeout, deadline)
+            try:
+                await self._wait(route, account, timeout)
+            except Overloaded:
+                self.shed += 1
+                raise
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self._release(route, account)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the counters of admitted, queued and shed requests and the current load."""
+        return {
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": self.shed,
+            "waiting": len(self._waiters),
+            "active": sum(self._routes.values()),
+        }
+
+
+admission = AdmissionController(route_limits=parse_route_limits(ADMISSION_ROUTE_LIMITS))
@@ -1,9 +1,62 @@
-from flask import Flask, request, jsonify
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, request, jsonify
+from werkzeug.datastructures import Headers
+from werkzeug.test import EnvironBuilder
 from garmin_client import GarminClient, GarminConnectAuthenticationError
 from flask_cors import CORS
-import base64
+import deadline
+from activity_store import activity_store
+from admission import admission
+from batch import BATCH_CONCURRENCY, SubResponse, batch_body, parse_batch
+from compression import COMPRESS_MIN_SIZE, choose_encoding, compress, iter_compressed
+from feed import FEED_HEARTBEAT, KEEPALIVE, RETRY_MS, activity_feed
+from export import EXPORT_MAX_ACTIVITIES, iter_zip, parse_format, parse_ids, select_activity_ids
+from filters import filter_activities, parse_filter
+from formats import COLUMNAR, FORMATS, encode_columns, negotiate_format, to_columns
+from json_provider import FastJSONProvider
+from metrics import CallbackMetric, WSGIMetrics, http_requests_in_flight, registry
+from projection import parse_fields, project
+from sessions import (
+    TOKEN_REFRESH_MARGIN,
+    auth_cache,
+    refreshed_tokenstore,
+    session_cache,
+    token_key,
+    token_refresher,
+)
+from shared_cache import SharedTTLCache, shared_store
+from singleflight import upstream_flight
+from stats import (
+    aggregate,
+    load_months,
+    months_between,
+    parse_group,
+    parse_percentiles,
+    parse_period,
+    stats_cache,
+)
+from summaries import (
+    columnar,
+    fetch_summaries,
+    parse_date_range,
+    parse_summary_fields,
+    summary_cache,
+)
+from throttle import (
+    DeadlineExceeded,
+    UpstreamUnavailable,
+    deadline_passed,
+    timed_out,
+    upstream_policy,
+)
+from transport import shared_transport
+import hashlib
 import json
 import logging
+import math
+import os
+import queue
+import time
 
 # Configure logging
 logging.basicConfig(
@@ -12,17 +65,194 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Response header carrying a refreshed tokenstore that clients should swap in
+TOKENSTORE_HEADER = "X-Garmin-Tokenstore"
+# Activities requested per upstream call when paging through large lists
+ACTIVITY_PAGE_SIZE = int(os.getenv("ACTIVITY_PAGE_SIZE", "100"))
+# Pages fetched in parallel ahead of the streamed response
+ACTIVITY_FETCH_CONCURRENCY = int(os.getenv("ACTIVITY_FETCH_CONCURRENCY", "4"))
+# Seconds a serialized activity response is reused for the same token and query
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
+app.wsgi_app = WSGIMetrics(app.wsgi_app)
 # Configure CORS with more specific settings for security
 CORS(
     app,
     resources={r"/*": {"origins": "*"}},  # In production, specify allowed origins
     supports_credentials=True,
-    methods=["GET", "POST", "OPTIONS"],
+    methods=["GET", "POST", "DELETE", "OPTIONS"],
+    expose_headers=[TOKENSTORE_HEADER],
+)
+
+# Serialized responses with their ETag, keyed by token hash, route and query string
+response_cache = SharedTTLCache(
+    "response",
+    shared_store,
+    maxsize=RESPONSE_CACHE_SIZE,
+    ttl=RESPONSE_CACHE_TTL,
+    owner=lambda key: key[0],
 )
 
-# In-memory token store
-active_tokens = {}
+
+# Caches whose statistics are exported on /metrics
+caches = {
+    "session": session_cache,
+    "auth": auth_cache,
+    "response": response_cache,
+    "summary": summary_cache,
+    "stats": stats_cache,
+}
+
+
+def cache_stats(*fields):
+    """Collect 'fields' of the cache statistics for /metrics."""
+    for name, cache in caches.items():
+        stats = cache.stats()
+        for field in fields:
+            # Only the shared caches count hits answered by another worker
+            if field in stats:
+                yield (name, field), stats[field]
+
+
+def pool_stats(*fields):
+    """Collect 'fields' of the upstream connection pool statistics for /metrics."""
+    for host, stats in shared_transport.stats()["hosts"].items():
+        for field in fields:
+            yield (host, field), stats[field]
+
+
+CallbackMetric(
+    registry,
+    "gconnect_cache_entries",
+    "Entries held by each in-memory cache.",
+    ("cache",),
+    lambda: (((name,), len(cache)) for name, cache in caches.items()),
+)
+CallbackMetric(
+    registry,
+    "gconnect_cache_operations_total",
+    "Hits, misses, evictions and expirations of each cache, and hits served by the shared one.",
+    ("cache", "result"),
+    lambda: cache_stats("hits", "misses", "evictions", "expirations", "shared_hits"),
+    type="counter",
+)
+CallbackMetric(
+    registry,
+    "gconnect_admission_requests",
+    "Requests being handled and waiting for a slot under admission control.",
+    ("state",),
+    lambda: (((state,), admission.stats()[state]) for state in ("active", "waiting")),
+)
+CallbackMetric(
+    registry,
+    "gconnect_upstream_pool_connections",
+    "Pooled connections to Garmin Connect that are checked out or idle, by host.",
+    ("host", "state"),
+    lambda: pool_stats("in_use", "idle"),
+)
+CallbackMetric(
+    registry,
+    "gconnect_upstream_pool_operations_total",
+    "Connections opened and requests sent by the upstream pools, by host.",
+    ("host", "operation"),
+    lambda: pool_stats("connections_created", "requests"),
+    type="counter",
+)
+CallbackMetric(
+    registry,
+    "gconnect_upstream_flight_calls_total",
+    "Upstream reads made, and reads that shared an identical in-flight call.",
+    ("result",),
+    lambda: (((field,), upstream_flight.stats()[field]) for field in ("calls", "coalesced")),
+    type="counter",
+)
+CallbackMetric(
+    registry,
+    "gconnect_upstream_circuit_open",
+    "1 while the circuit breaker rejects Garmin Connect calls, 0.5 while probing, else 0.",
+    (),
+    lambda: [((), {"open": 1, "half_open": 0.5}.get(upstream_policy.breaker.state, 0))],
+)
+CallbackMetric(
+    registry,
+    "gconnect_upstream_flight_in_flight",
+    "Upstream reads currently in flight through the single-flight group.",
+    (),
+    lambda: [((), upstream_flight.stats()["in_flight"])],
+)
+CallbackMetric(
+    registry,
+    "gconnect_feed_streams",
+    "Open /activities/stream connections, and the accounts their shared pollers watch.",
+    ("kind",),
+    lambda: [
+        (("subscribers",), activity_feed.subscribers()),
+        (("accounts",), activity_feed.accounts()),
+    ],
+)
+
+
+@app.before_request
+def track_request():
+    """Mark the request as in flight under its route for WSGIMetrics."""
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    request.environ[WSGIMetrics.ROUTE_KEY] = route
+    http_requests_in_flight.inc(route)
+
+
+@app.before_request
+def start_deadline():
+    """Give the request its deadline, unless the ASGI server did when admitting it."""
+    if deadline.remaining() is None:
+        deadline.start(deadline.request_timeout(request.headers.get(deadline.TIMEOUT_HEADER)))
+
+
+@app.teardown_request
+def lift_deadline(error=None):
+    """Lift the deadline before a streamed body is produced, which it does not cover."""
+    deadline.clear()
+
+
+@app.after_request
+def send_refreshed_tokenstore(response):
+    """Hand the client the tokenstore its session was refreshed to, so it can swap it in."""
+    tokenstore = bearer_refreshed_tokenstore(request.headers.get("Authorization"))
+    if tokenstore:
+        response.headers[TOKENSTORE_HEADER] = tokenstore
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    """Compress JSON and MessagePack bodies with the encoding the client prefers."""
+    if response.status_code != 200 or "Content-Encoding" in response.headers:
+        return response
+    encoding = choose_encoding(request.headers.get("Accept-Encoding"), response.mimetype)
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = iter_compressed(response.response, encoding)
+    elif response.content_length is not None and response.content_length >= COMPRESS_MIN_SIZE:
+        response.set_data(compress(response.get_data(), encoding))
+    else:
+        return response
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # The compressed body is a different representation of the same content
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def bearer_refreshed_tokenstore(header):
+    """Return the refreshed tokenstore for an Authorization header, if its session has one."""
+    if not header or not header.startswith("Bearer "):
+        return None
+    return refreshed_tokenstore(header.replace("Bearer ", "", 1))
 
 
 def init_api_reuse(email, password):
@@ -35,10 +265,43 @@ def init_api_reuse(email, password):
         logger.error(f"Authentication error: {e}")
         return None
     except Exception as e:
+        if timed_out(e) and deadline_passed():
+            # Not a failed login: the request ran out of time during the SSO handshake
+            raise DeadlineExceeded() from e
         logger.error(f"Unexpected error during authentication: {e}")
         return None
 
 
+def login_with_credentials(email, password):
+    """
+    Log in with credentials and return the tokenstore.
+    A repeated login within AUTH_CACHE_TTL returns the token of the session the first one
+    created, refreshed if it is about to expire, instead of going through Garmin SSO again.
+    """
+    session = auth_cache.get_session(email, password)
+    if session is not None:
+        try:
+            session_cache.refresh_session(session, TOKEN_REFRESH_MARGIN)
+            session.last_used = time.monotonic()
+            token_refresher.start()
+            return session.tokenstore
+        except Exception as e:
+            logger.warning(f"Cached login could not be refreshed, logging in again: {e}")
+            auth_cache.invalidate(email, password)
+
+    def login():
+        garmin = init_api_reuse(email, password)
+        if not garmin:
+            return None
+        tokenstore = garmin.garth.dumps()  # Base64-encoded token
+        auth_cache.add_login(email, password, session_cache.add_session(tokenstore, garmin))
+        token_refresher.start()
+        return tokenstore
+
+    # Concurrent logins with the same credentials share one SSO handshake
+    return upstream_flight.do(("auth", auth_cache.credential_key(email, password)), login)
+
+
 def login_with_token(header):
     """Log a Garmin instance using base64-encoded tokenstore."""
     try:
@@ -47,14 +310,143 @@ def login_with_token(header):
             return None
 
         tokenstore = header.replace("Bearer ", "", 1)
-        garmin = GarminClient()
+        session = session_cache.get_session(tokenstore)
+        if session:
+            return session.client
+
+        # A session another worker process created is reused with its profile and token
+        session = session_cache.restore_session(tokenstore)
+        if session:
+            token_refresher.start()
+            return session.client
+
+        garmin = GarminClient(lazy_profile=True)
         garmin.login(tokenstore)
+        session_cache.add_session(tokenstore, garmin)
+        token_refresher.start()
         return garmin
     except Exception as e:
         logger.error(f"Error during login with token: {e}")
         return None
 
 
+def response_cache_key(route, auth_header=None, args=None):
+    """Build the response cache key for the current request or the given header and args."""
+    if auth_header is None:
+        auth_header = request.headers.get("Authorization", "")
+    if args is None:
+        args = request.args.items(multi=True)
+    return token_key(auth_header), route, tuple(sorted(args))
+
+
+def body_etag(body):
+    """Return the ETag of a serialized response body, text or binary."""
+    if isinstance(body, str):
+        body = body.encode()
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def json_response(body, etag, mimetype="application/json"):
+    """Build a response that clients revalidate, answering 304 when their ETag matches."""
+    response = app.response_class(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def cached_response(route):
+    """Return the cached response for the current request, if any."""
+    cached = response_cache.get(response_cache_key(route))
+    if cached is None:
+        return None
+    return json_response(*cached)
+
+
+def cache_body(key, body, mimetype="application/json"):
+    """Cache a serialized body of type 'mimetype' under 'key' and return its ETag."""
+    etag = body_etag(body)
+    response_cache.set(key, (body, etag, mimetype))
+    return etag
+
+
+def cache_response(route, data=None, body=None, mimetype="application/json"):
+    """Serialize 'data' (unless 'body' is already serialized), cache it and build the response."""
+    if body is None:
+        body = app.json.dumps(data)
+    etag = cache_body(response_cache_key(route), body, mimetype)
+    return json_response(body, etag, mimetype)
+
+
+def upstream_unavailable(error):
+    """
+    Build the response telling clients when to retry an unavailable upstream,
+    a 503, or a 504 when the request ran out of time.
+    """
+    logger.warning(f"Garmin Connect unavailable: {error}")
+    response = jsonify({"error": str(error)})
+    response.status_code = error.status
+    response.headers["Retry-After"] = str(max(math.ceil(error.retry_after), 1))
+    return response
+
+
+def activity_format():
+    """Return the activity list format the client asked for with 'format' or Accept."""
+    return negotiate_format(request.args.get("format"), request.accept_mimetypes)
+
+
+def activity_filter():
+    """Return the filter the client asked for with 'type', 'startDate' and 'endDate', if any."""
+    args = request.args
+    return parse_filter(args.get("type"), args.get("startDate"), args.get("endDate"))
+
+
+def activities_route(name):
+    """Return the response cache route of activity lists in format 'name'."""
+    return "activities" if name == "json" else f"activities.{name}"
+
+
+@app.after_request
+def vary_on_accept(response):
+    """Activity lists are negotiated on Accept, so caches must keep one copy per value."""
+    if request.url_rule is not None and request.url_rule.rule == "/activities":
+        response.vary.add("Accept")
+    return response
+
+
+def stream_activities(activities, ndjson=False, serialized=False):
+    """
+    Stream activities as a JSON array or as NDJSON.
+    The first activity is fetched eagerly so upstream errors still produce a 500.
+    Pass serialized=True when 'activities' already yields JSON strings.
+    """
+    encode = str if serialized else app.json.dumps
+    first = next(activities, None)
+
+    def generate():
+        try:
+            if ndjson:
+                if first is not None:
+                    yield encode(first) + "\n"
+                for activity in activities:
+                    yield encode(activity) + "\n"
+                return
+
+            if first is None:
+                yield "[]"
+                return
+            yield "[" + encode(first)
+            for activity in activities:
+                yield "," + encode(activity)
+            yield "]"
+        except Exception as e:
+            logger.error(f"Error streaming activities: {e}")
+            raise
+
+    mimetype = "application/x-ndjson" if ndjson else "application/json"
+    return Response(generate(), mimetype=mimetype)
+
+
 @app.route("/auth", methods=["POST"])
 def auth():
     """
@@ -71,28 +463,108 @@ def auth():
     if not email or not password:
         return jsonify({"error": "Email and password are required"}), 400
 
-    garmin = init_api_reuse(email, password)
-    if not garmin:
+    try:
+        tokenstore = login_with_credentials(email, password)
+    except UpstreamUnavailable as e:
+        return upstream_unavailable(e)
+    if not tokenstore:
         return jsonify({"error": "Authentication failed"}), 401
 
-    tokenstore = garmin.garth.dumps()  # Base64-encoded token
     return jsonify({"token": tokenstore})
 
 
+@app.route("/auth", methods=["DELETE"])
+def logout():
+    """
+    Forget the session of the bearer token, so a later login goes through Garmin SSO again,
+    and the responses cached for it, so they are no longer served to it.
+    """
+    auth_header = request.headers.get("Authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        return jsonify({"error": "Authorization header is required"}), 401
+
+    session_cache.invalidate(auth_header.replace("Bearer ", "", 1))
+    response_cache.purge(token_key(auth_header))
+    return "", 204
+
+
+def dispatch(sub_request, auth_header):
+    """Run a batched GET through the whole WSGI app, so it is measured like any request."""
+    environ = EnvironBuilder(
+        path=sub_request.path,
+        query_string=sub_request.query_string,
+        headers={"Authorization": auth_header, "Accept": "application/json"},
+    ).get_environ()
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = Headers(headers)
+
+    body = app.wsgi_app(environ, start_response)
+    try:
+        data = b"".join(body)
+    finally:
+        close = getattr(body, "close", None)
+        if close is not None:
+            close()
+    mimetype = started["headers"].get("Content-Type", "").split(";", 1)[0]
+    return SubResponse(started["status"], mimetype, data)
+
+
+@app.route("/batch", methods=["POST"])
+def batch():
+    """
+    Run several GET requests with one login and one round trip.
+    The JSON body lists them as {"requests": [{"id": ..., "path": ..., "params": {...}}]};
+    the response holds the status and body of each, in order.
+    """
+    auth_header = request.headers.get("Authorization")
+    if not auth_header:
+        return jsonify({"error": "Authorization header is required"}), 401
+
+    try:
+        sub_requests = parse_batch(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Logging in caches the session, which every sub-request then reuses
+    if not login_with_token(auth_header):
+        return jsonify({"error": "Invalid or expired token"}), 401
+
+    workers = max(min(BATCH_CONCURRENCY, len(sub_requests)), 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        responses = list(
+            executor.map(deadline.bound(lambda item: dispatch(item, auth_header)), sub_requests)
+        )
+    body = batch_body(sub_requests, responses, app.json.dumps)
+    return app.response_class(body, mimetype="application/json")
+
+
 @app.route("/activities/latest", methods=["GET"])
 def latest_activity():
-    """Get the latest activity details."""
+    """
+    Get the latest activity details.
+    Query param 'fields' selects a subset of fields, the full activity is returned by default.
+    """
     auth_header = request.headers.get("Authorization")
     if not auth_header:
         return jsonify({"error": "Authorization header is required"}), 401
 
+    cached = cached_response("latest")
+    if cached is not None:
+        return cached
+
     garmin = login_with_token(auth_header)
     if not garmin:
         return jsonify({"error": "Invalid or expired token"}), 401
 
     try:
+        fields = parse_fields(request.args.get("fields"))
         latest_activity = garmin.get_last_activity()
-        return jsonify(latest_activity)
+        return cache_response("latest", project(latest_activity, fields))
+    except UpstreamUnavailable as e:
+        return upstream_unavailable(e)
     except Exception as e:
         logger.error(f"Error retrieving latest activity: {e}")
         return jsonify({"error": str(e)}), 500
@@ -103,32 +575,341 @@ def get_activities():
     """
     Get a list of activities.
     Query param 'num' determines the number of activities to fetch.
+    Query param 'fields' selects the returned fields, 'summary' by default and 'all'
+    for the full activities.
+    Query param 'format' or the Accept header selects a JSON array (default), NDJSON,
+    or one array per field as JSON ('columns') or MessagePack ('msgpack').
+    Query params 'type', 'startDate' and 'endDate' (YYYY-MM-DD, inclusive) filter the
+    activities; 'num' then caps the number of matches.
+    Large lists and NDJSON responses are paginated upstream and streamed.
+    When the local activity store is enabled, activities are synced and served from it.
     """
     auth_header = request.headers.get("Authorization")
     if not auth_header:
         return jsonify({"error": "Authorization header is required"}), 401
 
+    try:
+        response_format = activity_format()
+        search = activity_filter()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    route = activities_route(response_format)
+
+    cached = cached_response(route)
+    if cached is not None:
+        return cached
+
     garmin = login_with_token(auth_header)
     if not garmin:
         return jsonify({"error": "Invalid or expired token"}), 401
 
     try:
-        num = request.args.get("num", default=1, type=int)
-        if num < 1:
-            return jsonify({"error": "Parameter 'num' must be a positive integer"}), 400
-
-        start = 0
-        limit = num
-
-        activities = garmin.get_activities(start, limit)
-        return jsonify(activities)
+        return list_activities(garmin, route, response_format, search)
     except ValueError:
         return jsonify({"error": "Invalid parameter format"}), 400
+    except UpstreamUnavailable as e:
+        return upstream_unavailable(e)
     except Exception as e:
         logger.error(f"Error retrieving activities: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+def list_activities(garmin, route, response_format, search):
+    """Build the /activities response for an authenticated request."""
+    num = request.args.get("num", default=1, type=int)
+    if num < 1:
+        return jsonify({"error": "Parameter 'num' must be a positive integer"}), 400
+
+    fields = parse_fields(request.args.get("fields"), default="summary")
+    if response_format in COLUMNAR:
+        columns = to_columns(iter_projected(garmin, num, fields, search))
+        body = encode_columns(columns, response_format, app.json.dumps)
+        return cache_response(route, body=body, mimetype=FORMATS[response_format])
+
+    ndjson = response_format == "ndjson"
+    streamed = ndjson or num > ACTIVITY_PAGE_SIZE
+    if search is not None:
+        activities = iter_projected(garmin, num, fields, search)
+    elif activity_store is not None:
+        return stored_activities(garmin, num, fields, ndjson, streamed)
+    elif streamed:
+        activities = garmin.iter_activities(
+            0, num, page_size=ACTIVITY_PAGE_SIZE, concurrency=ACTIVITY_FETCH_CONCURRENCY
+        )
+        activities = (project(activity, fields) for activity in activities)
+    elif fields is None:
+        # Full activities are sent as Garmin serialized them
+        return cache_response("activities", body=garmin.get_activities_raw(0, num) or "[]")
+    else:
+        activities = (project(activity, fields) for activity in garmin.get_activities(0, num) or [])
+
+    if streamed:
+        return stream_activities(activities, ndjson=ndjson)
+    return cache_response("activities", list(activities))
+
+
+def stored_payloads(garmin, limit):
+    """Sync the account into the local store and iterate its 'limit' newest JSON payloads."""
+    display_name = garmin.display_name
+    activity_store.sync(garmin, display_name, minimum=limit)
+    return activity_store.iter_payloads(display_name, limit)
+
+
+def stored_activities(garmin, limit, fields, ndjson, streamed):
+    """Build the /activities response from the local activity store."""
+    payloads = stored_payloads(garmin, limit)
+    if fields is None:
+        # Stored payloads are already JSON and can be sent unchanged
+        if streamed:
+            return stream_activities(payloads, ndjson=ndjson, serialized=True)
+        return cache_response("activities", body="[" + ",".join(payloads) + "]")
+    activities = (project(json.loads(payload), fields) for payload in payloads)
+    if streamed:
+        return stream_activities(activities, ndjson=ndjson)
+    return cache_response("activities", list(activities))
+
+
+def iter_filtered(garmin, limit, search):
+    """
+    Iterate the 'limit' latest activities matching filter 'search'.
+    The filter is pushed down to Garmin's search, so the local store is not used.
+    """
+    activities = garmin.iter_activities(
+        0, None, **filtered_paging(limit, search), **search.search()
+    )
+    return filter_activities(activities, search, limit)
+
+
+def filtered_paging(limit, search):
+    """
+    Return the page size and concurrency to read 'limit' filtered activities with.
+    Pagination runs until 'limit' matches are read, in case Garmin ignores part of the filter.
+    """
+    page_size = min(limit, ACTIVITY_PAGE_SIZE)
+    if search.start_date or limit <= page_size:
+        # Pages fetched ahead would mostly be past the matches or before the range
+        return {"page_size": page_size, "concurrency": 1}
+    return {"page_size": page_size, "concurrency": ACTIVITY_FETCH_CONCURRENCY}
+
+
+def iter_projected(garmin, limit, fields, search=None):
+    """
+    Iterate the 'limit' latest activities projected to 'fields', from the store if enabled.
+    :param search: (Optional) ActivityFilter the activities must match
+    """
+    if search is not None:
+        return (project(activity, fields) for activity in iter_filtered(garmin, limit, search))
+    if activity_store is not None:
+        payloads = stored_payloads(garmin, limit)
+        return (project(json.loads(payload), fields) for payload in payloads)
+    if limit > ACTIVITY_PAGE_SIZE:
+        activities = garmin.iter_activities(
+            0, limit, page_size=ACTIVITY_PAGE_SIZE, concurrency=ACTIVITY_FETCH_CONCURRENCY
+        )
+    else:
+        activities = garmin.get_activities(0, limit) or []
+    return (project(activity, fields) for activity in activities)
+
+
+def parse_export_query(args):
+    """Parse the /activities/export query into (format, activity IDs or None, first, last day)."""
+    file_format = parse_format(args.get("format"))
+    activity_ids = parse_ids(args.get("ids"))
+    first = last = None
+    if activity_ids is None:
+        first, last = parse_period(args.get("start"), args.get("end"))
+    return file_format, activity_ids, first, last
+
+
+def parse_stats_query(args):
+    """Parse the /activities/stats query into (group, percentiles, first day, last day)."""
+    first, last = parse_period(args.get("start"), args.get("end"))
+    return parse_group(args.get("group")), parse_percentiles(args.get("percentiles")), first, last
+
+
+def stats_body(group, percentiles, first, last, months):
+    """Build the /activities/stats response from month columns."""
+    return {
+        "group": group,
+        "start": first.isoformat(),
+        "end": last.isoformat(),
+        "groups": aggregate(months, first, last, group, percentiles),
+    }
+
+
+@app.route("/activities/stats", methods=["GET"])
+def activity_stats():
+    """
+    Get activity statistics from 'start' to 'end' (YYYY-MM-DD, inclusive, the last year by default).
+    Query param 'group' is 'type', 'week' or 'month' (default), 'percentiles' lists the
+    percentiles of distance and duration to compute, '50,90' by default.
+    """
+    auth_header = request.headers.get("Authorization")
+    if not auth_header:
+        return jsonify({"error": "Authorization header is required"}), 401
+
+    try:
+        group, percentiles, first, last = parse_stats_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    cached = cached_response("stats")
+    if cached is not None:
+        return cached
+
+    garmin = login_with_token(auth_header)
+    if not garmin:
+        return jsonify({"error": "Invalid or expired token"}), 401
+
+    try:
+        activities = garmin.iter_activities(
+            page_size=ACTIVITY_PAGE_SIZE, concurrency=ACTIVITY_FETCH_CONCURRENCY
+        )
+        months = load_months(garmin.display_name, months_between(first, last), activities)
+        return cache_response("stats", stats_body(group, percentiles, first, last, months))
+    except UpstreamUnavailable as e:
+        return upstream_unavailable(e)
+    except Exception as e:
+        logger.error(f"Error computing activity statistics: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/activities/export", methods=["GET"])
+def export_activities():
+    """
+    Download activity files as a zip archive, streamed while the files are fetched.
+    Query param 'ids' lists the activity IDs, otherwise 'start' and 'end' (YYYY-MM-DD,
+    the last year by default) select activities by start date.
+    Query param 'format' is 'fit' (original files, default), 'gpx', 'tcx' or 'kml'.
+    """
+    auth_header = request.headers.get("Authorization")
+    if not auth_header:
+        return jsonify({"error": "Authorization header is required"}), 401
+
+    try:
+        file_format, activity_ids, first, last = parse_export_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    garmin = login_with_token(auth_header)
+    if not garmin:
+        return jsonify({"error": "Invalid or expired token"}), 401
+
+    try:
+        if activity_ids is None:
+            activities = garmin.iter_activities(
+                page_size=ACTIVITY_PAGE_SIZE,
+                concurrency=ACTIVITY_FETCH_CONCURRENCY,
+                start_date=first.isoformat(),
+                end_date=last.isoformat(),
+            )
+            activity_ids = select_activity_ids(activities, first, last)
+    except UpstreamUnavailable as e:
+        return upstream_unavailable(e)
+    except Exception as e:
+        logger.error(f"Error listing activities to export: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    if len(activity_ids) > EXPORT_MAX_ACTIVITIES:
+        return (
+            jsonify(
+                {"error": f"At most {EXPORT_MAX_ACTIVITIES} activities can be exported at once"}
+            ),
+            400,
+        )
+
+    response = Response(iter_zip(garmin, activity_ids, file_format), mimetype="application/zip")
+    response.headers["Content-Disposition"] = f'attachment; filename="activities-{file_format}.zip"'
+    return response
+
+
+@app.route("/activities/stream", methods=["GET"])
+def stream_new_activities():
+    """
+    Stream the account's new activities as Server-Sent Events.
+    Every 'activity' event carries the summary fields of a new latest activity, with its ID
+    as the event ID. The current latest activity is sent first unless it is the Last-Event-ID.
+    """
+    auth_header = request.headers.get("Authorization")
+    if not auth_header:
+        return jsonify({"error": "Authorization header is required"}), 401
+
+    garmin = login_with_token(auth_header)
+    if not garmin:
+        return jsonify({"error": "Invalid or expired token"}), 401
+
+    try:
+        display_name = garmin.display_name
+    except UpstreamUnavailable as e:
+        return upstream_unavailable(e)
+    except Exception as e:
+        logger.error(f"Error resolving the account to stream: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    events = queue.SimpleQueue()
+    subscription = activity_feed.subscribe(
+        display_name, garmin, events.put, request.headers.get("Last-Event-ID")
+    )
+
+    def generate():
+        yield f"retry: {RETRY_MS}\n\n"
+        while True:
+            try:
+                yield events.get(timeout=FEED_HEARTBEAT)
+            except queue.Empty:
+                yield KEEPALIVE
+
+    response = Response(generate(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # Keep reverse proxies such as nginx from buffering the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    response.call_on_close(lambda: activity_feed.unsubscribe(subscription))
+    return response
+
+
+@app.route("/summaries", methods=["GET"])
+def get_summaries():
+    """
+    Get the daily summaries of every day from 'start' to 'end' (YYYY-MM-DD, inclusive).
+    Query param 'fields' selects the metrics, 'daily' by default and 'all' for every metric.
+    The response holds one array per metric, aligned with the 'calendarDate' array.
+    """
+    auth_header = request.headers.get("Authorization")
+    if not auth_header:
+        return jsonify({"error": "Authorization header is required"}), 401
+
+    try:
+        dates = parse_date_range(request.args.get("start"), request.args.get("end"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    cached = cached_response("summaries")
+    if cached is not None:
+        return cached
+
+    garmin = login_with_token(auth_header)
+    if not garmin:
+        return jsonify({"error": "Invalid or expired token"}), 401
+
+    try:
+        summaries = fetch_summaries(garmin, dates)
+        fields = parse_summary_fields(request.args.get("fields"))
+        return cache_response("summaries", columnar(dates, summaries, fields))
+    except UpstreamUnavailable as e:
+        return upstream_unavailable(e)
+    except GarminConnectAuthenticationError as e:
+        return jsonify({"error": str(e)}), 401
+    except Exception as e:
+        logger.error(f"Error retrieving daily summaries: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Metrics of this process in the Prometheus text format."""
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/health", methods=["GET"])
 def health_check():
     """Health check endpoint for monitoring."""
@@ -0,0 +1,916 @@
+"""
+ASGI entry point.
+
+'application' serves /activities, /activities/latest, /activities/stats and
+/summaries as coroutines that reach Garmin through the shared httpx pools, so
+many in-flight upstream calls multiplex over a few workers. It also holds
+/activities/stream connections open without tying up a thread each. /batch
+runs its sub-requests through those same coroutines. Every other route is
+handed to the Flask app.
+'wsgi_application' serves the whole Flask app unchanged.
+
+Both answer /health and /metrics straight from the event loop, and admit every
+other request under the concurrency limits of admission.py with a deadline
+from deadline.py, so the health check stays fast while requests are queued or
+shed behind a slow Garmin.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import threading
+import time
+from functools import cached_property
+from urllib.parse import parse_qsl
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import parse_accept_header
+
+import app as wsgi
+import deadline
+from admission import EXEMPT_PATHS, Overloaded, admission
+from batch import BATCH_CONCURRENCY, SubResponse, batch_body, parse_batch
+from feed import FEED_HEARTBEAT, KEEPALIVE, RETRY_MS, activity_feed
+from compression import COMPRESS_MIN_SIZE, Compressor, choose_encoding, compress
+from filters import afilter_activities, parse_filter
+from formats import COLUMNAR, FORMATS, encode_columns, negotiate_format, to_columns
+from metrics import (
+    http_request_duration,
+    http_requests,
+    http_requests_in_flight,
+    http_requests_shed,
+    http_response_size,
+    registry,
+)
+from garmin_client import GarminConnectAuthenticationError
+from projection import parse_fields, project
+from shared_cache import offload
+from sessions import token_key
+from stats import load_months_async, months_between
+from summaries import columnar, fetch_summaries_async, parse_date_range, parse_summary_fields
+from throttle import UpstreamUnavailable
+from transport import shared_async_transport
+
+logger = logging.getLogger(__name__)
+
+
+def iter_until_disconnect(body, disconnected):
+    """
+    Iterate a WSGI response body until the client disconnects, then close it.
+    uvicorn drops writes to a closed connection silently, so an endless body such
+    as /activities/stream would otherwise run, and hold its thread, forever.
+    """
+    try:
+        for chunk in body:
+            yield chunk
+            if disconnected.is_set():
+                return
+    finally:
+        close = getattr(body, "close", None)
+        if close is not None:
+            close()
+
+
+class ThreadedWsgiToAsgiInstance(WsgiToAsgiInstance):
+    def __init__(self, wsgi_application, duplicate_header_limit=100):
+        self.disconnected = threading.Event()
+
+        def application(environ, start_response):
+            body = wsgi_application(environ, start_response)
+            return iter_until_disconnect(body, self.disconnected)
+
+        super().__init__(application, duplicate_header_limit)
+
+    async def __call__(self, scope, receive, send):
+        watcher = None
+
+        async def watch():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            self.disconnected.set()
+
+        async def receive_body():
+            nonlocal watcher
+            message = await receive()
+            if message["type"] == "http.request" and not message.get("more_body"):
+                # The body is read, so the next message can only be the disconnect
+                watcher = asyncio.ensure_future(watch())
+            return message
+
+        try:
+            await super().__call__(scope, receive_body, send)
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+
+    async def run_wsgi_app(self, body):
+        # asgiref runs every WSGI request on one shared thread by default, which would serialize
+        # all Flask requests of a worker; each gets a thread of the event loop's pool instead
+        await sync_to_async(self.serve_wsgi, thread_sensitive=False)(body)
+
+    def serve_wsgi(self, body):
+        """Run the WSGI application on the request 'body' and send its response."""
+        try:
+            environ = self.build_environ(self.scope, body)
+        except ValueError:
+            # Too many duplicate headers
+            self.sync_send(
+                {
+                    "type": "http.response.start",
+                    "status": 400,
+                    "headers": [(b"content-type", b"text/plain")],
+                }
+            )
+            self.sync_send({"type": "http.response.body", "body": b"Bad Request"})
+            return
+
+        sent = 0
+        outputs = self.wsgi_application(environ, self.start_response)
+        try:
+            for output in outputs:
+                if not self.response_started:
+                    self.response_started = True
+                    self.sync_send(self.response_start)
+                length = self.response_content_length
+                if length is not None:
+                    # Never send more than the Content-Length the application declared
+                    output = output[: length - sent]
+                self.sync_send({"type": "http.response.body", "body": output, "more_body": True})
+                sent += len(output)
+                if sent == length:
+                    break
+        finally:
+            close = getattr(outputs, "close", None)
+            if close is not None:
+                close()
+        if not self.response_started:
+            self.response_started = True
+            self.sync_send(self.response_start)
+        self.sync_send({"type": "http.response.body"})
+
+
+class ThreadedWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi running concurrent requests on concurrent threads, closing their bodies."""
+
+    async def __call__(self, scope, receive, send):
+        instance = ThreadedWsgiToAsgiInstance(self.wsgi_application, self.duplicate_header_limit)
+        await instance(scope, receive, send)
+
+
+flask_application = ThreadedWsgiToAsgi(wsgi.app)
+url_adapter = wsgi.app.url_map.bind("")
+
+
+class Request:
+    """Minimal view of an ASGI HTTP request."""
+
+    def __init__(self, scope, receive=None):
+        self.receive = receive
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.headers = {
+            name.decode("latin-1").lower(): value.decode("latin-1")
+            for name, value in scope["headers"]
+        }
+        query_string = scope.get("query_string", b"").decode("latin-1")
+        self.args = parse_qsl(query_string, keep_blank_values=True)
+
+    @cached_property
+    def route(self):
+        """
+        Return the template of the Flask route the request matches, or "unmatched", so
+        admission and metrics label requests like Flask's url_rule, not by raw path.
+        """
+        try:
+            rule, _ = url_adapter.match(self.path, self.method, return_rule=True)
+        except HTTPException:
+            return "unmatched"
+        return rule.rule
+
+    def arg(self, name, default=None):
+        """Return the first value of query parameter 'name'."""
+        for key, value in self.args:
+            if key == name:
+                return value
+        return default
+
+    def int_arg(self, name, default):
+        """Return query parameter 'name' as an int, or 'default' when unparsable like type=int."""
+        try:
+            return int(self.arg(name, default))
+        except ValueError:
+            return default
+
+    def activity_filter(self):
+        """Return the filter the client asked for with 'type', 'startDate' and 'endDate', if any."""
+        return parse_filter(self.arg("type"), self.arg("startDate"), self.arg("endDate"))
+
+    def activity_format(self):
+        """Return the activity list format the client asked for with 'format' or Accept."""
+        accept = parse_accept_header(self.headers.get("accept"), MIMEAccept)
+        return negotiate_format(self.arg("format"), accept)
+
+
+def response_headers(request, content_type="application/json", extra=None):
+    """Build response headers, including the CORS headers Flask-CORS would add."""
+    headers = [(b"content-type", content_type.encode())]
+    origin = request.headers.get("origin")
+    if origin:
+        headers += [
+            (b"access-control-allow-origin", origin.encode("latin-1")),
+            (b"access-control-allow-credentials", b"true"),
+            (b"access-control-expose-headers", wsgi.TOKENSTORE_HEADER.encode()),
+            (b"vary", b"Origin"),
+        ]
+    tokenstore = wsgi.bearer_refreshed_tokenstore(request.headers.get("authorization"))
+    if tokenstore:
+        headers.append((wsgi.TOKENSTORE_HEADER.lower().encode(), tokenstore.encode("latin-1")))
+    for name, value in (extra or {}).items():
+        headers.append((name.encode(), value.encode("latin-1")))
+    return headers
+
+
+async def send_body(send, request, status, body, extra=None, content_type="application/json"):
+    """Send a complete response, compressed when the client accepts it and it is worth it."""
+    payload = body.encode() if isinstance(body, str) else body
+    extra = dict(extra or {})
+    encoding = choose_encoding(request.headers.get("accept-encoding"), content_type)
+    if status == 200 and encoding and len(payload) >= COMPRESS_MIN_SIZE:
+        payload = compress(payload, encoding)
+        extra["content-encoding"] = encoding
+        extra["vary"] = ", ".join(filter(None, (extra.get("vary"), "Accept-Encoding")))
+        if "etag" in extra:
+            # The compressed body is a different representation of the same content
+            extra["etag"] = "W/" + extra["etag"]
+    headers = response_headers(
+        request, content_type=content_type, extra={"content-length": str(len(payload)), **extra}
+    )
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": payload})
+
+
+async def send_error(send, request, status, message):
+    """Send a JSON error response."""
+    await send_body(send, request, status, wsgi.app.json.dumps({"error": message}))
+
+
+async def send_unavailable(send, request, error):
+    """Send a 503, or a 504 past the deadline, telling the client when to retry."""
+    logger.warning(f"Garmin Connect unavailable: {error}")
+    retry_after = str(max(math.ceil(error.retry_after), 1))
+    body = wsgi.app.json.dumps({"error": str(error)})
+    await send_body(send, request, error.status, body, extra={"retry-after": retry_after})
+
+
+async def cached_body(key):
+    """Return the cached body, ETag and mimetype under 'key', if any, off the event loop."""
+    return await offload(wsgi.response_cache, wsgi.response_cache.get, key)
+
+
+async def cache_body(key, body, mimetype="application/json"):
+    """Cache a serialized body under 'key' off the event loop and return its ETag."""
+    return await offload(wsgi.response_cache, wsgi.cache_body, key, body, mimetype)
+
+
+def etag_matches(if_none_match, etag):
+    """Check an If-None-Match header against a strong ETag."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/").strip('"') == etag:
+            return True
+    return False
+
+
+async def send_cached(send, request, body, etag, content_type="application/json", vary=None):
+    """Send a revalidatable response, or 304 when the client already has 'etag'."""
+    headers = {"etag": f'"{etag}"', "cache-control": "private, no-cache"}
+    if vary:
+        headers["vary"] = vary
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 304,
+                "headers": response_headers(request, content_type=content_type, extra=headers),
+            }
+        )
+        await send({"type": "http.response.body", "body": b""})
+        return
+    await send_body(send, request, 200, body, extra=headers, content_type=content_type)
+
+
+async def aiter_encoded(first, activities, encode, ndjson):
+    """Encode 'first' and the rest of 'activities' as the chunks of a JSON array or of NDJSON."""
+    if ndjson:
+        if first is not None:
+            yield encode(first) + "\n"
+        async for activity in activities:
+            yield encode(activity) + "\n"
+        return
+
+    if first is None:
+        yield "[]"
+        return
+    yield "[" + encode(first)
+    async for activity in activities:
+        yield "," + encode(activity)
+    yield "]"
+
+
+async def send_stream(send, request, activities, ndjson=False, serialized=False):
+    """
+    Stream activities from an async iterator as a JSON array or as NDJSON.
+    The first activity is awaited before the response starts so upstream errors produce a 500.
+    The stream is compressed when the client accepts it.
+    """
+    encode = str if serialized else wsgi.app.json.dumps
+    try:
+        first = await anext(activities, None)
+    except UpstreamUnavailable as e:
+        await send_unavailable(send, request, e)
+        return
+    except Exception as e:
+        logger.error(f"Error retrieving activities: {e}")
+        await send_error(send, request, 500, str(e))
+        return
+
+    content_type = "application/x-ndjson" if ndjson else "application/json"
+    extra = {"vary": "Accept"}
+    encoding = choose_encoding(request.headers.get("accept-encoding"), content_type)
+    compressor = Compressor(encoding) if encoding else None
+    if compressor is not None:
+        extra = {"vary": "Accept, Accept-Encoding", "content-encoding": encoding}
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": response_headers(request, content_type=content_type, extra=extra),
+        }
+    )
+
+    try:
+        async for chunk in aiter_encoded(first, activities, encode, ndjson):
+            data = chunk.encode()
+            if compressor is not None:
+                # Flushed so the client can decode each row as soon as it arrives
+                data = compressor.compress(data) + compressor.flush()
+            await send({"type": "http.response.body", "body": data, "more_body": True})
+    except Exception as e:
+        logger.error(f"Error streaming activities: {e}")
+        raise
+    tail = compressor.finish() if compressor is not None else b""
+    await send({"type": "http.response.body", "body": tail})
+
+
+async def aiter_stored(display_name, limit):
+    """Iterate the 'limit' newest stored payloads, reading them a page at a time in a thread."""
+    after = None
+    while limit > 0:
+        size = min(limit, wsgi.ACTIVITY_PAGE_SIZE)
+        payloads, after = await asyncio.to_thread(
+            wsgi.activity_store.read_payloads, display_name, size, after
+        )
+        for payload in payloads:
+            yield payload
+        if len(payloads) < size:
+            return
+        limit -= size
+
+
+async def aiter_list(activities):
+    """Iterate a list of activities already fetched, or none for None."""
+    for activity in activities or []:
+        yield activity
+
+
+async def aiter_loaded(payloads):
+    """Parse every JSON payload of an async iterator."""
+    async for payload in payloads:
+        yield json.loads(payload)
+
+
+async def aiter_projected(activities, fields):
+    """Project every activity of an async iterator."""
+    async for activity in activities:
+        yield project(activity, fields)
+
+
+def aiter_filtered(garmin, limit, search):
+    """Iterate the 'limit' latest activities matching filter 'search', like wsgi.iter_filtered."""
+    activities = garmin.iter_activities_async(
+        0, None, **wsgi.filtered_paging(limit, search), **search.search()
+    )
+    return afilter_activities(activities, search, limit)
+
+
+async def list_projected(garmin, limit, fields, search=None):
+    """Return the 'limit' latest activities projected to 'fields', like wsgi.iter_projected."""
+    if search is not None:
+        activities = aiter_filtered(garmin, limit, search)
+        return [activity async for activity in aiter_projected(activities, fields)]
+    if wsgi.activity_store is not None:
+        return await asyncio.to_thread(lambda: list(wsgi.iter_projected(garmin, limit, fields)))
+    if limit > wsgi.ACTIVITY_PAGE_SIZE:
+        pages = garmin.iter_activities_async(
+            0,
+            limit,
+            page_size=wsgi.ACTIVITY_PAGE_SIZE,
+            concurrency=wsgi.ACTIVITY_FETCH_CONCURRENCY,
+        )
+        return [activity async for activity in aiter_projected(pages, fields)]
+    activities = await garmin.get_activities_async(0, limit)
+    return [project(activity, fields) for activity in activities or []]
+
+
+async def authenticate(request):
+    """Return the logged-in client, or an error status and message."""
+    auth_header = request.headers.get("authorization")
+    if not auth_header:
+        return None, (401, "Authorization header is required")
+
+    # Token logins are lazy and do not touch the network, but a cold one reads the shared
+    # session store and builds a garth client
+    garmin = await asyncio.to_thread(wsgi.login_with_token, auth_header)
+    if not garmin:
+        return None, (401, "Invalid or expired token")
+    return garmin, None
+
+
+async def latest_activity(request, send):
+    """Get the latest activity details."""
+    auth_header = request.headers.get("authorization")
+    key = wsgi.response_cache_key("latest", auth_header or "", request.args)
+    cached = await cached_body(key) if auth_header else None
+    if cached is not None:
+        await send_cached(send, request, *cached)
+        return
+
+    garmin, error = await authenticate(request)
+    if error:
+        await send_error(send, request, *error)
+        return
+
+    try:
+        activity = await garmin.get_last_activity_async()
+    except UpstreamUnavailable as e:
+        await send_unavailable(send, request, e)
+        return
+    except Exception as e:
+        logger.error(f"Error retrieving latest activity: {e}")
+        await send_error(send, request, 500, str(e))
+        return
+
+    body = wsgi.app.json.dumps(project(activity, parse_fields(request.arg("fields"))))
+    await send_cached(send, request, body, await cache_body(key, body))
+
+
+async def activities(request, send):
+    """Get a list of activities, mirroring the Flask /activities route."""
+    auth_header = request.headers.get("authorization")
+    if not auth_header:
+        await send_error(send, request, 401, "Authorization header is required")
+        return
+
+    try:
+        response_format = request.activity_format()
+        search = request.activity_filter()
+    except ValueError as e:
+        await send_error(send, request, 400, str(e))
+        return
+
+    key = wsgi.response_cache_key(wsgi.activities_route(response_format), auth_header, request.args)
+    cached = await cached_body(key)
+    if cached is not None:
+        await send_cached(send, request, *cached, vary="Accept")
+        return
+
+    garmin, error = await authenticate(request)
+    if error:
+        await send_error(send, request, *error)
+        return
+
+    try:
+        await send_activities(send, request, garmin, key, response_format, search)
+    except UpstreamUnavailable as e:
+        await send_unavailable(send, request, e)
+    except Exception as e:
+        logger.error(f"Error retrieving activities: {e}")
+        await send_error(send, request, 500, str(e))
+
+
+async def send_activities(send, request, garmin, key, response_format, search):
+    """Send the /activities response for an authenticated request."""
+    limit = request.int_arg("num", 1)
+    if limit < 1:
+        await send_error(send, request, 400, "Parameter 'num' must be a positive integer")
+        return
+
+    fields = parse_fields(request.arg("fields"), default="summary")
+    if response_format in COLUMNAR:
+        columns = to_columns(await list_projected(garmin, limit, fields, search))
+        body = encode_columns(columns, response_format, wsgi.app.json.dumps)
+        mimetype = FORMATS[response_format]
+        etag = await cache_body(key, body, mimetype)
+        await send_cached(send, request, body, etag, mimetype, vary="Accept")
+        return
+
+    ndjson = response_format == "ndjson"
+    streamed = ndjson or limit > wsgi.ACTIVITY_PAGE_SIZE
+    # Stored payloads are already JSON and can be sent unchanged
+    serialized = search is None and wsgi.activity_store is not None and fields is None
+    if search is not None:
+        activities = aiter_projected(aiter_filtered(garmin, limit, search), fields)
+    elif wsgi.activity_store is not None:
+        activities = await stored_activities(garmin, limit, fields)
+    elif streamed:
+        pages = garmin.iter_activities_async(
+            0,
+            limit,
+            page_size=wsgi.ACTIVITY_PAGE_SIZE,
+            concurrency=wsgi.ACTIVITY_FETCH_CONCURRENCY,
+        )
+        activities = aiter_projected(pages, fields)
+    elif fields is None:
+        # Full activities are sent as Garmin serialized them
+        body = await garmin.get_activities_raw_async(0, limit) or "[]"
+        await send_cached(send, request, body, await cache_body(key, body), vary="Accept")
+        return
+    else:
+        activities = aiter_projected(
+            aiter_list(await garmin.get_activities_async(0, limit)), fields
+        )
+
+    if streamed:
+        await send_stream(send, request, activities, ndjson=ndjson, serialized=serialized)
+        return
+    items = [activity async for activity in activities]
+    body = "[" + ",".join(items) + "]" if serialized else wsgi.app.json.dumps(items)
+    await send_cached(send, request, body, await cache_body(key, body), vary="Accept")
+
+
+async def stored_activities(garmin, limit, fields):
+    """
+    Sync the account into the local store, then iterate its 'limit' newest activities,
+    as their stored JSON payloads when 'fields' is None.
+    """
+    display_name = await asyncio.to_thread(lambda: garmin.display_name)
+    await asyncio.to_thread(wsgi.activity_store.sync, garmin, display_name, limit)
+    payloads = aiter_stored(display_name, limit)
+    return payloads if fields is None else aiter_projected(aiter_loaded(payloads), fields)
+
+
+async def activity_stats(request, send):
+    """Get activity statistics, mirroring the Flask /activities/stats route."""
+    auth_header = request.headers.get("authorization")
+    if not auth_header:
+        await send_error(send, request, 401, "Authorization header is required")
+        return
+
+    try:
+        # The first value of a repeated parameter wins, as with Flask's args.get
+        query = dict(reversed(request.args))
+        group, percentiles, first, last = wsgi.parse_stats_query(query)
+    except ValueError as e:
+        await send_error(send, request, 400, str(e))
+        return
+
+    key = wsgi.response_cache_key("stats", auth_header, request.args)
+    cached = await cached_body(key)
+    if cached is not None:
+        await send_cached(send, request, *cached)
+        return
+
+    garmin, error = await authenticate(request)
+    if error:
+        await send_error(send, request, *error)
+        return
+
+    try:
+        display_name = await asyncio.to_thread(lambda: garmin.display_name)
+        activities = garmin.iter_activities_async(
+            page_size=wsgi.ACTIVITY_PAGE_SIZE, concurrency=wsgi.ACTIVITY_FETCH_CONCURRENCY
+        )
+        months = await load_months_async(display_name, months_between(first, last), activities)
+    except UpstreamUnavailable as e:
+        await send_unavailable(send, request, e)
+        return
+    except Exception as e:
+        logger.error(f"Error computing activity statistics: {e}")
+        await send_error(send, request, 500, str(e))
+        return
+
+    body = wsgi.app.json.dumps(wsgi.stats_body(group, percentiles, first, last, months))
+    await send_cached(send, request, body, await cache_body(key, body))
+
+
+async def summaries(request, send):
+    """Get daily summaries over a date range, mirroring the Flask /summaries route."""
+    auth_header = request.headers.get("authorization")
+    if not auth_header:
+        await send_error(send, request, 401, "Authorization header is required")
+        return
+
+    try:
+        dates = parse_date_range(request.arg("start"), request.arg("end"))
+    except ValueError as e:
+        await send_error(send, request, 400, str(e))
+        return
+
+    key = wsgi.response_cache_key("summaries", auth_header, request.args)
+    cached = await cached_body(key)
+    if cached is not None:
+        await send_cached(send, request, *cached)
+        return
+
+    garmin, error = await authenticate(request)
+    if error:
+        await send_error(send, request, *error)
+        return
+
+    try:
+        by_date = await fetch_summaries_async(garmin, dates)
+    except UpstreamUnavailable as e:
+        await send_unavailable(send, request, e)
+        return
+    except GarminConnectAuthenticationError as e:
+        await send_error(send, request, 401, str(e))
+        return
+    except Exception as e:
+        logger.error(f"Error retrieving daily summaries: {e}")
+        await send_error(send, request, 500, str(e))
+        return
+
+    fields = parse_summary_fields(request.arg("fields"))
+    body = wsgi.app.json.dumps(columnar(dates, by_date, fields))
+    await send_cached(send, request, body, await cache_body(key, body))
+
+
+async def wait_disconnect(receive):
+    """Return once the client has gone away."""
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def activity_stream(request, send):
+    """Stream new activities as Server-Sent Events, mirroring the Flask /activities/stream route."""
+    garmin, error = await authenticate(request)
+    if error:
+        await send_error(send, request, *error)
+        return
+
+    try:
+        display_name = await asyncio.to_thread(lambda: garmin.display_name)
+    except UpstreamUnavailable as e:
+        await send_unavailable(send, request, e)
+        return
+    except Exception as e:
+        logger.error(f"Error resolving the account to stream: {e}")
+        await send_error(send, request, 500, str(e))
+        return
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    subscription = activity_feed.subscribe(
+        display_name,
+        garmin,
+        lambda event: loop.call_soon_threadsafe(events.put_nowait, event),
+        request.headers.get("last-event-id"),
+    )
+    disconnected = asyncio.ensure_future(wait_disconnect(request.receive))
+    try:
+        extra = {"cache-control": "no-cache", "x-accel-buffering": "no"}
+        headers = response_headers(request, content_type="text/event-stream", extra=extra)
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        chunk = f"retry: {RETRY_MS}\n\n"
+        while True:
+            await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+            event = asyncio.ensure_future(events.get())
+            done, _ = await asyncio.wait(
+                {event, disconnected}, timeout=FEED_HEARTBEAT, return_when=asyncio.FIRST_COMPLETED
+            )
+            if event not in done:
+                event.cancel()
+            if disconnected in done:
+                return
+            chunk = event.result() if event in done else KEEPALIVE
+    finally:
+        activity_feed.unsubscribe(subscription)
+        disconnected.cancel()
+
+
+async def read_body(receive):
+    """Read a whole request body."""
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+async def dispatch(sub_request, auth_header):
+    """
+    Run a batched GET through the routes of 'application', so it is measured like any
+    request. It is not admitted again: the batch holds a slot and its deadline applies.
+    """
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": sub_request.path,
+        "raw_path": sub_request.path.encode(),
+        "root_path": "",
+        "query_string": sub_request.query_string.encode(),
+        "headers": [
+            (b"authorization", auth_header.encode("latin-1")),
+            (b"accept", b"application/json"),
+        ],
+    }
+    requested = False
+    status, headers, chunks = 500, [], []
+
+    async def receive():
+        nonlocal requested
+        if requested:
+            return {"type": "http.disconnect"}
+        requested = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status, headers
+        if message["type"] == "http.response.start":
+            status, headers = message["status"], message.get("headers", [])
+        else:
+            chunks.append(message.get("body", b""))
+
+    await serve(scope, receive, send, ROUTES)
+    content_type = dict(headers).get(b"content-type", b"").decode("latin-1")
+    return SubResponse(status, content_type.split(";", 1)[0], b"".join(chunks))
+
+
+async def batch(request, send):
+    """Run several GET requests with one login, mirroring the Flask /batch route."""
+    if not request.headers.get("authorization"):
+        await send_error(send, request, 401, "Authorization header is required")
+        return
+    try:
+        data = json.loads(await read_body(request.receive))
+    except ValueError:
+        data = None
+    try:
+        sub_requests = parse_batch(data)
+    except ValueError as e:
+        await send_error(send, request, 400, str(e))
+        return
+
+    # Logging in caches the session, which every sub-request then reuses
+    _, error = await authenticate(request)
+    if error:
+        await send_error(send, request, *error)
+        return
+
+    auth_header = request.headers["authorization"]
+    limit = asyncio.Semaphore(max(BATCH_CONCURRENCY, 1))
+
+    async def run(sub_request):
+        async with limit:
+            return await dispatch(sub_request, auth_header)
+
+    responses = await asyncio.gather(*(run(sub_request) for sub_request in sub_requests))
+    await send_body(send, request, 200, batch_body(sub_requests, responses, wsgi.app.json.dumps))
+
+
+ROUTES = {
+    ("POST", "/batch"): batch,
+    ("GET", "/activities"): activities,
+    ("GET", "/activities/latest"): latest_activity,
+    ("GET", "/activities/stats"): activity_stats,
+    ("GET", "/activities/stream"): activity_stream,
+    ("GET", "/summaries"): summaries,
+}
+
+
+async def observe(handler, request, send):
+    """Run a native route handler, recording the metrics WSGIMetrics records for Flask."""
+    route, method = request.route, request.method
+    started = time.perf_counter()
+    status, size = "500", 0
+
+    async def measured_send(message):
+        nonlocal status, size
+        if message["type"] == "http.response.start":
+            status = str(message["status"])
+            # The deadline does not cover the rest of a streamed body
+            deadline.clear()
+        else:
+            size += len(message.get("body", b""))
+        await send(message)
+
+    with http_requests_in_flight.track(route):
+        try:
+            await handler(request, measured_send)
+        finally:
+            http_requests.inc(route, method, status)
+            http_request_duration.observe(time.perf_counter() - started, route, method, status)
+            http_response_size.observe(size, route)
+
+
+async def lifespan(receive, send):
+    """Close the async connection pools when the server shuts down."""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await shared_async_transport.aclose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def health(request, send):
+    """Health check, answered without waiting behind other requests."""
+    await send_body(send, request, 200, wsgi.app.json.dumps({"status": "healthy"}))
+
+
+async def metrics(request, send):
+    """Metrics of this process, answered without waiting behind other requests."""
+    await send_body(send, request, 200, registry.render(), content_type="text/plain; version=0.0.4")
+
+
+# Cheap routes served ahead of admission control
+PRIORITY_ROUTES = {
+    ("GET", "/health"): health,
+    ("GET", "/metrics"): metrics,
+}
+
+
+async def serve(scope, receive, send, routes):
+    """Serve an HTTP request natively when 'routes' has its route, else through Flask."""
+    handler = routes.get((scope["method"], scope["path"]))
+    if handler is not None:
+        await observe(handler, Request(scope, receive), send)
+    else:
+        await flask_application(scope, receive, send)
+
+
+async def admit(scope, receive, send, routes):
+    """Serve an HTTP request under a deadline once admitted, or shed it with a 503."""
+    request = Request(scope, receive)
+    priority = PRIORITY_ROUTES.get((request.method, request.path))
+    if priority is not None:
+        await observe(priority, request, send)
+        return
+    if request.path in EXEMPT_PATHS or request.method == "OPTIONS":
+        await serve(scope, receive, send, routes)
+        return
+
+    auth_header = request.headers.get("authorization")
+    timeout_header = request.headers.get(deadline.TIMEOUT_HEADER.lower())
+    token = deadline.start(deadline.request_timeout(timeout_header))
+    try:
+        async with admission.admit(
+            request.route, token_key(auth_header) if auth_header else None, deadline.remaining()
+        ):
+            await serve(scope, receive, send, routes)
+    except Overloaded as e:
+        http_requests_shed.inc(request.route)
+        retry_after = {"retry-after": str(max(math.ceil(e.retry_after), 1))}
+        body = wsgi.app.json.dumps({"error": str(e)})
+        await observe(
+            lambda request, send: send_body(send, request, 503, body, extra=retry_after),
+            request,
+            send,
+        )
+    finally:
+        deadline.reset(token)
+
+
+async def route(scope, receive, send, routes):
+    """Serve any ASGI scope, natively for 'routes'."""
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+    elif scope["type"] == "http":
+        await admit(scope, receive, send, routes)
+    else:
+        await flask_application(scope, receive, send)
+
+
+async def application(scope, receive, send):
+    """Dispatch async routes natively and everything else to Flask."""
+    await route(scope, receive, send, ROUTES)
+
+
+async def wsgi_application(scope, receive, send):
+    """Serve every route but the priority ones through Flask, in threads."""
+    await route(scope, receive, send, {})
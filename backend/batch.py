@@ -0,0 +1,83 @@
+"""
+Several GET requests sent as one POST /batch.
+
+The batch is authenticated once, which caches the session, then every
+sub-request is dispatched through the app's own routes concurrently and
+reuses that session. Results come back in request order with their own
+status; JSON bodies are embedded as they were serialized.
+"""
+
+import os
+from typing import Any, Callable, Dict, List, NamedTuple, Sequence
+from urllib.parse import urlencode, urlsplit
+
+# Maximum number of sub-requests in one batch
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "20"))
+# Sub-requests of one batch dispatched in parallel
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+# Routes that answer a GET with JSON of bounded size
+BATCHABLE_PATHS = ("/activities", "/activities/latest", "/activities/stats", "/summaries")
+
+
+class SubRequest(NamedTuple):
+    id: Any
+    path: str
+    query_string: str
+
+
+class SubResponse(NamedTuple):
+    status: int
+    mimetype: str
+    body: bytes
+
+
+def parse_batch(data: Any) -> List[SubRequest]:
+    """
+    Validate a batch body such as {"requests": [{"id": "latest", "path": "/activities/latest"}]}.
+    Each request has a 'path', which may include a query string, optional 'params' added
+    to the query, and an optional 'id' echoed in its result, its index by default.
+    :raise ValueError: When the body is malformed, too large or names a path that cannot be batched
+    """
+    requests = data.get("requests") if isinstance(data, dict) else None
+    if not isinstance(requests, list) or not requests:
+        raise ValueError("Body must have a non-empty 'requests' list")
+    if len(requests) > BATCH_MAX_REQUESTS:
+        raise ValueError(f"A batch must not have more than {BATCH_MAX_REQUESTS} requests")
+
+    parsed = []
+    for index, item in enumerate(requests):
+        if not isinstance(item, dict) or not isinstance(item.get("path"), str):
+            raise ValueError(f"Request {index} must be an object with a 'path'")
+        url = urlsplit(item["path"])
+        if url.path not in BATCHABLE_PATHS:
+            raise ValueError(
+                f"Path '{url.path}' cannot be batched, use one of {', '.join(BATCHABLE_PATHS)}"
+            )
+        params = item.get("params") or {}
+        if not isinstance(params, dict):
+            raise ValueError(f"Request {index} 'params' must be an object")
+        query_string = "&".join(filter(None, (url.query, urlencode(params, doseq=True))))
+        parsed.append(SubRequest(item.get("id", index), url.path, query_string))
+    return parsed
+
+
+def is_json(mimetype: str) -> bool:
+    return mimetype == "application/json" or mimetype.endswith("+json")
+
+
+def batch_body(
+    requests: Sequence[SubRequest],
+    responses: Sequence[SubResponse],
+    dumps: Callable[[Dict[str, Any]], str],
+) -> str:
+    """Serialize the results of a batch, splicing JSON bodies in without parsing them."""
+    results = []
+    for sub_request, response in zip(requests, responses):
+        if is_json(response.mimetype) and response.body:
+            head = dumps({"id": sub_request.id, "status": response.status})
+            results.append(f'{head[:-1]},"body":{response.body.decode()}}}')
+        else:
+            error = f"Responses of type '{response.mimetype}' cannot be batched"
+            results.append(dumps({"id": sub_request.id, "status": 406, "body": {"error": error}}))
+    return '{"responses":[' + ",".join(results) + "]}"
@@ -0,0 +1,231 @@
+"""
+Local stand-in for the Garmin Connect endpoints the backend uses.
+
+Serves the SSO/OAuth login flow, the social profile, user settings, activity
+search and daily summary endpoints over plain HTTP, with configurable latency,
+payload size and error rate. Point the backend at it with
+GARMIN_UPSTREAM_URL=http://127.0.0.1:<port>.
+
+Run from the backend directory: python benchmarks/fake_garmin.py --port 8089
+"""
+
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+from payloads import make_activities, make_daily_summary
+
+DISPLAY_NAME = "runner42"
+
+SIGNIN_PAGE = (
+    "<html><head><title>GARMIN Authentication Application</title></head><body>"
+    '<form><input type="hidden" name="_csrf" value="fake-csrf-token"/></form></body></html>'
+)
+SIGNIN_SUCCESS = (
+    "<html><head><title>Success</title></head><body>"
+    '<script>var url = "https://sso.garmin.com/sso/embed?ticket=ST-0000-fake";</script>'
+    "</body></html>"
+)
+
+
+class FakeGarmin:
+    """
+    Behaviour shared by the request handlers of one fake server.
+    :param latency: Seconds every response is delayed by
+    :param jitter: Extra random delay of up to this many seconds
+    :param activities: Number of activities in the account's history
+    :param extra_fields: Additional numeric fields per activity, to grow payloads
+    :param error_rate: Share of data requests answered with 'error_status'
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.0,
+        activities: int = 1000,
+        extra_fields: int = 0,
+        error_rate: float = 0.0,
+        error_status: int = 500,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._rng = random.Random(seed)
+        self._seed = seed
+        self._tokens = itertools.count(1)
+        self._lock = threading.Lock()
+        self.requests: Counter = Counter()
+        # Activities are serialized once so the server is never the bottleneck
+        self._activities = [
+            json.dumps(activity, separators=(",", ":"))
+            for activity in make_activities(activities, seed=seed, extra_fields=extra_fields)
+        ]
+
+    def delay(self) -> float:
+        with self._lock:
+            return self.latency + self._rng.uniform(0, self.jitter)
+
+    def fails(self) -> bool:
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+    def count(self, path: str) -> None:
+        with self._lock:
+            self.requests[path] += 1
+
+    def next_token(self) -> int:
+        with self._lock:
+            return next(self._tokens)
+
+    def activity_page(self, start: int, limit: int) -> str:
+        return "[" + ",".join(self._activities[start : start + limit]) + "]"
+
+    def daily_summary(self, calendar_date: str) -> str:
+        return json.dumps(make_daily_summary(calendar_date, DISPLAY_NAME, seed=self._seed))
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes, avoid delayed-ACK stalls between them
+    disable_nagle_algorithm = True
+    fake: FakeGarmin
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status: int, body: str, content_type: str = "application/json") -> None:
+        payload = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def route(self, method: str) -> None:
+        url = urlsplit(self.path)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+
+        path = url.path
+        if path.startswith("/usersummary-service/usersummary/daily/"):
+            self.fake.count("/usersummary-service/usersummary/daily")
+        else:
+            self.fake.count(path)
+
+        response = self.respond(method, path, query)
+        if response is None:
+            self.send(404, json.dumps({"message": "Not found"}))
+            return
+
+        time.sleep(self.fake.delay())
+        if self.fake.fails() and not path.startswith(("/sso/", "/oauth")):
+            self.send(self.fake.error_status, json.dumps({"message": "Injected error"}))
+            return
+        self.send(*response)
+
+    def respond(self, method: str, path: str, query: dict) -> Optional[tuple]:
+        if path == "/oauth_consumer.json":
+            return 200, json.dumps({"consumer_key": "fake", "consumer_secret": "fake"})
+        if path == "/sso/embed":
+            return 200, "<html></html>", "text/html"
+        if path == "/sso/signin":
+            return 200, SIGNIN_SUCCESS if method == "POST" else SIGNIN_PAGE, "text/html"
+        if path == "/oauth-service/oauth/preauthorized":
+            token = self.fake.next_token()
+            body = f"oauth_token=fake-oauth1-{token}&oauth_token_secret=fake-secret-{token}"
+            return 200, body, "text/plain"
+        if path == "/oauth-service/oauth/exchange/user/2.0":
+            token = {
+                "scope": "CONNECT_READ",
+                "jti": f"jti-{self.fake.next_token()}",
+                "token_type": "Bearer",
+                "access_token": f"fake-access-{self.fake.next_token()}",
+                "refresh_token": "fake-refresh",
+                "expires_in": 3600,
+                "refresh_token_expires_in": 7200,
+            }
+            return 200, json.dumps(token)
+        if path == "/userprofile-service/socialProfile":
+            return 200, json.dumps(
+                {"displayName": DISPLAY_NAME, "fullName": "Test Runner", "userName": "runner"}
+            )
+        if path == "/userprofile-service/userprofile/user-settings":
+            return 200, json.dumps({"userData": {"measurementSystem": "metric"}})
+        if path == "/activitylist-service/activities/search/activities":
+            start = int(query.get("start", 0))
+            limit = int(query.get("limit", 20))
+            return 200, self.fake.activity_page(start, limit)
+        if path.startswith("/usersummary-service/usersummary/daily/"):
+            return 200, self.fake.daily_summary(query.get("calendarDate", "2024-01-01"))
+        return None
+
+    def do_GET(self):
+        self.route("GET")
+
+    def do_POST(self):
+        self.route("POST")
+
+
+def start_server(fake: FakeGarmin, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Serve 'fake' from a background thread and return the server."""
+    handler = type("FakeGarminHandler", (Handler,), {"fake": fake})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the fake server knobs to an argument parser."""
+    parser.add_argument("--latency", type=float, default=0.05, help="Upstream delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra delay in seconds")
+    parser.add_argument("--activities", type=int, default=1000, help="Activities in the history")
+    parser.add_argument(
+        "--extra-fields", type=int, default=0, help="Extra fields per activity to grow payloads"
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of failed requests")
+    parser.add_argument("--error-status", type=int, default=500)
+
+
+def from_arguments(args: argparse.Namespace) -> FakeGarmin:
+    """Build a FakeGarmin from parsed add_arguments() options."""
+    return FakeGarmin(
+        latency=args.latency,
+        jitter=args.jitter,
+        activities=args.activities,
+        extra_fields=args.extra_fields,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_server(from_arguments(args), args.host, args.port)
+    print(f"Fake Garmin Connect listening on http://{args.host}:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Micro-benchmark of activity response serialization.
+
+Compares, for lists of 100, 1000 and 5000 activities:
+- encoding with Flask's stdlib provider and with FastJSONProvider
+- the decode/re-encode round trip an upstream body used to go through
+- passing the upstream body through, which only hashes it for the ETag
+
+Run from the backend directory: python benchmarks/json_encoding.py
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from app import body_etag  # noqa: E402
+from json_provider import FastJSONProvider  # noqa: E402
+from payloads import make_activities  # noqa: E402
+
+
+def best_of(fn, repeat: int) -> float:
+    """Return the fastest of 'repeat' runs of 'fn', in milliseconds."""
+    number = 1
+    while timeit.timeit(fn, number=number) < 0.05 and number < 1000:
+        number *= 2
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1000
+
+
+def run(sizes, repeat):
+    app = Flask(__name__)
+    stdlib = DefaultJSONProvider(app)
+    fast = FastJSONProvider(app)
+
+    results = []
+    for size in sizes:
+        activities = make_activities(size)
+        # Garmin's own serialization of the upstream body
+        body = json.dumps(activities, separators=(",", ":"))
+        results.append(
+            {
+                "activities": size,
+                "body_bytes": len(body.encode()),
+                "stdlib_encode_ms": best_of(lambda: stdlib.dumps(activities), repeat),
+                "fast_encode_ms": best_of(lambda: fast.dumps(activities), repeat),
+                "stdlib_roundtrip_ms": best_of(
+                    lambda: body_etag(stdlib.dumps(stdlib.loads(body))), repeat
+                ),
+                "fast_roundtrip_ms": best_of(
+                    lambda: body_etag(fast.dumps(fast.loads(body))), repeat
+                ),
+                "passthrough_ms": best_of(lambda: body_etag(body), repeat),
+            }
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    if not FastJSONProvider.available:
+        print("orjson is not installed, FastJSONProvider falls back to stdlib", file=sys.stderr)
+
+    results = run(args.sizes, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    columns = [
+        "activities",
+        "body_bytes",
+        "stdlib_encode_ms",
+        "fast_encode_ms",
+        "stdlib_roundtrip_ms",
+        "fast_roundtrip_ms",
+        "passthrough_ms",
+    ]
+    print(" ".join(f"{column:>20}" for column in columns))
+    for result in results:
+        print(
+            " ".join(
+                f"{result[column]:>20.3f}" if column.endswith("_ms") else f"{result[column]:>20}"
+                for column in columns
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""
+Load driver for the backend running against the fake Garmin Connect server.
+
+Starts benchmarks/fake_garmin.py in-process and serve.py as a subprocess pointed
+at it, then drives /auth, /activities/latest, /activities?num=N and /summaries at each
+concurrency level and reports throughput, latency percentiles, backend memory
+and upstream calls, along with how long the backend took to start and the
+memory held by each of its processes. Results are printed as a table and written as JSON; with
+--baseline, runs that regressed beyond --tolerance make the command exit 1.
+
+Run from the backend directory:
+    python benchmarks/load.py --concurrency 1 10 50 --num 20 1000 --output results.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from fake_garmin import add_arguments, from_arguments, start_server
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def process_tree(pid: int) -> List[int]:
+    """Return 'pid' and its descendants, read from /proc."""
+    pids = [pid]
+    for current in pids:
+        try:
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def rss_bytes(pid: int) -> Optional[int]:
+    """Return the resident memory of a process tree, or None where /proc is unavailable."""
+    total = 0
+    for current in process_tree(pid):
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return total or None
+
+
+def process_memory(pid: int) -> List[Dict[str, Any]]:
+    """
+    Return the resident and proportional set size in MB of each process of a tree.
+    PSS splits pages shared by forked workers between them, so it adds up to what
+    the workers really use where RSS counts shared pages once per process.
+    """
+    processes = []
+    for current in process_tree(pid):
+        sizes = {}
+        try:
+            with open(f"/proc/{current}/smaps_rollup") as f:
+                for line in f:
+                    field, _, value = line.partition(":")
+                    if field in ("Rss", "Pss"):
+                        sizes[field.lower() + "_mb"] = int(value.split()[0]) / 1024
+        except OSError:
+            continue
+        processes.append({"pid": current, **sizes})
+    return processes
+
+
+def percentile(values: List[float], share: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(share * len(values)) - 1))
+    return values[index]
+
+
+class Backend:
+    """The backend served by serve.py in a subprocess."""
+
+    def __init__(self, upstream_url: str, mode: str, workers: int, response_cache: bool):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.log = tempfile.NamedTemporaryFile(prefix="backend-", suffix=".log", delete=False)
+        self.startup_seconds: Optional[float] = None
+        env = {
+            **os.environ,
+            "HOST": "127.0.0.1",
+            "PORT": str(self.port),
+            "SERVER_MODE": mode,
+            "WORKERS": str(workers),
+            "GARMIN_UPSTREAM_URL": upstream_url,
+        }
+        if not response_cache:
+            env["RESPONSE_CACHE_TTL"] = "0"
+        self.process = subprocess.Popen(
+            [sys.executable, "serve.py"],
+            cwd=BACKEND_DIR,
+            env=env,
+            stdout=self.log,
+            stderr=subprocess.STDOUT,
+        )
+
+    def wait_ready(self, timeout: float = 30) -> None:
+        """Wait for /health to answer, recording how long that took since the process started."""
+        started = time.monotonic()
+        deadline = started + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                break
+            try:
+                if httpx.get(f"{self.url}/health").status_code == 200:
+                    self.startup_seconds = time.monotonic() - started
+                    return
+            except httpx.TransportError:
+                pass
+            time.sleep(0.1)
+        with open(self.log.name) as f:
+            output = f.read()[-2000:]
+        raise RuntimeError(f"Backend did not start:\n{output}")
+
+    def rss(self) -> Optional[int]:
+        return rss_bytes(self.process.pid)
+
+    def memory(self) -> List[Dict[str, Any]]:
+        return process_memory(self.process.pid)
+
+    def stop(self) -> None:
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        os.unlink(self.log.name)
+
+
+async def drive(
+    backend: Backend, request: Dict[str, Any], concurrency: int, duration: float
+) -> Dict[str, Any]:
+    """Send 'request' from 'concurrency' workers for 'duration' seconds."""
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    rss_samples: List[int] = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=backend.url, limits=limits, timeout=120) as client:
+        deadline = time.monotonic() + duration
+
+        async def worker():
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await client.request(**request)
+                    await response.aread()
+                    status = str(response.status_code)
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        async def sample_memory():
+            while time.monotonic() < deadline:
+                rss = backend.rss()
+                if rss:
+                    rss_samples.append(rss)
+                await asyncio.sleep(0.2)
+
+        started = time.perf_counter()
+        await asyncio.gather(sample_memory(), *(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ok = sum(count for status, count in statuses.items() if status.startswith("2"))
+    return {
+        "requests": len(latencies),
+        "errors": len(latencies) - ok,
+        "statuses": statuses,
+        "throughput_rps": ok / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "mean": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p95": percentile(latencies, 0.95) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "max": latencies[-1] * 1000 if latencies else 0.0,
+        },
+        "rss_mb": {
+            "peak": max(rss_samples) / 2**20 if rss_samples else None,
+            "end": rss_samples[-1] / 2**20 if rss_samples else None,
+        },
+    }
+
+
+def scenarios(args: argparse.Namespace, token: str) -> List[tuple]:
+    """Return (name, request) pairs for the selected scenarios."""
+    headers = {"Authorization": f"Bearer {token}"}
+    selected = []
+    if "auth" in args.scenarios:
+        credentials = {"email": "runner@example.com", "password": "secret"}
+        selected.append(("auth", {"method": "POST", "url": "/auth", "json": credentials}))
+    if "latest" in args.scenarios:
+        selected.append(
+            ("latest", {"method": "GET", "url": "/activities/latest", "headers": headers})
+        )
+    if "activities" in args.scenarios:
+        for num in args.num:
+            url = f"/activities?num={num}&fields={args.fields}"
+            selected.append(
+                (f"activities?num={num}", {"method": "GET", "url": url, "headers": headers})
+            )
+    if "summaries" in args.scenarios:
+        url = "/summaries?start=2024-01-01&end=2024-01-31"
+        selected.append(("summaries", {"method": "GET", "url": url, "headers": headers}))
+    return selected
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float):
+    """Return descriptions of runs slower than their baseline by more than 'tolerance'."""
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result["scenario"], result["concurrency"]))
+        if before is None:
+            continue
+        name = f"{result['scenario']} at concurrency {result['concurrency']}"
+        if result["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {before['throughput_rps']:.1f}"
+                f" -> {result['throughput_rps']:.1f} req/s"
+            )
+        if result["latency_ms"]["p95"] > before["latency_ms"]["p95"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {before['latency_ms']['p95']:.1f}"
+                f" -> {result['latency_ms']['p95']:.1f} ms"
+            )
+    return regressions
+
+
+def print_table(results: List[Dict[str, Any]]) -> None:
+    header = f"{'scenario':<22}{'conc':>6}{'reqs':>8}{'errors':>8}{'req/s':>10}"
+    header += f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'peak MB':>10}{'upstream':>10}"
+    print(header, file=sys.stderr)
+    for r in results:
+        peak = r["rss_mb"]["peak"]
+        print(
+            f"{r['scenario']:<22}{r['concurrency']:>6}{r['requests']:>8}{r['errors']:>8}"
+            f"{r['throughput_rps']:>10.1f}{r['latency_ms']['p50']:>10.1f}"
+            f"{r['latency_ms']['p95']:>10.1f}{r['latency_ms']['p99']:>10.1f}"
+            f"{peak if peak is not None else float('nan'):>10.1f}"
+            f"{sum(r['upstream_requests'].values()):>10}",
+            file=sys.stderr,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        default=["auth", "latest", "activities", "summaries"],
+        choices=["auth", "latest", "activities", "summaries"],
+    )
+    parser.add_argument("--num", type=int, nargs="+", default=[20, 1000])
+    parser.add_argument("--fields", default="all", help="'fields' query of /activities")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per run")
+    parser.add_argument("--mode", choices=["async", "sync"], default="async")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--response-cache", action="store_true", help="Keep the backend response cache enabled"
+    )
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    parser.add_argument("--baseline", help="Compare against a previous JSON results file")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    fake = from_arguments(args)
+    server = start_server(fake)
+    upstream_url = f"http://127.0.0.1:{server.server_port}"
+    backend = Backend(upstream_url, args.mode, args.workers, args.response_cache)
+    try:
+        backend.wait_ready()
+        response = httpx.post(
+            f"{backend.url}/auth",
+            json={"email": "runner@example.com", "password": "secret"},
+            timeout=60,
+        )
+        response.raise_for_status()
+        token = response.json()["token"]
+
+        idle_memory = backend.memory()
+        results = []
+        for name, request in scenarios(args, token):
+            for concurrency in args.concurrency:
+                before = dict(fake.requests)
+                result = asyncio.run(drive(backend, request, concurrency, args.duration))
+                upstream = {
+                    path: count - before.get(path, 0)
+                    for path, count in fake.requests.items()
+                    if count != before.get(path, 0)
+                }
+                results.append(
+                    {
+                        "scenario": name,
+                        "concurrency": concurrency,
+                        **result,
+                        "upstream_requests": upstream,
+                    }
+                )
+        loaded_memory = backend.memory()
+    finally:
+        backend.stop()
+        server.shutdown()
+
+    report = {
+        "config": {
+            "mode": args.mode,
+            "workers": args.workers,
+            "duration": args.duration,
+            "response_cache": args.response_cache,
+            "fields": args.fields,
+            "upstream": {
+                "latency": args.latency,
+                "jitter": args.jitter,
+                "activities": args.activities,
+                "extra_fields": args.extra_fields,
+                "error_rate": args.error_rate,
+                "error_status": args.error_status,
+            },
+        },
+        "startup_seconds": backend.startup_seconds,
+        "processes": {"idle": idle_memory, "loaded": loaded_memory},
+        "results": results,
+    }
+    print_table(results)
+    print(f"startup {backend.startup_seconds:.2f}s", file=sys.stderr)
+    for process in loaded_memory:
+        print(
+            f"pid {process['pid']}: RSS {process.get('rss_mb', float('nan')):.1f} MB,"
+            f" PSS {process.get('pss_mb', float('nan')):.1f} MB",
+            file=sys.stderr,
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
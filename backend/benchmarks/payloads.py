@@ -0,0 +1,125 @@
+"""Synthetic Garmin Connect payloads shaped like real activity-search results."""
+
+import datetime
+import random
+from typing import Any, Dict, List
+
+ACTIVITY_TYPES = [
+    (1, "running", 17),
+    (2, "cycling", 17),
+    (9, "walking", 17),
+    (26, "lap_swimming", 27),
+    (3, "hiking", 17),
+]
+
+
+def make_activity(index: int, rng: random.Random, extra_fields: int = 0) -> Dict[str, Any]:
+    """
+    Build one activity with the fields and nesting Garmin returns from activity search.
+    :param extra_fields: Number of additional numeric metrics, to grow the payload
+    """
+    type_id, type_key, parent_type_id = ACTIVITY_TYPES[index % len(ACTIVITY_TYPES)]
+    start = datetime.datetime(2024, 1, 1) - datetime.timedelta(hours=13 * index)
+    distance = round(rng.uniform(2000, 40000), 2)
+    duration = round(rng.uniform(900, 10800), 3)
+    activity = {
+        "activityId": 10000000000 - index,
+        "activityName": f"Morning {type_key.replace('_', ' ').title()}",
+        "description": None,
+        "startTimeLocal": start.strftime("%Y-%m-%d %H:%M:%S"),
+        "startTimeGMT": (start - datetime.timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S"),
+        "activityType": {
+            "typeId": type_id,
+            "typeKey": type_key,
+            "parentTypeId": parent_type_id,
+            "isHidden": False,
+            "restricted": False,
+            "trimmable": True,
+        },
+        "eventType": {"typeId": 9, "typeKey": "uncategorized", "sortOrder": 10},
+        "distance": distance,
+        "duration": duration,
+        "elapsedDuration": duration + rng.uniform(0, 300),
+        "movingDuration": duration - rng.uniform(0, 120),
+        "elevationGain": round(rng.uniform(0, 800), 1),
+        "elevationLoss": round(rng.uniform(0, 800), 1),
+        "averageSpeed": round(distance / duration, 3),
+        "maxSpeed": round(distance / duration * 1.6, 3),
+        "startLatitude": 52.0 + rng.random(),
+        "startLongitude": 4.0 + rng.random(),
+        "endLatitude": 52.0 + rng.random(),
+        "endLongitude": 4.0 + rng.random(),
+        "ownerId": 123456,
+        "ownerDisplayName": "runner42",
+        "ownerFullName": "Test Runner",
+        "calories": round(rng.uniform(100, 2000), 1),
+        "bmrCalories": round(rng.uniform(50, 200), 1),
+        "averageHR": round(rng.uniform(110, 170), 1),
+        "maxHR": round(rng.uniform(160, 195), 1),
+        "averageRunningCadenceInStepsPerMinute": round(rng.uniform(150, 185), 2),
+        "steps": rng.randint(1000, 30000),
+        "aerobicTrainingEffect": round(rng.uniform(0, 5), 1),
+        "anaerobicTrainingEffect": round(rng.uniform(0, 5), 1),
+        "activityTrainingLoad": round(rng.uniform(10, 400), 2),
+        "vO2MaxValue": rng.randint(40, 60),
+        "deviceId": 3400000000,
+        "manufacturer": "GARMIN",
+        "lapCount": rng.randint(1, 40),
+        "hasPolyline": True,
+        "hasImages": False,
+        "favorite": False,
+        "pr": False,
+        "manualActivity": False,
+        "splitSummaries": [
+            {
+                "splitType": split_type,
+                "noOfSplits": rng.randint(1, 20),
+                "distance": round(rng.uniform(0, distance), 2),
+                "duration": round(rng.uniform(0, duration), 3),
+                "averageSpeed": round(rng.uniform(1, 6), 3),
+                "elevationGain": round(rng.uniform(0, 200), 1),
+            }
+            for split_type in ("INTERVAL_ACTIVE", "RWD_RUN", "RWD_WALK")
+        ],
+        "summarizedDiveInfo": {"summarizedDiveGases": []},
+        "userRoles": ["SCOPE_GOLF_API_READ", "SCOPE_ATP_READ", "SCOPE_DIVE_API_WRITE"],
+    }
+    for field in range(extra_fields):
+        activity[f"metric{field}"] = round(rng.uniform(0, 1000), 3)
+    return activity
+
+
+def make_activities(count: int, seed: int = 0, extra_fields: int = 0) -> List[Dict[str, Any]]:
+    """Build 'count' activities, newest first, deterministically for a given seed."""
+    rng = random.Random(seed)
+    return [make_activity(index, rng, extra_fields) for index in range(count)]
+
+
+def make_daily_summary(calendar_date: str, display_name: str, seed: int = 0) -> Dict[str, Any]:
+    """Build a daily summary like Garmin's usersummary-service returns for one day."""
+    rng = random.Random(f"{seed}-{calendar_date}")
+    return {
+        "userProfileId": 123456,
+        "displayName": display_name,
+        "calendarDate": calendar_date,
+        "privacyProtected": False,
+        "totalKilocalories": round(rng.uniform(1800, 3500), 1),
+        "activeKilocalories": round(rng.uniform(100, 1500), 1),
+        "bmrKilocalories": round(rng.uniform(1600, 1900), 1),
+        "totalSteps": rng.randint(2000, 25000),
+        "dailyStepGoal": 10000,
+        "totalDistanceMeters": rng.randint(1500, 20000),
+        "floorsAscended": round(rng.uniform(0, 30), 2),
+        "floorsDescended": round(rng.uniform(0, 30), 2),
+        "minHeartRate": rng.randint(40, 55),
+        "maxHeartRate": rng.randint(120, 190),
+        "restingHeartRate": rng.randint(45, 65),
+        "averageStressLevel": rng.randint(15, 50),
+        "maxStressLevel": rng.randint(60, 99),
+        "bodyBatteryHighestValue": rng.randint(60, 100),
+        "bodyBatteryLowestValue": rng.randint(5, 40),
+        "sleepingSeconds": rng.randint(18000, 32000),
+        "moderateIntensityMinutes": rng.randint(0, 90),
+        "vigorousIntensityMinutes": rng.randint(0, 60),
+        "intensityMinutesGoal": 150,
+    }
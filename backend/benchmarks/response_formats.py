@@ -0,0 +1,98 @@
+"""
+Benchmark of activity list response formats.
+
+Compares, for lists of 100, 1000 and 5000 activities with the dashboard's
+'summary' fields and with all fields, the body size of each /activities format
+uncompressed, gzipped and Brotli-compressed, and the time to encode and
+decode it.
+
+Run from the backend directory: python benchmarks/response_formats.py
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from flask import Flask  # noqa: E402
+
+from compression import COMPRESS_ENCODINGS, compress  # noqa: E402
+from formats import available_formats, encode_columns, to_columns  # noqa: E402
+from json_provider import FastJSONProvider  # noqa: E402
+from payloads import make_activities  # noqa: E402
+from projection import parse_fields, project  # noqa: E402
+
+
+def best_of(fn, repeat: int) -> float:
+    """Return the fastest of 'repeat' runs of 'fn', in milliseconds."""
+    number = 1
+    while timeit.timeit(fn, number=number) < 0.05 and number < 1000:
+        number *= 2
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1000
+
+
+def run(sizes, repeat):
+    provider = FastJSONProvider(Flask(__name__))
+    formats = [name for name in available_formats() if name != "ndjson"]
+    decoders = {"json": provider.loads, "columns": provider.loads}
+    if "msgpack" in formats:
+        import msgpack
+
+        decoders["msgpack"] = msgpack.unpackb
+
+    def encode(activities, name):
+        if name == "json":
+            return provider.dumps(activities)
+        return encode_columns(to_columns(activities), name, provider.dumps)
+
+    results = []
+    for size in sizes:
+        for fields in ("summary", "all"):
+            tree = parse_fields(fields)
+            activities = [project(activity, tree) for activity in make_activities(size)]
+            for name in formats:
+                body = encode(activities, name)
+                payload = body.encode() if isinstance(body, str) else body
+                result = {
+                    "activities": size,
+                    "fields": fields,
+                    "format": name,
+                    "bytes": len(payload),
+                    "encode_ms": best_of(lambda: encode(activities, name), repeat),
+                    "decode_ms": best_of(lambda: decoders[name](payload), repeat),
+                }
+                for encoding in ("gzip", "br"):
+                    if encoding in COMPRESS_ENCODINGS:
+                        result[f"{encoding}_bytes"] = len(compress(payload, encoding))
+                results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    columns = list(results[0])
+    print(" ".join(f"{column:>12}" for column in columns))
+    for result in results:
+        print(
+            " ".join(
+                f"{result[column]:>12.3f}" if column.endswith("_ms") else f"{result[column]:>12}"
+                for column in columns
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
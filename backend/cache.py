@@ -0,0 +1,119 @@
+"""Thread-safe in-memory caches."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after a fixed time-to-live."""
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        ttl: Optional[float] = 300.0,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Initialize the cache.
+        :param maxsize: Maximum number of entries kept before the least recently used is evicted
+        :param ttl: Seconds an entry stays valid, or None to keep entries until evicted
+        :param timer: Monotonic clock, overridable for tests
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._data: "OrderedDict[Hashable, tuple[Optional[float], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for 'key' and mark it as recently used."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+
+            expires_at, value = item
+            if expires_at is not None and expires_at <= self._timer():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for 'key' without counting a hit or marking it as used."""
+        with self._lock:
+            item = self._data.get(key)
+        if item is None or (item[0] is not None and item[0] <= self._timer()):
+            return default
+        return item[1]
+
+    def values(self) -> List[Any]:
+        """Return a snapshot of the values that have not expired."""
+        now = self._timer()
+        with self._lock:
+            items = list(self._data.values())
+        return [value for expires_at, value in items if expires_at is None or expires_at > now]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store 'value' under 'key', evicting the least recently used entry when full."""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = self._timer() + ttl if ttl is not None else None
+
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove 'key' from the cache and return its value."""
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def pop_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Remove every entry whose key satisfies 'predicate' and return how many there were."""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        """Remove all entries and reset the counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            item = self._data.get(key)
+            return item is not None and (item[0] is None or item[0] > self._timer())
+
+    def stats(self) -> Dict[str, int]:
+        """Return a snapshot of the cache counters."""
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,97 @@
+"""
+Negotiated gzip and Brotli compression of response bodies.
+
+Brotli is only offered when the brotli package is installed. Both encoders
+run at moderate levels, which keep most of the size reduction at a fraction
+of the CPU cost of their maximum settings.
+"""
+
+import os
+import zlib
+from typing import Iterable, Iterator, Optional, Union
+
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - exercised only without brotli
+    brotli = None
+
+# Content encodings offered, in order of preference (empty disables compression)
+COMPRESS_ENCODINGS = [
+    name.strip()
+    for name in os.getenv("COMPRESS_ENCODINGS", "br,gzip").split(",")
+    if name.strip() in ("br", "gzip") and (name.strip() != "br" or brotli is not None)
+]
+# Smaller bodies are sent uncompressed, they would barely shrink
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Media types worth compressing
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/vnd.gconnect.columns+json",
+    "application/msgpack",
+)
+
+
+def choose_encoding(accept_encoding: Optional[str], mimetype: str) -> Optional[str]:
+    """Return the content encoding to compress a 'mimetype' body with, if any."""
+    if not accept_encoding or mimetype not in COMPRESSIBLE_TYPES or not COMPRESS_ENCODINGS:
+        return None
+    return parse_accept_header(accept_encoding, Accept).best_match(COMPRESS_ENCODINGS)
+
+
+class Compressor:
+    """Incremental encoder for streamed bodies."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._encoder = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            # wbits 31 writes the gzip header and trailer
+            self._encoder = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        """Feed 'data', returning whatever compressed output is ready."""
+        if self.encoding == "br":
+            return self._encoder.process(data)
+        return self._encoder.compress(data)
+
+    def flush(self) -> bytes:
+        """Return the output of everything fed so far, so a client can decode it right away."""
+        if self.encoding == "br":
+            return self._encoder.flush()
+        return self._encoder.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        """Return the rest of the compressed output."""
+        return self._encoder.finish() if self.encoding == "br" else self._encoder.flush()
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress a whole body."""
+    compressor = Compressor(encoding)
+    return compressor.compress(data) + compressor.finish()
+
+
+def iter_compressed(chunks: Iterable[Union[str, bytes]], encoding: str) -> Iterator[bytes]:
+    """
+    Compress a streamed body, closing the original body when done. Every chunk is
+    flushed, so the client receives each row as it is produced.
+    """
+    compressor = Compressor(encoding)
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+            yield data + compressor.flush()
+        yield compressor.finish()
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
@@ -0,0 +1,101 @@
+"""
+Deadlines of the requests being served.
+
+A request may take REQUEST_TIMEOUT seconds, or less when its X-Request-Timeout
+header asks for less. The deadline is kept in a context variable: Garmin calls
+made for the request, from its thread, its coroutine, threads started with
+asyncio.to_thread or functions wrapped with 'bound', are given the time left as
+their timeout, and a request out of time stops calling Garmin. The deadline
+covers the work done before a response starts; a body streamed afterwards, such
+as a long activity list or an export archive, is not cut short by it.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Callable, Iterator, Optional, TypeVar
+
+# Longest a request may wait on Garmin before it fails (0 disables deadlines)
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "30"))
+
+# Request header with the seconds a client is willing to wait, capped at REQUEST_TIMEOUT
+TIMEOUT_HEADER = "X-Request-Timeout"
+
+# Shortest timeout handed to a call, so one made right at the deadline fails at once
+MIN_TIMEOUT = 0.001
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+T = TypeVar("T")
+
+
+def request_timeout(header: Optional[str]) -> Optional[float]:
+    """
+    Return the seconds a request may take given its X-Request-Timeout header,
+    None when deadlines are disabled. Malformed or non-positive values are ignored.
+    """
+    timeout = REQUEST_TIMEOUT if REQUEST_TIMEOUT > 0 else None
+    try:
+        asked = float(header) if header else None
+    except ValueError:
+        asked = None
+    if asked is None or not 0 < asked < float("inf"):
+        return timeout
+    return asked if timeout is None else min(asked, timeout)
+
+
+def start(seconds: Optional[float]) -> Token:
+    """Set the deadline of the current request 'seconds' from now, or none for None."""
+    return _deadline.set(None if seconds is None else time.monotonic() + seconds)
+
+
+def reset(token: Token) -> None:
+    """Restore the deadline 'start' replaced."""
+    _deadline.reset(token)
+
+
+def clear() -> None:
+    """Lift the deadline, e.g. once a response has started streaming."""
+    _deadline.set(None)
+
+
+def remaining() -> Optional[float]:
+    """Return the seconds left before the deadline, negative once it passed, None without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def timeout(default: float) -> float:
+    """Return the timeout of a call: 'default', or the time left when that is shorter."""
+    left = remaining()
+    return default if left is None else max(min(default, left), MIN_TIMEOUT)
+
+
+@contextmanager
+def within(seconds: Optional[float]) -> Iterator[None]:
+    """Bring the deadline forward to 'seconds' from now for the block, if that is sooner."""
+    if seconds is None:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(deadline, current))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def bound(fn: Callable[..., T]) -> Callable[..., T]:
+    """Wrap 'fn' to run under the current deadline in a pool thread."""
+    deadline = _deadline.get()
+
+    def run(*args, **kwargs) -> T:
+        token = _deadline.set(deadline)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _deadline.reset(token)
+
+    return run
@@ -0,0 +1,276 @@
+"""
+Bulk export of activity files (original FIT, GPX, TCX or KML).
+
+Files are downloaded concurrently over the shared connection pools and
+streamed in chunks, either to a directory or into a zip archive sent while it
+is being built, so memory use stays flat however long the history is.
+Directory exports are resumable: files that already exist are skipped and
+files are only moved into place once complete.
+
+Export to a directory from the backend directory:
+    GARMINTOKENS=<tokenstore> python export.py --out exports --format gpx --start 2020-01-01
+"""
+
+import argparse
+import datetime
+import functools
+import itertools
+import logging
+import os
+import tempfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Activity files downloaded in parallel by one export
+EXPORT_CONCURRENCY = int(os.getenv("EXPORT_CONCURRENCY", "4"))
+# Bytes read from Garmin and written out at a time
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", str(64 * 1024)))
+# Bytes of a downloaded file held in memory before it is spooled to a temporary file
+EXPORT_SPOOL_SIZE = int(os.getenv("EXPORT_SPOOL_SIZE", str(1024 * 1024)))
+# Maximum number of activities in one /activities/export archive
+EXPORT_MAX_ACTIVITIES = int(os.getenv("EXPORT_MAX_ACTIVITIES", "10000"))
+
+# File extension per export format; original FIT files come zipped by Garmin
+FILE_EXTENSIONS = {"fit": "zip", "gpx": "gpx", "tcx": "tcx", "kml": "kml"}
+
+
+def parse_format(value: Optional[str]) -> str:
+    """Validate the 'format' query value, 'fit' by default."""
+    value = (value or "").strip().lower() or "fit"
+    if value not in FILE_EXTENSIONS:
+        raise ValueError(f"Parameter 'format' must be one of {', '.join(FILE_EXTENSIONS)}")
+    return value
+
+
+def parse_ids(value: Optional[str]) -> Optional[List[int]]:
+    """Parse the comma-separated 'ids' query value, None when it is absent."""
+    if not value:
+        return None
+    try:
+        return [int(part) for part in value.split(",") if part.strip()]
+    except ValueError:
+        raise ValueError("Parameter 'ids' must be comma-separated activity IDs") from None
+
+
+def file_name(activity_id: int, file_format: str) -> str:
+    """Return the name an activity file is exported under."""
+    return f"{activity_id}.{FILE_EXTENSIONS[file_format]}"
+
+
+def select_activity_ids(
+    activities: Iterable[Dict[str, Any]], first: datetime.date, last: datetime.date
+) -> List[int]:
+    """
+    Return the IDs of activities started from 'first' to 'last'.
+    :param activities: Activities newest first; reading stops at the first older than 'first'
+    """
+    start, end = first.isoformat(), last.isoformat()
+    ids = []
+    for activity in activities:
+        date = (activity.get("startTimeLocal") or "")[:10]
+        if date < start:
+            break
+        if date <= end:
+            ids.append(activity["activityId"])
+    return ids
+
+
+def download_to(garmin, activity_id: int, file_format: str, out: IO[bytes], chunk_size: int):
+    """Write an activity file to 'out' chunk by chunk."""
+    path = garmin.activity_file_path(activity_id, file_format)
+    for chunk in garmin.iter_download(path, chunk_size):
+        out.write(chunk)
+
+
+def export_to_directory(
+    garmin,
+    activity_ids: Iterable[int],
+    directory: str,
+    file_format: str = "fit",
+    concurrency: int = EXPORT_CONCURRENCY,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> Dict[str, Any]:
+    """
+    Download activity files into 'directory', skipping files that already exist.
+    Files are written under a '.part' name and renamed once complete, so an
+    interrupted export is resumed by running it again.
+    :return: Number of files downloaded and skipped, and the error of each failed activity
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    def save(activity_id: int) -> bool:
+        target = os.path.join(directory, file_name(activity_id, file_format))
+        if os.path.exists(target):
+            return False
+        partial = f"{target}.part"
+        with open(partial, "wb") as out:
+            download_to(garmin, activity_id, file_format, out, chunk_size)
+        os.replace(partial, target)
+        return True
+
+    result: Dict[str, Any] = {"downloaded": 0, "skipped": 0, "failed": {}}
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+        futures = {executor.submit(save, activity_id): activity_id for activity_id in activity_ids}
+        for future in as_completed(futures):
+            activity_id = futures[future]
+            try:
+                result["downloaded" if future.result() else "skipped"] += 1
+            except Exception as e:
+                logger.error(f"Error exporting activity {activity_id}: {e}")
+                result["failed"][activity_id] = str(e)
+    return result
+
+
+class _ChunkSink:
+    """Write-only stream collecting what zipfile writes until it is drained."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(
+    garmin,
+    activity_ids: Iterable[int],
+    file_format: str = "fit",
+    concurrency: int = EXPORT_CONCURRENCY,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+    spool_size: int = EXPORT_SPOOL_SIZE,
+) -> Iterator[bytes]:
+    """
+    Yield a zip archive of activity files while they are downloaded.
+
+    Up to 'concurrency' files are fetched ahead into spooled temporary files
+    and added to the archive in order. Activities whose file cannot be
+    downloaded are listed in an 'errors.txt' entry at the end.
+    """
+    sink = _ChunkSink()
+    # Original files are already zipped by Garmin, the text formats compress well
+    compression = zipfile.ZIP_STORED if file_format == "fit" else zipfile.ZIP_DEFLATED
+    ids = iter(activity_ids)
+    failed: Dict[int, str] = {}
+
+    fetch = functools.partial(_fetch, garmin, file_format, chunk_size, spool_size)
+    executor = ThreadPoolExecutor(max_workers=max(concurrency, 1))
+    pending: deque = deque()
+    try:
+        for activity_id in itertools.islice(ids, max(concurrency, 1)):
+            pending.append((activity_id, executor.submit(fetch, activity_id)))
+
+        with zipfile.ZipFile(sink, "w", compression=compression) as archive:
+            while pending:
+                activity_id, future = pending.popleft()
+                next_id = next(ids, None)
+                if next_id is not None:
+                    pending.append((next_id, executor.submit(fetch, next_id)))
+                try:
+                    spool = future.result()
+                except Exception as e:
+                    logger.error(f"Error exporting activity {activity_id}: {e}")
+                    failed[activity_id] = str(e)
+                    continue
+
+                name = file_name(activity_id, file_format)
+                yield from _write_entry(archive, sink, spool, name, compression, chunk_size)
+                data = sink.drain()
+                if data:
+                    yield data
+
+            if failed:
+                errors = "".join(
+                    f"{activity_id}: {error}\n" for activity_id, error in failed.items()
+                )
+                archive.writestr("errors.txt", errors)
+        yield sink.drain()
+    finally:
+        _discard(executor, pending)
+
+
+def _fetch(garmin, file_format: str, chunk_size: int, spool_size: int, activity_id: int):
+    """Download an activity file into a spooled temporary file."""
+    spool = tempfile.SpooledTemporaryFile(max_size=spool_size)
+    try:
+        download_to(garmin, activity_id, file_format, spool, chunk_size)
+    except BaseException:
+        spool.close()
+        raise
+    return spool
+
+
+def _write_entry(archive, sink, spool, name, compression, chunk_size) -> Iterator[bytes]:
+    """Copy a downloaded file into the archive, yielding the archive's bytes as they are written."""
+    with spool:
+        entry = zipfile.ZipInfo(name, time.localtime()[:6])
+        entry.compress_type = compression
+        entry.file_size = spool.tell()
+        spool.seek(0)
+        with archive.open(entry, "w") as out:
+            for chunk in iter(lambda: spool.read(chunk_size), b""):
+                out.write(chunk)
+                data = sink.drain()
+                if data:
+                    yield data
+
+
+def _discard(executor: ThreadPoolExecutor, pending: deque) -> None:
+    """Discard the files fetched ahead for a client that went away, and stop the executor."""
+    for _, future in pending:
+        future.cancel()
+    executor.shutdown(wait=True)
+    for _, future in pending:
+        if future.done() and not future.cancelled() and future.exception() is None:
+            future.result().close()
+
+
+def main():
+    from garmin_client import GarminClient
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--out", required=True, help="Directory to export the files to")
+    parser.add_argument("--format", default="fit", choices=list(FILE_EXTENSIONS))
+    parser.add_argument("--ids", help="Comma-separated activity IDs to export")
+    parser.add_argument("--start", help="First day (YYYY-MM-DD) when exporting by date")
+    parser.add_argument("--end", help="Last day (YYYY-MM-DD), today by default")
+    parser.add_argument("--concurrency", type=int, default=EXPORT_CONCURRENCY)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    garmin = GarminClient(lazy_profile=True)
+    garmin.login(os.getenv("GARMINTOKENS"))
+
+    ids = parse_ids(args.ids)
+    if ids is None:
+        first = datetime.date.fromisoformat(args.start) if args.start else datetime.date.min
+        last = datetime.date.fromisoformat(args.end) if args.end else datetime.date.today()
+        activities = garmin.iter_activities(
+            page_size=100,
+            start_date=args.start and first.isoformat(),
+            end_date=last.isoformat(),
+        )
+        ids = select_activity_ids(activities, first, last)
+
+    result = export_to_directory(garmin, ids, args.out, args.format, args.concurrency)
+    logger.info(
+        f"Downloaded {result['downloaded']}, skipped {result['skipped']},"
+        f" failed {len(result['failed'])} of {len(ids)} activities"
+    )
+
+
+if __name__ == "__main__":
+    main()
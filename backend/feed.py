@@ -0,0 +1,219 @@
+"""
+Server-Sent Events feed of new activities.
+
+One poller per Garmin account asks for the latest activity, however many
+dashboards are subscribed, and pushes an event to all of them only when the
+latest activity ID changes. The interval starts at FEED_MIN_INTERVAL and grows
+while nothing changes, up to FEED_MAX_INTERVAL, so idle accounts cost few
+upstream calls. Pollers stop with their last subscriber.
+"""
+
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from projection import parse_fields, project
+
+logger = logging.getLogger(__name__)
+
+# Seconds between polls of an account whose latest activity just changed
+FEED_MIN_INTERVAL = float(os.getenv("FEED_MIN_INTERVAL", "30"))
+# Longest interval between polls of an account whose latest activity stays the same
+FEED_MAX_INTERVAL = float(os.getenv("FEED_MAX_INTERVAL", "300"))
+# Seconds between keep-alive comments on idle streams
+FEED_HEARTBEAT = float(os.getenv("FEED_HEARTBEAT", "15"))
+# Accounts polled in parallel
+FEED_POLL_CONCURRENCY = int(os.getenv("FEED_POLL_CONCURRENCY", "8"))
+
+# Interval growth after a poll that found nothing new
+BACKOFF_FACTOR = 1.5
+# Milliseconds EventSource clients wait before reconnecting
+RETRY_MS = 10000
+
+KEEPALIVE = ": keepalive\n\n"
+
+
+def format_event(activity: Dict[str, Any]) -> str:
+    """Format an activity as an SSE 'activity' event whose ID is the activity ID."""
+    data = json.dumps(activity, separators=(",", ":"))
+    return f"id: {activity['activityId']}\nevent: activity\ndata: {data}\n\n"
+
+
+class Subscription:
+    """One open stream, receiving formatted events through 'deliver'."""
+
+    def __init__(self, key: str, deliver: Callable[[str], None]):
+        self.key = key
+        self.deliver = deliver
+
+
+class AccountPoller:
+    """Latest activity of one account and the streams subscribed to it."""
+
+    def __init__(self, key: str, garmin, interval: float):
+        self.key = key
+        self.garmin = garmin
+        self.subscribers: Set[Subscription] = set()
+        self.latest: Optional[Dict[str, Any]] = None
+        self.interval = interval
+        self.next_poll = 0.0
+        self.polling = False
+
+
+class ActivityFeed:
+    """
+    Shared pollers of the latest activity per account.
+
+    A scheduler thread, started on first use, hands due polls to a small
+    pool. Subscribers are called from those threads and must not block.
+    """
+
+    def __init__(
+        self,
+        min_interval: float = FEED_MIN_INTERVAL,
+        max_interval: float = FEED_MAX_INTERVAL,
+        concurrency: int = FEED_POLL_CONCURRENCY,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.concurrency = concurrency
+        self._timer = timer
+        self._fields = parse_fields("summary")
+        self._pollers: Dict[str, AccountPoller] = {}
+        self._schedule: List[tuple] = []
+        self._wakeup = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def subscribe(
+        self,
+        key: str,
+        garmin,
+        deliver: Callable[[str], None],
+        last_event_id: Optional[str] = None,
+    ) -> Subscription:
+        """
+        Subscribe to the new activities of account 'key'.
+        The current latest activity is delivered right away unless it is 'last_event_id'.
+        :param garmin: Logged-in client of the account, used by the poller from now on
+        """
+        subscription = Subscription(key, deliver)
+        with self._wakeup:
+            poller = self._pollers.get(key)
+            if poller is None:
+                poller = self._pollers[key] = AccountPoller(key, garmin, self.min_interval)
+                self._push(poller, self._timer())
+            poller.garmin = garmin
+            poller.subscribers.add(subscription)
+            latest = poller.latest
+        if latest is not None and str(latest["activityId"]) != last_event_id:
+            deliver(format_event(latest))
+        self._start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Close a subscription, stopping the account's poller if it was the last one."""
+        with self._wakeup:
+            poller = self._pollers.get(subscription.key)
+            if poller is None:
+                return
+            poller.subscribers.discard(subscription)
+            if not poller.subscribers:
+                del self._pollers[subscription.key]
+
+    def accounts(self) -> int:
+        """Return the number of accounts being polled."""
+        return len(self._pollers)
+
+    def subscribers(self) -> int:
+        """Return the number of open subscriptions."""
+        with self._wakeup:
+            return sum(len(poller.subscribers) for poller in self._pollers.values())
+
+    def poll(self, poller: AccountPoller) -> None:
+        """Fetch the latest activity of an account and notify its subscribers if it changed."""
+        error: Optional[Exception] = None
+        activity = None
+        try:
+            activity = project(poller.garmin.get_last_activity(), self._fields)
+        except Exception as e:
+            error = e
+
+        with self._wakeup:
+            poller.polling = False
+            if self._pollers.get(poller.key) is not poller:
+                return
+            if error is not None:
+                logger.warning(f"Error polling the latest activity of {poller.key}: {error}")
+                retry_after = getattr(error, "retry_after", 0)
+                poller.interval = max(min(poller.interval * 2, self.max_interval), retry_after)
+                changed = False
+            else:
+                previous = poller.latest["activityId"] if poller.latest else None
+                current = activity["activityId"] if activity else None
+                changed = current is not None and current != previous
+                if changed:
+                    poller.latest = activity
+                    poller.interval = self.min_interval
+                else:
+                    poller.interval = min(poller.interval * BACKOFF_FACTOR, self.max_interval)
+            self._push(poller, self._timer() + poller.interval)
+            subscribers = list(poller.subscribers) if changed else []
+
+        if subscribers:
+            event = format_event(activity)
+            for subscription in subscribers:
+                try:
+                    subscription.deliver(event)
+                except Exception as e:
+                    # e.g. the event loop of a stream that is shutting down
+                    logger.warning(f"Error delivering an activity event: {e}")
+
+    def run_due(self) -> List[AccountPoller]:
+        """Take the pollers that are due, marking them as polling."""
+        due = []
+        with self._wakeup:
+            now = self._timer()
+            while self._schedule and self._schedule[0][0] <= now:
+                _, _, poller = heapq.heappop(self._schedule)
+                if self._pollers.get(poller.key) is poller and not poller.polling:
+                    poller.polling = True
+                    due.append(poller)
+        return due
+
+    def _push(self, poller: AccountPoller, when: float) -> None:
+        poller.next_poll = when
+        heapq.heappush(self._schedule, (when, id(poller), poller))
+        self._wakeup.notify()
+
+    def _start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._wakeup:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._executor = ThreadPoolExecutor(
+                max_workers=max(self.concurrency, 1), thread_name_prefix="activity-feed-poll"
+            )
+            self._thread = threading.Thread(target=self._run, name="activity-feed", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._wakeup:
+                due = self.run_due()
+                if not due:
+                    timeout = self._schedule[0][0] - self._timer() if self._schedule else None
+                    self._wakeup.wait(timeout)
+                    continue
+            for poller in due:
+                self._executor.submit(self.poll, poller)
+
+
+activity_feed = ActivityFeed()
@@ -0,0 +1,118 @@
+"""
+Filters of activity lists by type and start date.
+
+Garmin's activity search filters by type and date itself, so filters are
+sent upstream with every page request. The date range is also enforced while
+paging, newest first: activities after 'endDate' are skipped and reading stops
+at the first one before 'startDate'. A short range costs a page or two however
+long the history is, even from an upstream that ignores the parameters.
+"""
+
+import datetime
+import re
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, NamedTuple, Optional
+
+# Garmin activity type keys, e.g. 'running' or 'lap_swimming'
+TYPE_KEY = re.compile(r"[a-z0-9_]+")
+
+
+class ActivityFilter(NamedTuple):
+    activity_type: Optional[str] = None
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+
+    def search(self) -> Dict[str, Optional[str]]:
+        """Return the GarminClient keyword arguments pushing the filter down to Garmin."""
+        return {
+            "activitytype": self.activity_type,
+            "start_date": self.start_date,
+            "end_date": self.end_date,
+        }
+
+
+def parse_filter(
+    activity_type: Optional[str], start_date: Optional[str], end_date: Optional[str]
+) -> Optional[ActivityFilter]:
+    """
+    Parse the 'type', 'startDate' and 'endDate' query values (dates YYYY-MM-DD, inclusive).
+    :return: The filter, None when no value is set
+    :raise ValueError: When a value is malformed or 'startDate' is after 'endDate'
+    """
+    activity_type = (activity_type or "").strip().lower() or None
+    if activity_type and not TYPE_KEY.fullmatch(activity_type):
+        raise ValueError("Parameter 'type' must be an activity type key such as 'running'")
+    try:
+        first = datetime.date.fromisoformat(start_date) if start_date else None
+        last = datetime.date.fromisoformat(end_date) if end_date else None
+    except ValueError:
+        raise ValueError(
+            "Parameters 'startDate' and 'endDate' must be dates formatted YYYY-MM-DD"
+        ) from None
+    if first and last and first > last:
+        raise ValueError("Parameter 'startDate' must not be after 'endDate'")
+    if not (activity_type or first or last):
+        return None
+    return ActivityFilter(
+        activity_type,
+        first.isoformat() if first else None,
+        last.isoformat() if last else None,
+    )
+
+
+def in_range(activity: Dict[str, Any], activity_filter: ActivityFilter) -> Optional[bool]:
+    """
+    Place an activity against the filter's date range.
+    :return: True inside it, False after it, None before it, when reading can stop
+    """
+    day = (activity.get("startTimeLocal") or "")[:10]
+    if not day:
+        return True
+    if activity_filter.start_date and day < activity_filter.start_date:
+        return None
+    return not activity_filter.end_date or day <= activity_filter.end_date
+
+
+def filter_activities(
+    activities: Iterable[Dict[str, Any]], activity_filter: ActivityFilter, limit: int
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield up to 'limit' activities in the filter's date range.
+    :param activities: Activities newest first; closed once reading stops
+    """
+    count = 0
+    try:
+        for activity in activities:
+            placed = in_range(activity, activity_filter)
+            if placed is None:
+                return
+            if placed:
+                yield activity
+                count += 1
+                if count >= limit:
+                    return
+    finally:
+        close = getattr(activities, "close", None)
+        if close is not None:
+            close()
+
+
+async def afilter_activities(
+    activities: AsyncIterator[Dict[str, Any]], activity_filter: ActivityFilter, limit: int
+) -> AsyncIterator[Dict[str, Any]]:
+    """Like filter_activities, reading from an async iterator."""
+    count = 0
+    try:
+        async for activity in activities:
+            placed = in_range(activity, activity_filter)
+            if placed is None:
+                return
+            if placed:
+                yield activity
+                count += 1
+                if count >= limit:
+                    return
+    finally:
+        # Stop the upstream pagination behind the iterator right away
+        aclose = getattr(activities, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -0,0 +1,92 @@
+"""
+Response formats of activity lists.
+
+Besides a JSON array and NDJSON, activities can be sent column by column:
+every field name appears once, followed by the values of all activities, which
+removes the keys repeated on every element of large lists. The columns are
+sent as JSON or, when msgpack is installed, as MessagePack.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+from werkzeug.datastructures import MIMEAccept
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - exercised only without msgpack
+    msgpack = None
+
+# Media type of each format, in the order preferred when the client accepts several
+FORMATS = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "columns": "application/vnd.gconnect.columns+json",
+    "msgpack": "application/msgpack",
+}
+# Other media types clients send for a format
+ALIASES = {"application/x-msgpack": "msgpack", "application/vnd.msgpack": "msgpack"}
+
+# Formats holding the activities as columns
+COLUMNAR = ("columns", "msgpack")
+
+
+def available_formats() -> List[str]:
+    """Return the formats this process can produce."""
+    return [name for name in FORMATS if name != "msgpack" or msgpack is not None]
+
+
+def negotiate_format(value: Optional[str], accept: MIMEAccept) -> str:
+    """
+    Pick the response format from the 'format' query value, or else the Accept header.
+    :raise ValueError: When 'format' names a format that is unknown or unavailable
+    """
+    formats = available_formats()
+    if value:
+        if value not in formats:
+            raise ValueError(f"Parameter 'format' must be one of {', '.join(formats)}")
+        return value
+    offered = [FORMATS[name] for name in formats]
+    offered += [alias for alias, name in ALIASES.items() if name in formats]
+    mimetype = accept.best_match(offered, default=FORMATS["json"])
+    return ALIASES.get(mimetype) or next(name for name in formats if FORMATS[name] == mimetype)
+
+
+def to_columns(activities: Iterable[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """
+    Lay activities out as one array per field, nested fields under dotted names such as
+    'activityType.typeKey'. Fields an activity does not have are null.
+    """
+    columns: Dict[str, List[Any]] = {}
+    count = 0
+
+    def add(values: Dict[str, Any], prefix: str) -> None:
+        for name, value in values.items():
+            if isinstance(value, dict) and value:
+                add(value, f"{prefix}{name}.")
+                continue
+            path = prefix + name
+            column = columns.get(path)
+            if column is None:
+                column = columns[path] = [None] * count
+            elif len(column) < count:
+                # Pad for the activities that lacked this field
+                column.extend([None] * (count - len(column)))
+            column.append(value)
+
+    for activity in activities:
+        add(activity, "")
+        count += 1
+    for column in columns.values():
+        column.extend([None] * (count - len(column)))
+    return columns
+
+
+def encode_columns(columns: Dict[str, List[Any]], name: str, dumps) -> Any:
+    """
+    Serialize columns in format 'name'.
+    :param dumps: JSON serializer used for the 'columns' format
+    :return: A string for JSON, bytes for MessagePack
+    """
+    if name == "msgpack":
+        return msgpack.packb(columns, use_bin_type=True)
+    return dumps(columns)
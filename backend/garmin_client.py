@@ -1,10 +1,32 @@
 """Direct Garth-based Garmin Connect client implementation."""
 
+import asyncio
 import logging
 import os
-from typing import Any, Dict, List, Optional
-
-import garth
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from garth.auth_tokens import OAuth2Token
+
+import deadline
+from metrics import (
+    timed_login,
+    timed_upstream,
+    token_decode_duration,
+    upstream_path,
+    upstream_response_size,
+)
+from singleflight import upstream_flight
+from throttle import UpstreamPolicy, upstream_policy
+from transport import (
+    AsyncTransport,
+    PooledGarthClient,
+    SharedTransport,
+    shared_async_transport,
+    shared_transport,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +35,21 @@ class GarminConnectAuthenticationError(Exception):
     """Raised when authentication is failed."""
 
 
+async def gather_or_cancel(*aws: Awaitable[Any]) -> List[Any]:
+    """
+    Like asyncio.gather, but cancel the other awaitables as soon as one fails, so a failed
+    fan-out stops calling Garmin, as the threaded paths do by cancelling pending futures.
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
 class GarminClient:
     """Direct Garth-based client for Garmin Connect API."""
 
@@ -23,53 +60,334 @@ class GarminClient:
         is_cn: bool = False,
         prompt_mfa=None,
         return_on_mfa: bool = False,
+        lazy_profile: bool = False,
+        transport: Optional[SharedTransport] = None,
+        async_transport: Optional[AsyncTransport] = None,
+        policy: Optional[UpstreamPolicy] = None,
     ):
-        """Initialize Garmin client."""
+        """
+        Initialize Garmin client.
+        :param lazy_profile: Defer fetching the profile and unit system on token logins
+            until one of them is first accessed
+        :param transport: Connection pools to send requests through, defaults to the
+            process-wide shared transport
+        :param async_transport: Connection pools used by the *_async methods, defaults to
+            the process-wide shared async transport
+        :param policy: Rate limiter, retries and circuit breaker applied to API calls,
+            defaults to the process-wide policy
+        """
         self.username = email
         self.password = password
         self.is_cn = is_cn
         self.prompt_mfa = prompt_mfa
         self.return_on_mfa = return_on_mfa
+        self.lazy_profile = lazy_profile
 
         # API endpoints
         self.garmin_connect_user_settings_url = "/userprofile-service/userprofile/user-settings"
+        self.garmin_connect_social_profile_url = "/userprofile-service/socialProfile"
         self.garmin_connect_daily_summary_url = "/usersummary-service/usersummary/daily"
         self.garmin_connect_activities = "/activitylist-service/activities/search/activities"
-
-        # Initialize garth client
-        self.garth = garth.Client(
+        self.garmin_connect_activity_files = "/download-service/files/activity"
+        self.garmin_connect_activity_export = "/download-service/export"
+
+        # Initialize garth client on top of the shared connection pools
+        self.transport = transport or shared_transport
+        self.async_transport = async_transport or shared_async_transport
+        self.policy = policy or upstream_policy
+        self.garth = PooledGarthClient(
+            transport=self.transport,
             domain="garmin.cn" if is_cn else "garmin.com",
-            pool_connections=20,
-            pool_maxsize=20,
         )
 
-        self.display_name = None
-        self.full_name = None
-        self.unit_system = None
+        self._display_name = None
+        self._full_name = None
+        self._unit_system = None
+        self._profile_pending = False
+        self._settings_pending = False
+        self._profile_lock = threading.Lock()
+        self._token_lock = threading.Lock()
+
+    @property
+    def display_name(self) -> Optional[str]:
+        """Garmin display name, fetched on first access for lazy logins."""
+        if self._profile_pending:
+            self._resolve_profile()
+        return self._display_name
+
+    @display_name.setter
+    def display_name(self, value: Optional[str]):
+        self._display_name = value
+
+    @property
+    def full_name(self) -> Optional[str]:
+        """Full name of the user, fetched on first access for lazy logins."""
+        if self._profile_pending:
+            self._resolve_profile()
+        return self._full_name
+
+    @full_name.setter
+    def full_name(self, value: Optional[str]):
+        self._full_name = value
+
+    @property
+    def unit_system(self) -> Optional[str]:
+        """Measurement system of the user, fetched on first access for lazy logins."""
+        if self._settings_pending:
+            self._resolve_unit_system()
+        return self._unit_system
+
+    @unit_system.setter
+    def unit_system(self, value: Optional[str]):
+        self._unit_system = value
+
+    def known_profile(self) -> Dict[str, Optional[str]]:
+        """Return the profile fields resolved so far, without fetching the missing ones."""
+        return {
+            "display_name": None if self._profile_pending else self._display_name,
+            "full_name": None if self._profile_pending else self._full_name,
+            "unit_system": None if self._settings_pending else self._unit_system,
+        }
+
+    def seed_profile(
+        self,
+        display_name: Optional[str] = None,
+        full_name: Optional[str] = None,
+        unit_system: Optional[str] = None,
+    ):
+        """Adopt profile fields another process already resolved instead of fetching them."""
+        with self._profile_lock:
+            if display_name is not None:
+                self._display_name = display_name
+                self._full_name = full_name
+                self._profile_pending = False
+            if unit_system is not None:
+                self._unit_system = unit_system
+                self._settings_pending = False
+
+    def _resolve_profile(self):
+        """Fetch display and full name from the social profile."""
+        with self._profile_lock:
+            if not self._profile_pending and self._display_name is not None:
+                return
+            profile = self._call(self.garmin_connect_social_profile_url, lambda: self.garth.profile)
+            self._display_name = profile["displayName"]
+            self._full_name = profile["fullName"]
+            self._profile_pending = False
+
+    def _resolve_unit_system(self):
+        """Fetch the unit system from the user settings."""
+        with self._profile_lock:
+            if not self._settings_pending and self._unit_system is not None:
+                return
+            settings = self.connectapi(self.garmin_connect_user_settings_url)
+            self._unit_system = settings["userData"]["measurementSystem"]
+            self._settings_pending = False
+
+    def token_expires_in(self) -> Optional[float]:
+        """Seconds until the OAuth2 token expires, None when no token is loaded."""
+        token = self.garth.oauth2_token
+        if not isinstance(token, OAuth2Token):
+            return None
+        return token.expires_at - time.time()
+
+    def refresh_token(self, margin: float = 0) -> bool:
+        """
+        Exchange the OAuth1 token for a new OAuth2 token when there is none or it
+        expires within 'margin' seconds. Concurrent callers share one exchange.
+        :return: Whether the token was refreshed
+        """
+        with self._token_lock:
+            token = self.garth.oauth2_token
+            if token and not (
+                isinstance(token, OAuth2Token) and token.expires_at - time.time() <= margin
+            ):
+                return False
+            with timed_login("refresh"):
+                self.garth.refresh_oauth2()
+            return True
+
+    def _account(self) -> Any:
+        """Identify the upstream account by its OAuth1 token."""
+        return getattr(self.garth.oauth1_token, "oauth_token", None) or id(self)
+
+    def _flight_key(self, path: str, kwargs: Dict[str, Any]) -> Optional[tuple]:
+        """
+        Key identical upstream reads by account, path and query parameters.
+        Only plain GET requests are coalesced.
+        """
+        if set(kwargs) - {"params", "method"} or kwargs.get("method", "GET") != "GET":
+            return None
+        params = tuple(sorted((kwargs.get("params") or {}).items()))
+        return self.garth.domain, self._account(), path, params
 
-    def connectapi(self, path: str, **kwargs) -> Dict[str, Any]:
-        """Make a request to Garmin Connect API."""
-        return self.garth.connectapi(path, **kwargs)
+    def _call(self, path: str, fn, timeout: Optional[float] = None):
+        """
+        Make one timed upstream call under the rate limiter, retries and circuit breaker.
+        :param timeout: Seconds the call may take, retries included, at most; the current
+            request's deadline applies either way
+        """
 
-    def download(self, path: str, **kwargs) -> bytes:
-        """Download content from Garmin Connect."""
-        return self.garth.download(path, **kwargs)
+        def attempt():
+            with timed_upstream(path):
+                return fn()
 
-    def login(self, tokenstore: Optional[str] = None) -> tuple[Any, Any]:
-        """Log in using Garth."""
-        tokenstore = tokenstore or os.getenv("GARMINTOKENS")
+        with deadline.within(timeout):
+            return self.policy.call(self._account(), attempt)
 
-        if tokenstore:
+    def connectapi(self, path: str, timeout: Optional[float] = None, **kwargs) -> Dict[str, Any]:
+        """
+        Make a request to Garmin Connect API, sharing identical concurrent reads.
+        :param timeout: Seconds the call may take at most, see _call
+        """
+
+        def fetch():
+            return self._call(path, lambda: self.garth.connectapi(path, **kwargs), timeout)
+
+        key = self._flight_key(path, kwargs)
+        if key is None:
+            return fetch()
+        return upstream_flight.do(key, fetch)
+
+    def connectapi_raw(self, path: str, timeout: Optional[float] = None, **kwargs) -> Optional[str]:
+        """
+        Make a GET request to Garmin Connect API and return the undecoded JSON body.
+        Lets callers pass a response through without decoding and re-encoding it.
+        """
+
+        def fetch():
+            response = self._call(
+                path,
+                lambda: self.garth.request("GET", "connectapi", path, api=True, **kwargs),
+                timeout,
+            )
+            upstream_response_size.observe(len(response.content), upstream_path(path))
+            return None if response.status_code == 204 else response.text
+
+        key = self._flight_key(path, kwargs)
+        if key is None:
+            return fetch()
+        return upstream_flight.do(key + ("raw",), fetch)
+
+    async def connectapi_async(
+        self, path: str, method: str = "GET", timeout: Optional[float] = None, **kwargs
+    ) -> Any:
+        """Make a request to Garmin Connect API without blocking the event loop."""
+        key = self._flight_key(path, {"method": method, **kwargs})
+        if key is None:
+            return await self._request_async(path, method, timeout=timeout, **kwargs)
+        return await upstream_flight.do_async(
+            key, lambda: self._request_async(path, method, timeout=timeout, **kwargs)
+        )
+
+    async def connectapi_raw_async(
+        self, path: str, timeout: Optional[float] = None, **kwargs
+    ) -> Optional[str]:
+        """Like connectapi_raw, without blocking the event loop."""
+        key = self._flight_key(path, kwargs)
+        if key is None:
+            return await self._request_async(path, raw=True, timeout=timeout, **kwargs)
+        return await upstream_flight.do_async(
+            key + ("raw",), lambda: self._request_async(path, raw=True, timeout=timeout, **kwargs)
+        )
+
+    async def _request_async(
+        self,
+        path: str,
+        method: str = "GET",
+        raw: bool = False,
+        timeout: Optional[float] = None,
+        **kwargs,
+    ) -> Any:
+        """
+        Send one request to Garmin Connect API through the async transport.
+        :param raw: Return the undecoded body instead of the decoded JSON
+        :param timeout: Seconds the call may take at most, see _call
+        """
+        token = self.garth.oauth2_token
+        if not token or (isinstance(token, OAuth2Token) and token.expired):
+            # The OAuth exchange is rare and goes through garth's own session
+            await asyncio.to_thread(self.refresh_token)
+
+        client = self.async_transport.client(self.garth.domain)
+        headers = {"Authorization": str(self.garth.oauth2_token)}
+
+        async def attempt():
+            with timed_upstream(path):
+                # The garth timeout is shortened to what is left before the deadline
+                response = await client.request(
+                    method, path, headers=headers, timeout=self.garth.timeout, **kwargs
+                )
+                response.raise_for_status()
+            return response
+
+        with deadline.within(timeout):
+            response = await self.policy.call_async(self._account(), attempt)
+
+        upstream_response_size.observe(len(response.content), upstream_path(path))
+        if response.status_code == 204:
+            return None
+        return response.text if raw else response.json()
+
+    def download(self, path: str, timeout: Optional[float] = None, **kwargs) -> bytes:
+        """
+        Download content from Garmin Connect.
+        :param timeout: Seconds the call may take at most, see _call
+        """
+        content = self._call(path, lambda: self.garth.download(path, **kwargs), timeout)
+        upstream_response_size.observe(len(content), upstream_path(path))
+        return content
+
+    def iter_download(
+        self,
+        path: str,
+        chunk_size: int = 64 * 1024,
+        timeout: Optional[float] = None,
+        **kwargs,
+    ) -> Iterator[bytes]:
+        """
+        Download content from Garmin Connect in chunks of up to 'chunk_size' bytes,
+        so large files never sit in memory whole.
+        :param timeout: Seconds the response may take to start at most, see _call
+        """
+        response = self._call(
+            path,
+            lambda: self.garth.request("GET", "connectapi", path, api=True, stream=True, **kwargs),
+            timeout,
+        )
+        size = 0
+        try:
+            for chunk in response.iter_content(chunk_size):
+                size += len(chunk)
+                yield chunk
+        finally:
+            response.close()
+            upstream_response_size.observe(size, upstream_path(path))
+
+    def _load_tokens(self, tokenstore: str):
+        """Load OAuth tokens from a base64 string or a token directory."""
+        with token_decode_duration.time():
             if len(tokenstore) > 512:
                 self.garth.loads(tokenstore)
             else:
                 self.garth.load(tokenstore)
 
-            self.display_name = self.garth.profile["displayName"]
-            self.full_name = self.garth.profile["fullName"]
+    def login(self, tokenstore: Optional[str] = None) -> tuple[Any, Any]:
+        """Log in using Garth."""
+        tokenstore = tokenstore or os.getenv("GARMINTOKENS")
+        with timed_login("tokenstore" if tokenstore else "credentials"):
+            return self._login(tokenstore)
+
+    def _login(self, tokenstore: Optional[str]) -> tuple[Any, Any]:
+        if tokenstore:
+            self._load_tokens(tokenstore)
 
-            settings = self.garth.connectapi(self.garmin_connect_user_settings_url)
-            self.unit_system = settings["userData"]["measurementSystem"]
+            if self.lazy_profile:
+                self._profile_pending = True
+                self._settings_pending = True
+            else:
+                self._resolve_profile()
+                self._resolve_unit_system()
 
             return None, None
         else:
@@ -83,11 +401,8 @@ class GarminClient:
                 token1, token2 = self.garth.login(
                     self.username, self.password, prompt_mfa=self.prompt_mfa
                 )
-                self.display_name = self.garth.profile["displayName"]
-                self.full_name = self.garth.profile["fullName"]
-
-                settings = self.garth.connectapi(self.garmin_connect_user_settings_url)
-                self.unit_system = settings["userData"]["measurementSystem"]
+                self._resolve_profile()
+                self._resolve_unit_system()
 
         return token1, token2
 
@@ -95,11 +410,8 @@ class GarminClient:
         """Resume login using Garth."""
         result1, result2 = self.garth.resume_login(client_state, mfa_code)
 
-        self.display_name = self.garth.profile["displayName"]
-        self.full_name = self.garth.profile["fullName"]
-
-        settings = self.connectapi(self.garmin_connect_user_settings_url)
-        self.unit_system = settings["userData"]["measurementSystem"]
+        self._resolve_profile()
+        self._resolve_unit_system()
 
         return result1, result2
 
@@ -108,22 +420,168 @@ class GarminClient:
         start: int = 0,
         limit: int = 20,
         activitytype: Optional[str] = None,
+        page_size: Optional[int] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
     ) -> List[Dict[str, Any]]:
         """
         Return available activities.
         :param start: Starting activity offset, where 0 means the most recent activity
         :param limit: Number of activities to return
         :param activitytype: (Optional) Filter activities by type
+        :param page_size: (Optional) Split the range into pages of this size and fetch
+            them concurrently
+        :param start_date: (Optional) Only activities started on or after this day (YYYY-MM-DD)
+        :param end_date: (Optional) Only activities started on or before this day (YYYY-MM-DD)
         :return: List of activities from Garmin
         """
+        if page_size and limit > page_size:
+            return self._get_activities_concurrently(
+                start, limit, activitytype, page_size, start_date, end_date
+            )
+
         url = self.garmin_connect_activities
+        params = self._activity_params(start, limit, activitytype, start_date, end_date)
+
+        logger.debug("Requesting activities")
+
+        return self.connectapi(url, params=params)
+
+    def get_activities_raw(
+        self,
+        start: int = 0,
+        limit: int = 20,
+        activitytype: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> Optional[str]:
+        """Return one page of activities as the JSON array sent by Garmin."""
+        params = self._activity_params(start, limit, activitytype, start_date, end_date)
+        return self.connectapi_raw(self.garmin_connect_activities, params=params)
+
+    @staticmethod
+    def _activity_params(
+        start: int,
+        limit: int,
+        activitytype: Optional[str],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> Dict[str, str]:
+        """Build the query parameters of an activity search; Garmin filters by type and date."""
         params = {"start": str(start), "limit": str(limit)}
         if activitytype:
             params["activityType"] = str(activitytype)
+        if start_date:
+            params["startDate"] = str(start_date)
+        if end_date:
+            params["endDate"] = str(end_date)
+        return params
+
+    @staticmethod
+    def _activity_windows(start: int, limit: int, page_size: int) -> List[tuple]:
+        """Split [start, start+limit) into (offset, count) pages."""
+        end = start + limit
+        return [(offset, min(page_size, end - offset)) for offset in range(start, end, page_size)]
+
+    @staticmethod
+    def _merge_pages(windows: List[tuple], pages: List[Any]) -> List[Dict[str, Any]]:
+        """Concatenate pages in order, stopping after the first short page."""
+        activities = []
+        for (_, count), page in zip(windows, pages):
+            activities.extend(page or [])
+            if not page or len(page) < count:
+                break
+        return activities
+
+    def _get_activities_concurrently(
+        self,
+        start: int,
+        limit: int,
+        activitytype: Optional[str],
+        page_size: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Fetch [start, start+limit) as page-sized windows in parallel and merge them in order."""
+        windows = self._activity_windows(start, limit, page_size)
+
+        # Refresh an expired token once up front instead of in every worker
+        token = self.garth.oauth2_token
+        if isinstance(token, OAuth2Token) and token.expired:
+            self.refresh_token()
+
+        workers = min(len(windows), self.transport.pool_maxsize)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pages = list(
+                executor.map(
+                    deadline.bound(
+                        lambda window: self._fetch_activity_page(
+                            *window, activitytype, start_date, end_date
+                        )
+                    ),
+                    windows,
+                )
+            )
 
-        logger.debug("Requesting activities")
+        return self._merge_pages(windows, pages)
 
-        return self.connectapi(url, params=params)
+    def _fetch_activity_page(
+        self,
+        start: int,
+        limit: int,
+        activitytype: Optional[str],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Fetch one page of activities; UpstreamPolicy retries its transient failures."""
+        return self.get_activities(
+            start, limit, activitytype, start_date=start_date, end_date=end_date
+        )
+
+    def iter_activities(
+        self,
+        start: int = 0,
+        limit: Optional[int] = None,
+        activitytype: Optional[str] = None,
+        page_size: int = 100,
+        concurrency: int = 1,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yield activities page by page so only a bounded number of pages is held in memory.
+        :param start: Starting activity offset, where 0 means the most recent activity
+        :param limit: (Optional) Maximum number of activities to yield, all when omitted
+        :param activitytype: (Optional) Filter activities by type
+        :param page_size: Number of activities requested per upstream call
+        :param concurrency: Number of pages fetched in parallel ahead of the consumer
+        :param start_date: (Optional) Only activities started on or after this day (YYYY-MM-DD)
+        :param end_date: (Optional) Only activities started on or before this day (YYYY-MM-DD)
+        :return: Iterator over activities from Garmin, most recent first
+        """
+        batch_size = page_size * max(concurrency, 1)
+        remaining = limit
+        offset = start
+        while remaining is None or remaining > 0:
+            count = batch_size if remaining is None else min(batch_size, remaining)
+            page = self.get_activities(
+                offset,
+                count,
+                activitytype,
+                page_size=page_size,
+                start_date=start_date,
+                end_date=end_date,
+            )
+            if not page:
+                return
+
+            yield from page
+
+            if len(page) < count:
+                return
+            offset += len(page)
+            if remaining is not None:
+                remaining -= len(page)
 
     def get_last_activity(self) -> Optional[Dict[str, Any]]:
         """Return last activity."""
@@ -133,6 +591,103 @@ class GarminClient:
 
         return None
 
+    async def get_activities_async(
+        self,
+        start: int = 0,
+        limit: int = 20,
+        activitytype: Optional[str] = None,
+        page_size: Optional[int] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Return available activities without blocking the event loop.
+        Takes the same parameters as get_activities; pages are fetched concurrently.
+        """
+        url = self.garmin_connect_activities
+        if not page_size or limit <= page_size:
+            params = self._activity_params(start, limit, activitytype, start_date, end_date)
+            return await self.connectapi_async(url, params=params)
+
+        # Same cap on pages in flight as the threaded path
+        semaphore = asyncio.Semaphore(self.transport.pool_maxsize)
+
+        async def fetch(offset: int, count: int):
+            async with semaphore:
+                params = self._activity_params(offset, count, activitytype, start_date, end_date)
+                return await self.connectapi_async(url, params=params)
+
+        windows = self._activity_windows(start, limit, page_size)
+        pages = await gather_or_cancel(*(fetch(offset, count) for offset, count in windows))
+        return self._merge_pages(windows, pages)
+
+    async def get_activities_raw_async(
+        self,
+        start: int = 0,
+        limit: int = 20,
+        activitytype: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> Optional[str]:
+        """Like get_activities_raw, without blocking the event loop."""
+        params = self._activity_params(start, limit, activitytype, start_date, end_date)
+        return await self.connectapi_raw_async(self.garmin_connect_activities, params=params)
+
+    async def iter_activities_async(
+        self,
+        start: int = 0,
+        limit: Optional[int] = None,
+        activitytype: Optional[str] = None,
+        page_size: int = 100,
+        concurrency: int = 1,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield activities like iter_activities without blocking the event loop."""
+        batch_size = page_size * max(concurrency, 1)
+        remaining = limit
+        offset = start
+        while remaining is None or remaining > 0:
+            count = batch_size if remaining is None else min(batch_size, remaining)
+            page = await self.get_activities_async(
+                offset,
+                count,
+                activitytype,
+                page_size=page_size,
+                start_date=start_date,
+                end_date=end_date,
+            )
+            if not page:
+                return
+
+            for activity in page:
+                yield activity
+
+            if len(page) < count:
+                return
+            offset += len(page)
+            if remaining is not None:
+                remaining -= len(page)
+
+    async def get_last_activity_async(self) -> Optional[Dict[str, Any]]:
+        """Return last activity without blocking the event loop."""
+        activities = await self.get_activities_async(0, 1)
+        if activities:
+            return activities[-1]
+
+        return None
+
+    def activity_file_path(self, activity_id: int, file_format: str = "fit") -> str:
+        """
+        Return the download path of an activity file.
+        :param file_format: 'fit' for the original file as zipped by Garmin, 'gpx', 'tcx' or 'kml'
+        """
+        if file_format == "fit":
+            return f"{self.garmin_connect_activity_files}/{activity_id}"
+        if file_format not in ("gpx", "tcx", "kml"):
+            raise ValueError(f"Unsupported activity file format: {file_format}")
+        return f"{self.garmin_connect_activity_export}/{file_format}/activity/{activity_id}"
+
     def get_user_summary(self, cdate: str) -> Dict[str, Any]:
         """Return user activity summary for 'cdate' format 'YYYY-MM-DD'."""
         url = f"{self.garmin_connect_daily_summary_url}/{self.display_name}"
@@ -146,6 +701,69 @@ class GarminClient:
 
         return response
 
+    def get_user_summaries(
+        self,
+        cdates: List[str],
+        concurrency: int = 8,
+        on_summary: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Return the user summaries of 'cdates', fetching up to 'concurrency' days in parallel.
+        :param on_summary: (Optional) Called with each day and its summary as soon as it is
+            fetched, even when another day then fails
+        """
+        if not cdates:
+            return []
+        # Resolve a lazy profile once instead of in every worker
+        if self._profile_pending:
+            self._resolve_profile()
+
+        def fetch(cdate: str) -> Dict[str, Any]:
+            summary = self.get_user_summary(cdate)
+            if on_summary is not None:
+                on_summary(cdate, summary)
+            return summary
+
+        workers = min(len(cdates), max(concurrency, 1))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(deadline.bound(fetch), cdates))
+
+    async def get_user_summary_async(self, cdate: str) -> Dict[str, Any]:
+        """Like get_user_summary, without blocking the event loop."""
+        if self._profile_pending:
+            await asyncio.to_thread(self._resolve_profile)
+        url = f"{self.garmin_connect_daily_summary_url}/{self._display_name}"
+        response = await self.connectapi_async(url, params={"calendarDate": str(cdate)})
+
+        if response["privacyProtected"] is True:
+            raise GarminConnectAuthenticationError("Authentication error")
+
+        return response
+
+    async def get_user_summaries_async(
+        self,
+        cdates: List[str],
+        concurrency: int = 8,
+        on_summary: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Like get_user_summaries, without blocking the event loop; 'on_summary' runs in a thread.
+        """
+        if not cdates:
+            return []
+        if self._profile_pending:
+            await asyncio.to_thread(self._resolve_profile)
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+        async def fetch(cdate: str):
+            async with semaphore:
+                summary = await self.get_user_summary_async(cdate)
+            if on_summary is not None:
+                await asyncio.to_thread(on_summary, cdate, summary)
+            return summary
+
+        return await gather_or_cancel(*(fetch(cdate) for cdate in cdates))
+
     def get_stats(self, cdate: str) -> Dict[str, Any]:
         """
         Return user activity summary for 'cdate' format 'YYYY-MM-DD'
@@ -0,0 +1,62 @@
+"""Flask JSON provider backed by orjson when it is installed."""
+
+import logging
+from typing import Any, Dict, Union
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider that encodes with orjson and falls back to the stdlib encoder.
+
+    Output matches DefaultJSONProvider except that non-ASCII characters are
+    written as UTF-8 instead of being escaped. Values orjson cannot encode
+    natively (dates, decimals, integers above 64 bits, ...) go through the
+    stdlib encoder so they are serialized exactly as Flask would.
+    """
+
+    available = orjson is not None
+
+    def _orjson_option(self) -> int:
+        # Dates and dataclasses are left to Flask's default() for identical output
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        option |= orjson.OPT_PASSTHROUGH_DATACLASS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    @staticmethod
+    def _orjson_supports(kwargs: Dict[str, Any]) -> bool:
+        """Check whether json.dumps arguments have an orjson equivalent."""
+        return (
+            set(kwargs) <= {"indent", "separators"}
+            and kwargs.get("indent") in (None, 2)
+            and kwargs.get("separators") in (None, (",", ":"))
+        )
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        """Serialize 'obj' to a JSON string."""
+        if orjson is None or not self._orjson_supports(kwargs):
+            return super().dumps(obj, **kwargs)
+        option = self._orjson_option()
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=self.default, option=option).decode()
+        except TypeError:
+            # orjson.JSONEncodeError, e.g. an integer too large for orjson
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        """Deserialize JSON from a string or bytes."""
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
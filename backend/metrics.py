@@ -0,0 +1,417 @@
+"""
+In-process metrics exposed in the Prometheus text format.
+
+Every thread increments its own shard of values without locking; shards are
+only summed when /metrics is scraped. Values from threads that have exited are
+folded into a retired shard so short-lived pool threads do not accumulate.
+"""
+
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds, in seconds, of latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Upper bounds, in bytes, of payload size histogram buckets
+SIZE_BUCKETS = tuple(float(4**exponent) for exponent in range(4, 13))
+
+# Prefixes of Garmin Connect paths, mapped to the label used in upstream metrics
+UPSTREAM_PATHS = (
+    ("/userprofile-service/userprofile/user-settings", "user_settings"),
+    ("/userprofile-service/socialProfile", "social_profile"),
+    ("/activitylist-service/activities/search/activities", "activity_search"),
+    ("/usersummary-service/usersummary/daily", "daily_summary"),
+    ("/download-service/", "download"),
+)
+
+
+def upstream_path(path: str) -> str:
+    """Map a Garmin Connect path to a bounded metric label."""
+    for prefix, label in UPSTREAM_PATHS:
+        if path.startswith(prefix):
+            return label
+    return "other"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Registry:
+    """Metrics of one process and the per-thread shards holding their values."""
+
+    def __init__(self):
+        self.metrics: List["Metric"] = []
+        self._local = threading.local()
+        self._shards: List[Tuple[weakref.ref, Dict]] = []
+        self._retired: Dict[Tuple, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def shard(self) -> Dict[Tuple, List[float]]:
+        """Return the value shard of the calling thread."""
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((weakref.ref(threading.current_thread()), shard))
+        return shard
+
+    def values(self) -> Dict[Tuple, List[float]]:
+        """Sum the shards of every thread."""
+        totals: Dict[Tuple, List[float]] = {}
+
+        def merge(into, items):
+            for key, cell in items:
+                total = into.get(key)
+                if total is None:
+                    into[key] = list(cell)
+                else:
+                    for index, value in enumerate(cell):
+                        total[index] += value
+
+        with self._lock:
+            live = []
+            for thread_ref, shard in self._shards:
+                thread = thread_ref()
+                if thread is None or not thread.is_alive():
+                    merge(self._retired, list(shard.items()))
+                else:
+                    live.append((thread_ref, shard))
+            self._shards = live
+            merge(totals, list(self._retired.items()))
+            for _, shard in live:
+                # list() copies the items atomically while the owner keeps writing
+                merge(totals, list(shard.items()))
+        return totals
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        values = self.values()
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples(values))
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        """Reset every value, for tests."""
+        with self._lock:
+            for _, shard in self._shards:
+                shard.clear()
+            self._retired.clear()
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, registry: Registry, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        registry.metrics.append(self)
+
+    def _cells(self, values: Dict[Tuple, List[float]]) -> Iterator[Tuple[Tuple, List[float]]]:
+        cells = [(labels, cell) for (metric, labels), cell in values.items() if metric is self]
+        return iter(sorted(cells, key=lambda item: item[0]))
+
+    def samples(self, values: Dict[Tuple, List[float]]) -> Iterable[str]:
+        for labels, cell in self._cells(values):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(cell[0])}"
+
+
+class Counter(Metric):
+    """Monotonically increasing value."""
+
+    type = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        shard = self.registry.shard()
+        cell = shard.get((self, labels))
+        if cell is None:
+            cell = shard[(self, labels)] = [0]
+        cell[0] += amount
+
+
+class Gauge(Counter):
+    """Value that goes up and down, such as requests in flight."""
+
+    type = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    @contextmanager
+    def track(self, *labels: str) -> Iterator[None]:
+        """Count the enclosed block while it runs."""
+        self.inc(*labels)
+        try:
+            yield
+        finally:
+            self.dec(*labels)
+
+
+class CallbackMetric(Metric):
+    """Metric read from 'collect' at scrape time, e.g. cache and pool statistics."""
+
+    def __init__(
+        self,
+        registry: Registry,
+        name: str,
+        help: str,
+        labelnames: Sequence[str],
+        collect: Callable[[], Iterable[Tuple[Tuple, float]]],
+        type: str = "gauge",
+    ):
+        super().__init__(registry, name, help, labelnames)
+        self.collect = collect
+        self.type = type
+
+    def samples(self, values: Dict[Tuple, List[float]]) -> Iterable[str]:
+        for labels, value in self.collect():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    """Distribution of observed values over fixed buckets."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        registry: Registry,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str) -> None:
+        shard = self.registry.shard()
+        cell = shard.get((self, labels))
+        if cell is None:
+            # One count per bucket plus +Inf, followed by the sum
+            cell = shard[(self, labels)] = [0] * (len(self.buckets) + 2)
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        """Observe the duration of the enclosed block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def samples(self, values: Dict[Tuple, List[float]]) -> Iterable[str]:
+        names = self.labelnames + ("le",)
+        for labels, cell in self._cells(values):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), cell):
+                cumulative += count
+                bucket_labels = _format_labels(names, labels + (_format_value(bound),))
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            label_text = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_text} {_format_value(cell[-1])}"
+            yield f"{self.name}_count{label_text} {cumulative}"
+
+
+registry = Registry()
+
+http_requests = Counter(
+    registry,
+    "gconnect_http_requests_total",
+    "HTTP requests handled, by route, method and status.",
+    ("route", "method", "status"),
+)
+http_request_duration = Histogram(
+    registry,
+    "gconnect_http_request_duration_seconds",
+    "Time to handle an HTTP request, by route, method and status.",
+    ("route", "method", "status"),
+)
+http_requests_in_flight = Gauge(
+    registry,
+    "gconnect_http_requests_in_flight",
+    "HTTP requests currently being handled, by route.",
+    ("route",),
+)
+http_requests_shed = Counter(
+    registry,
+    "gconnect_http_requests_shed_total",
+    "Requests answered 503 by admission control instead of being handled, by route.",
+    ("route",),
+)
+http_response_size = Histogram(
+    registry,
+    "gconnect_http_response_size_bytes",
+    "Size of HTTP response bodies, including streamed ones, by route.",
+    ("route",),
+    buckets=SIZE_BUCKETS,
+)
+upstream_request_duration = Histogram(
+    registry,
+    "gconnect_upstream_request_duration_seconds",
+    "Time spent in Garmin Connect calls, by path and outcome.",
+    ("path", "outcome"),
+)
+upstream_response_size = Histogram(
+    registry,
+    "gconnect_upstream_response_size_bytes",
+    "Size of Garmin Connect response bodies where the raw body is available, by path.",
+    ("path",),
+    buckets=SIZE_BUCKETS,
+)
+upstream_retries = Counter(
+    registry,
+    "gconnect_upstream_retries_total",
+    "Garmin Connect calls retried after throttling or a transient failure.",
+)
+upstream_rejections = Counter(
+    registry,
+    "gconnect_upstream_rejections_total",
+    "Garmin Connect calls refused locally, by reason (circuit_open, rate_limited or deadline).",
+    ("reason",),
+)
+login_duration = Histogram(
+    registry,
+    "gconnect_login_duration_seconds",
+    "Time spent logging in, by method (tokenstore, credentials or refresh) and outcome.",
+    ("method", "outcome"),
+)
+token_decode_duration = Histogram(
+    registry,
+    "gconnect_token_decode_duration_seconds",
+    "Time spent decoding a tokenstore into OAuth tokens.",
+)
+
+
+# Seconds spent starting up, by phase: 'preload' (importing the application once, before
+# forking) and 'worker' (from fork, or the end of preload, until the server accepts requests)
+startup_durations: Dict[str, float] = {}
+
+
+def resident_memory_bytes() -> Optional[int]:
+    """Return the resident set size of this process, None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+CallbackMetric(
+    registry,
+    "gconnect_process_resident_memory_bytes",
+    "Resident memory of this worker process.",
+    (),
+    lambda: [((), rss) for rss in (resident_memory_bytes(),) if rss is not None],
+)
+CallbackMetric(
+    registry,
+    "gconnect_startup_duration_seconds",
+    "Time spent starting up, by phase (preload before forking, then worker).",
+    ("phase",),
+    lambda: (((phase,), duration) for phase, duration in startup_durations.items()),
+)
+
+
+@contextmanager
+def timed_upstream(path: str) -> Iterator[None]:
+    """Observe the duration and outcome of one Garmin Connect call."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        upstream_request_duration.observe(
+            time.perf_counter() - started, upstream_path(path), outcome
+        )
+
+
+@contextmanager
+def timed_login(method: str) -> Iterator[None]:
+    """Observe the duration and outcome of a login."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        login_duration.observe(time.perf_counter() - started, method, outcome)
+
+
+class WSGIMetrics:
+    """
+    WSGI middleware recording request counts, latency and response sizes.
+
+    The app stores the matched route under ROUTE_KEY in the environ, and
+    starts the in-flight gauge, once it has routed the request. Latency and
+    size cover the whole body, so streamed responses are measured until
+    their last chunk.
+    """
+
+    ROUTE_KEY = "gconnect.metrics_route"
+
+    def __init__(self, wsgi_app: Callable):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        started = time.perf_counter()
+        status = ["500"]
+
+        def capture_status(status_line, headers, exc_info=None):
+            status[0] = status_line.split(" ", 1)[0]
+            return start_response(status_line, headers, exc_info)
+
+        try:
+            body = self.wsgi_app(environ, capture_status)
+        except BaseException:
+            self._record(environ, started, status[0], 0)
+            raise
+        return self._measure(body, environ, started, status)
+
+    def _measure(self, body, environ, started, status):
+        size = 0
+        try:
+            for chunk in body:
+                size += len(chunk)
+                yield chunk
+        finally:
+            close = getattr(body, "close", None)
+            if close is not None:
+                close()
+            self._record(environ, started, status[0], size)
+
+    def _record(self, environ, started, status, size):
+        route = environ.get(self.ROUTE_KEY)
+        if route is None:
+            return
+        method = environ["REQUEST_METHOD"]
+        http_requests_in_flight.dec(route)
+        http_requests.inc(route, method, status)
+        http_request_duration.observe(time.perf_counter() - started, route, method, status)
+        http_response_size.observe(size, route)
@@ -0,0 +1,69 @@
+"""Field selection for activity responses."""
+
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+# Fields used by the activity list and report views of the dashboard
+SUMMARY_FIELDS = (
+    "activityId",
+    "activityName",
+    "activityType.typeId",
+    "activityType.typeKey",
+    "startTimeLocal",
+    "startTimeGMT",
+    "distance",
+    "duration",
+    "averageHR",
+    "averageSpeed",
+    "elevationGain",
+    "calories",
+)
+
+PRESETS = {
+    "summary": SUMMARY_FIELDS,
+}
+
+
+@lru_cache(maxsize=256)
+def parse_fields(value: Optional[str], default: str = "all") -> Optional[Dict[str, Any]]:
+    """
+    Compile a 'fields' query value into a field tree.
+    :param value: 'all', a preset name such as 'summary', or comma-separated
+        field paths where nested fields are dotted, e.g. 'activityType.typeKey'
+    :param default: Value used when 'value' is empty
+    :return: Nested dict of selected fields, or None to keep whole activities
+    """
+    value = (value or "").strip() or default
+    if value == "all":
+        return None
+
+    tree: Dict[str, Any] = {}
+    for path in PRESETS.get(value, value.split(",")):
+        path = path.strip()
+        if not path:
+            continue
+        node = tree
+        *parents, leaf = path.split(".")
+        for name in parents:
+            child = node.get(name)
+            if child is None and name in node:
+                # The whole parent is already selected
+                break
+            node = node.setdefault(name, {})
+        else:
+            node[leaf] = None
+    return tree
+
+
+def project(activity: Any, tree: Optional[Dict[str, Any]]) -> Any:
+    """Return a copy of 'activity' holding only the fields in 'tree'."""
+    if tree is None or not isinstance(activity, dict):
+        return activity
+
+    result = {}
+    for name, subtree in tree.items():
+        if name not in activity:
+            continue
+        value = activity[name]
+        result[name] = value if subtree is None else project(value, subtree)
+    return result
@@ -0,0 +1,195 @@
+"""
+Production entry point replacing Flask's development server.
+
+The application is imported once, timed, before serving. With WORKERS above 1
+this process becomes a pre-forking master: it binds the listening socket and
+forks the workers from the loaded application, so imports, the garth setup
+and module-level state are paid for once and shared copy-on-write, and
+restarts workers that die. Workers share their caches through a SQLite
+database (see shared_cache.py). Startup time and the resident memory of
+every worker are logged and exported on /metrics.
+"""
+
+import time
+
+STARTED = time.perf_counter()
+
+import importlib  # noqa: E402
+import logging  # noqa: E402
+import os  # noqa: E402
+import shutil  # noqa: E402
+import signal  # noqa: E402
+import socket  # noqa: E402
+import tempfile  # noqa: E402
+from typing import Dict, Optional  # noqa: E402
+
+import uvicorn  # noqa: E402
+
+logger = logging.getLogger("serve")
+
+# "async" serves the activity routes natively async, "sync" runs the whole Flask app in threads
+SERVER_MODE = os.getenv("SERVER_MODE", "async")
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "5000"))
+WORKERS = int(os.getenv("WORKERS", "1"))
+# Seconds workers get to finish in-flight requests when the server stops
+GRACEFUL_TIMEOUT = float(os.getenv("GRACEFUL_TIMEOUT", "30"))
+
+APPLICATIONS = {
+    "async": "asgi:application",
+    "sync": "asgi:wsgi_application",
+}
+
+# Pending connections the shared listening socket queues for the workers
+BACKLOG = 2048
+# Seconds between checks of the master for workers that died
+SUPERVISE_INTERVAL = 0.5
+
+
+def megabytes(size: Optional[int]) -> str:
+    return "n/a" if size is None else f"{size / 2**20:.1f} MB"
+
+
+def load_application():
+    """Import the application named by SERVER_MODE."""
+    module, name = APPLICATIONS[SERVER_MODE].split(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def bind_socket() -> socket.socket:
+    """Bind the listening socket the workers inherit."""
+    family = socket.AF_INET6 if ":" in HOST else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((HOST, PORT))
+    sock.listen(BACKLOG)
+    sock.set_inheritable(True)
+    return sock
+
+
+class WorkerServer(uvicorn.Server):
+    """uvicorn server reporting how long it took to start and the memory it holds."""
+
+    def __init__(self, config: uvicorn.Config, spawned: float):
+        super().__init__(config)
+        # uvicorn.Server already has a 'started' flag
+        self.spawned = spawned
+
+    async def startup(self, sockets=None) -> None:
+        await super().startup(sockets)
+        from metrics import resident_memory_bytes, startup_durations
+
+        startup_durations["worker"] = time.perf_counter() - self.spawned
+        logger.info(
+            f"Worker {os.getpid()} ready in {startup_durations['worker']:.2f}s,"
+            f" RSS {megabytes(resident_memory_bytes())}"
+        )
+
+
+def serve(application, sock: Optional[socket.socket], spawned: float) -> None:
+    """Serve 'application' on 'sock', or on HOST and PORT without one, until told to stop."""
+    config = uvicorn.Config(application, host=HOST, port=PORT)
+    WorkerServer(config, spawned).run(sockets=[sock] if sock is not None else None)
+
+
+class Master:
+    """Forks the workers, replaces the ones that die and stops them all on SIGTERM or SIGINT."""
+
+    def __init__(self, application, sock: socket.socket, workers: int):
+        self.application = application
+        self.sock = sock
+        self.workers = workers
+        self.children: Dict[int, float] = {}
+        self.stopping = False
+
+    def spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            # uvicorn installs its own handlers for a graceful shutdown
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            status = 1
+            try:
+                serve(self.application, self.sock, time.perf_counter())
+                status = 0
+            except BaseException:
+                logger.exception("Worker failed")
+            finally:
+                os._exit(status)
+        self.children[pid] = time.monotonic()
+
+    def stop(self, signum, frame) -> None:
+        self.stopping = True
+
+    def reap(self) -> None:
+        """Collect workers that exited."""
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            if self.children.pop(pid, None) is not None and not self.stopping:
+                logger.warning(f"Worker {pid} exited with status {status}, starting another")
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        logger.info(f"Starting {self.workers} workers on {HOST}:{PORT}")
+        while not self.stopping:
+            self.reap()
+            while len(self.children) < self.workers and not self.stopping:
+                self.spawn()
+            time.sleep(SUPERVISE_INTERVAL)
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        """Ask the workers to finish in-flight requests, killing those that overrun."""
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT
+        while self.children and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.children):
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            self.children.pop(pid)
+
+
+def main():
+    if SERVER_MODE not in APPLICATIONS:
+        raise ValueError(f"SERVER_MODE must be one of {', '.join(APPLICATIONS)}")
+
+    prefork = WORKERS > 1 and hasattr(os, "fork")
+    cache_dir = None
+    if prefork and "SHARED_CACHE_PATH" not in os.environ:
+        # Private to this server, removed when it stops
+        cache_dir = tempfile.mkdtemp(prefix="gconnect-")
+        os.environ["SHARED_CACHE_PATH"] = os.path.join(cache_dir, "cache.db")
+
+    try:
+        application = load_application()
+        from metrics import resident_memory_bytes, startup_durations
+
+        startup_durations["preload"] = time.perf_counter() - STARTED
+        logger.info(
+            f"Loaded {APPLICATIONS[SERVER_MODE]} in {startup_durations['preload']:.2f}s,"
+            f" RSS {megabytes(resident_memory_bytes())}"
+        )
+
+        if prefork:
+            Master(application, bind_socket(), WORKERS).run()
+        elif WORKERS > 1:
+            # No fork on this platform: uvicorn spawns workers that import the app each
+            uvicorn.run(APPLICATIONS[SERVER_MODE], host=HOST, port=PORT, workers=WORKERS)
+        else:
+            serve(application, None, time.perf_counter())
+    finally:
+        if cache_dir is not None:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
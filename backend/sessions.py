@@ -0,0 +1,322 @@
+"""
+Cache of logged-in Garmin sessions keyed by bearer token, and of credential logins.
+
+With a shared store, every session's current tokenstore and resolved profile
+are also published to the other worker processes, which rebuild the session
+from them without repeating the login, the profile lookups or a token refresh.
+The tokenstore holds the OAuth tokens, so the shared file must stay private;
+see shared_cache for how it is protected.
+"""
+
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from cache import TTLCache
+from garmin_client import GarminClient
+from shared_cache import SharedStore, SharedTTLCache, shared_store
+
+logger = logging.getLogger(__name__)
+
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "256"))
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "900"))
+# Seconds between sweeps of the background token refresher (0 disables it)
+TOKEN_REFRESH_INTERVAL = float(os.getenv("TOKEN_REFRESH_INTERVAL", "60"))
+# OAuth2 tokens expiring within this many seconds are refreshed by the sweep
+TOKEN_REFRESH_MARGIN = float(os.getenv("TOKEN_REFRESH_MARGIN", "300"))
+# Only sessions used within this many seconds are kept fresh
+TOKEN_REFRESH_ACTIVE_WINDOW = float(os.getenv("TOKEN_REFRESH_ACTIVE_WINDOW", "600"))
+# Seconds a credential login is answered with the session it created (0 disables it)
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "300"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "256"))
+
+
+def token_key(tokenstore: str) -> str:
+    """Return a stable hash of a tokenstore so raw tokens are never used as keys."""
+    return hashlib.sha256(tokenstore.encode()).hexdigest()
+
+
+class Session:
+    """A logged-in GarminClient together with its memoized profile and unit system."""
+
+    def __init__(self, client: GarminClient, tokenstore: str):
+        """
+        Initialize the session.
+        :param tokenstore: Tokenstore the client was logged in with, replaced on refresh
+        """
+        self.client = client
+        self.tokenstore = tokenstore
+        self.last_used = time.monotonic()
+        # Cache keys of every tokenstore the session was known by
+        self.keys = {token_key(tokenstore)}
+        # State last published to the other worker processes
+        self.published: Optional[Dict[str, Any]] = None
+
+    @property
+    def profile(self) -> Optional[Dict[str, Any]]:
+        """Social profile, fetched by garth on first access and memoized."""
+        return self.client.garth.profile
+
+    @property
+    def unit_system(self) -> Optional[str]:
+        """Unit system, resolved by the client on first access and memoized."""
+        return self.client.unit_system
+
+    def refresh(self, margin: float) -> bool:
+        """Renew the OAuth2 token if it expires within 'margin' seconds, updating 'tokenstore'."""
+        if not self.client.refresh_token(margin):
+            return False
+        self.tokenstore = self.client.garth.dumps()
+        return True
+
+    def state(self) -> Dict[str, Any]:
+        """Return what another process needs to rebuild the session."""
+        return {"tokenstore": self.tokenstore, **self.client.known_profile()}
+
+
+class SessionCache(TTLCache):
+    """TTL+LRU cache of sessions keyed by the hash of their tokenstore."""
+
+    def __init__(
+        self, maxsize: int = 256, ttl: float = 900.0, shared: Optional[SharedStore] = None
+    ):
+        """
+        Initialize the cache.
+        :param shared: Store publishing session state to the other worker processes
+        """
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.shared = shared
+
+    def get_session(self, tokenstore: str) -> Optional[Session]:
+        """Return the cached session for 'tokenstore', if any, and mark it as active."""
+        session = self.get(token_key(tokenstore))
+        if session is not None:
+            session.last_used = time.monotonic()
+            if self.shared is not None and session.published != session.state():
+                # e.g. the profile was resolved by the request that created the session
+                self.publish(session)
+        return session
+
+    def publish(self, session: Session) -> None:
+        """Share the state of 'session' under every tokenstore it was known by."""
+        if self.shared is None:
+            return
+        state = session.state()
+        try:
+            for key in session.keys:
+                self.shared.set("session", key, state, self.ttl)
+            session.published = state
+        except Exception as e:
+            logger.warning(f"Error publishing session state: {e}")
+
+    def restore(self, key: str) -> Optional[Session]:
+        """
+        Rebuild the session cached under 'key' by another worker process, if any.
+        The client is logged in with the session's current tokenstore, which is newer
+        than the one hashed to 'key' when the session was refreshed since.
+        """
+        if self.shared is None:
+            return None
+        try:
+            shared = self.shared.get("session", key)
+            if shared is None:
+                return None
+            state = shared[0]
+            client = GarminClient(lazy_profile=True)
+            client.login(state["tokenstore"])
+        except Exception as e:
+            logger.warning(f"Error restoring a shared session: {e}")
+            return None
+        client.seed_profile(state["display_name"], state["full_name"], state["unit_system"])
+        session = Session(client, state["tokenstore"])
+        session.keys.add(key)
+        session.published = state
+        for alias in session.keys:
+            self.set(alias, session)
+        return session
+
+    def restore_session(self, tokenstore: str) -> Optional[Session]:
+        """Rebuild the session of 'tokenstore' created by another worker process, if any."""
+        return self.restore(token_key(tokenstore))
+
+    def peek_session(self, tokenstore: str) -> Optional[Session]:
+        """Return the cached session for 'tokenstore' without touching statistics or recency."""
+        return self.peek(token_key(tokenstore))
+
+    def add_session(self, tokenstore: str, client: GarminClient) -> Session:
+        """Cache a freshly logged-in client under 'tokenstore'."""
+        session = Session(client, tokenstore)
+        self.set(token_key(tokenstore), session)
+        self.publish(session)
+        return session
+
+    def refresh_session(self, session: Session, margin: float) -> bool:
+        """
+        Renew the token of 'session' if it is about to expire.
+        The refreshed tokenstore is cached as an alias so clients that swap it in keep
+        the session; the old tokenstore keeps working until its entry expires.
+        """
+        if not session.refresh(margin):
+            return False
+        key = token_key(session.tokenstore)
+        session.keys.add(key)
+        self.set(key, session)
+        self.publish(session)
+        return True
+
+    def active_sessions(self, window: float) -> List[Session]:
+        """Return the distinct sessions used within the last 'window' seconds."""
+        since = time.monotonic() - window
+        sessions = {id(session): session for session in self.values()}
+        return [session for session in sessions.values() if session.last_used >= since]
+
+    def invalidate(self, tokenstore: str) -> None:
+        """
+        Forget the session for 'tokenstore', under every tokenstore it was refreshed to.
+        Other worker processes can no longer restore it, but keep a copy they already hold
+        until it expires.
+        """
+        key = token_key(tokenstore)
+        session = self.pop(key)
+        keys = session.keys if session is not None else {key}
+        for alias in keys:
+            self.pop(alias)
+            if self.shared is not None:
+                try:
+                    self.shared.pop("session", alias)
+                except Exception as e:
+                    logger.warning(f"Error removing shared session state: {e}")
+
+
+class AuthCache(SharedTTLCache):
+    """
+    TTL+LRU cache mapping credentials to the session a login with them created.
+
+    Keys are HMACs of the credentials under a secret drawn when the process
+    starts, before serve.py forks its workers, and values only reference the
+    session by the hash of its tokenstore, so these entries hold neither
+    credentials nor tokens; the shared session entries they lead to do hold the
+    tokenstore. An entry dies with its session, whether it expired or was
+    invalidated.
+    """
+
+    def __init__(
+        self,
+        sessions: SessionCache,
+        maxsize: int = 256,
+        ttl: float = 300.0,
+        shared: Optional[SharedStore] = None,
+    ):
+        super().__init__("auth", shared, maxsize=maxsize, ttl=ttl)
+        self.sessions = sessions
+        self._secret = secrets.token_bytes(32)
+
+    def credential_key(self, email: str, password: str) -> str:
+        """Return the salted hash identifying a pair of credentials."""
+        message = f"{email.strip().lower()}\0{password}".encode()
+        return hmac.new(self._secret, message, hashlib.sha256).hexdigest()
+
+    def get_session(self, email: str, password: str) -> Optional[Session]:
+        """Return the session a recent login with these credentials created, if it is cached."""
+        key = self.credential_key(email, password)
+        reference = self.get(key)
+        if reference is None:
+            return None
+        session = self.sessions.peek(reference) or self.sessions.restore(reference)
+        if session is None:
+            self.pop(key)
+        return session
+
+    def add_login(self, email: str, password: str, session: Session) -> None:
+        """Remember the session a login with these credentials created."""
+        if self.ttl is None or self.ttl > 0:
+            self.set(self.credential_key(email, password), token_key(session.tokenstore))
+
+    def invalidate(self, email: str, password: str) -> None:
+        """Forget the login with these credentials."""
+        self.pop(self.credential_key(email, password))
+
+
+def refreshed_tokenstore(tokenstore: str) -> Optional[str]:
+    """Return the tokenstore the session of 'tokenstore' was refreshed to, if it was."""
+    session = session_cache.peek_session(tokenstore)
+    if session is None or session.tokenstore == tokenstore:
+        return None
+    return session.tokenstore
+
+
+class TokenRefresher:
+    """
+    Background thread renewing the OAuth2 tokens of recently used sessions.
+
+    Tokens are exchanged 'margin' seconds before they expire, so requests of
+    active users never wait for an OAuth exchange. The thread starts on first
+    use, which also restarts it in worker processes forked after import.
+    """
+
+    def __init__(
+        self,
+        cache: SessionCache,
+        interval: float = TOKEN_REFRESH_INTERVAL,
+        margin: float = TOKEN_REFRESH_MARGIN,
+        active_window: float = TOKEN_REFRESH_ACTIVE_WINDOW,
+    ):
+        """
+        Initialize the refresher.
+        :param interval: Seconds between sweeps, 0 to disable the thread
+        :param margin: Refresh tokens expiring within this many seconds, keep above 'interval'
+        :param active_window: Only refresh sessions used within this many seconds
+        """
+        self.cache = cache
+        self.interval = interval
+        self.margin = margin
+        self.active_window = active_window
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start the sweep thread unless it is disabled or already running."""
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="token-refresher", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the sweep thread."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run_once(self) -> int:
+        """Refresh the tokens of active sessions that are about to expire, returning how many."""
+        refreshed = 0
+        for session in self.cache.active_sessions(self.active_window):
+            try:
+                if self.cache.refresh_session(session, self.margin):
+                    refreshed += 1
+            except Exception as e:
+                logger.error(f"Error refreshing session token: {e}")
+        if refreshed:
+            logger.info(f"Refreshed {refreshed} session tokens")
+        return refreshed
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.run_once()
+
+
+session_cache = SessionCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL, shared=shared_store)
+auth_cache = AuthCache(
+    session_cache, maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL, shared=shared_store
+)
+token_refresher = TokenRefresher(session_cache)
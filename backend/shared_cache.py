@@ -0,0 +1,331 @@
+"""
+Cache shared by the worker processes of one host.
+
+Entries live in a SQLite database in WAL mode, so readers in every worker
+proceed while one writes. SharedTTLCache keeps its usual in-memory LRU in
+front of it: a local miss falls through to the shared table, and a hit there
+is copied into the local cache for the rest of its time-to-live. A response,
+summary or login cached by one worker therefore serves all of them.
+
+serve.py points SHARED_CACHE_PATH at a private temporary file when it starts
+several workers; without it every cache stays local to its process. The file
+holds session tokenstores, i.e. OAuth tokens, in the clear and must stay
+private: the store makes it readable by its owner only. Every value is signed
+with SHARED_CACHE_SECRET and only unpickled when its signature checks out, so
+entries the server did not write itself are treated as misses.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import pickle
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Hashable, Optional, Tuple, TypeVar
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Path of the SQLite database shared by the workers, caches stay per process when unset
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH")
+# Maximum number of entries kept per cache in the shared database
+SHARED_CACHE_SIZE = int(os.getenv("SHARED_CACHE_SIZE", "10000"))
+# Key signing the shared entries; drawn at startup, before serve.py forks its workers,
+# unless servers started separately share one file and must agree on it
+SHARED_CACHE_SECRET = os.getenv("SHARED_CACHE_SECRET")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key BLOB NOT NULL,
+    expires_at REAL,
+    value BLOB NOT NULL,
+    owner TEXT,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_by_expiry ON entries (namespace, expires_at);
+"""
+
+# Index created once databases made before the 'owner' column have it
+OWNER_INDEX = "CREATE INDEX IF NOT EXISTS entries_by_owner ON entries (namespace, owner)"
+
+# Writes between two sweeps of expired and surplus entries
+SWEEP_EVERY = 256
+
+_MISSING = object()
+
+_SECRET = SHARED_CACHE_SECRET.encode() if SHARED_CACHE_SECRET else secrets.token_bytes(32)
+SIGNATURE_SIZE = hashlib.sha256().digest_size
+
+T = TypeVar("T")
+
+
+class SharedStore:
+    """Pickled values with an expiry time, in namespaces, in one SQLite database."""
+
+    def __init__(
+        self,
+        path: str,
+        maxsize: int = SHARED_CACHE_SIZE,
+        timer: Callable[[], float] = time.time,
+        secret: bytes = _SECRET,
+    ):
+        """
+        Initialize the store, creating the database, readable by its owner only, if needed.
+        :param maxsize: Maximum number of entries kept per namespace
+        :param timer: Wall clock shared by all processes, overridable for tests
+        :param secret: Key signing the values, the same in every process sharing 'path'
+        """
+        self.path = path
+        self.maxsize = maxsize
+        self._timer = timer
+        self._secret = secret
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        # SQLite gives the -wal and -shm files the permissions of the database
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+        try:
+            os.chmod(path, 0o600)
+        except OSError as e:
+            logger.warning(f"Could not make the shared cache {path} private: {e}")
+
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(entries)")]
+            if "owner" not in columns:
+                conn.execute("ALTER TABLE entries ADD COLUMN owner TEXT")
+            conn.execute(OWNER_INDEX)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the connection owned by the calling thread of the calling process."""
+        conn = getattr(self._local, "conn", None)
+        # A connection inherited through fork must not be used by the child
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _key(key: Hashable) -> bytes:
+        # repr() of the str/int tuples used as cache keys is the same in every process
+        return hashlib.blake2b(repr(key).encode(), digest_size=16).digest()
+
+    def _sign(self, namespace: str, key: bytes, data: bytes) -> bytes:
+        """Return the signature of a pickled value, bound to the entry it is stored as."""
+        message = namespace.encode() + b"\0" + key + data
+        return hmac.new(self._secret, message, hashlib.sha256).digest()
+
+    def get(self, namespace: str, key: Hashable) -> Optional[Tuple[Any, Optional[float]]]:
+        """
+        Return the value stored under 'key' and its remaining time-to-live, None if absent.
+        The time-to-live is None for entries that never expire.
+        """
+        key = self._key(key)
+        row = (
+            self._connection()
+            .execute(
+                "SELECT expires_at, value FROM entries WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        expires_at, value = row
+        remaining = None if expires_at is None else expires_at - self._timer()
+        if remaining is not None and remaining <= 0:
+            return None
+        signature, data = value[:SIGNATURE_SIZE], value[SIGNATURE_SIZE:]
+        if not hmac.compare_digest(signature, self._sign(namespace, key, data)):
+            logger.warning(f"Ignoring a shared {namespace} cache entry with a bad signature")
+            return None
+        return pickle.loads(data), remaining
+
+    def set(
+        self,
+        namespace: str,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float],
+        owner: Optional[str] = None,
+    ) -> None:
+        """
+        Store 'value' under 'key' for 'ttl' seconds, or until evicted when 'ttl' is None.
+        :param owner: (Optional) Tag the entries 'pop_owner' removes together
+        """
+        expires_at = None if ttl is None else self._timer() + ttl
+        key = self._key(key)
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        self._connection().execute(
+            "INSERT OR REPLACE INTO entries (namespace, key, expires_at, value, owner)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (namespace, key, expires_at, self._sign(namespace, key, data) + data, owner),
+        )
+        with self._lock:
+            self._writes += 1
+            sweep = self._writes % SWEEP_EVERY == 0
+        if sweep:
+            self.sweep(namespace)
+
+    def pop(self, namespace: str, key: Hashable) -> None:
+        """Remove 'key'."""
+        self._connection().execute(
+            "DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, self._key(key))
+        )
+
+    def pop_owner(self, namespace: str, owner: str) -> None:
+        """Remove every entry of 'namespace' stored for 'owner'."""
+        self._connection().execute(
+            "DELETE FROM entries WHERE namespace = ? AND owner = ?", (namespace, owner)
+        )
+
+    def clear(self, namespace: str) -> None:
+        """Remove every entry of 'namespace'."""
+        self._connection().execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+
+    def count(self, namespace: str) -> int:
+        """Return the number of entries of 'namespace', expired ones included."""
+        row = (
+            self._connection()
+            .execute("SELECT COUNT(*) FROM entries WHERE namespace = ?", (namespace,))
+            .fetchone()
+        )
+        return row[0]
+
+    def sweep(self, namespace: str) -> None:
+        """Delete expired entries, then the ones expiring soonest beyond 'maxsize'."""
+        conn = self._connection()
+        conn.execute(
+            "DELETE FROM entries WHERE namespace = ? AND expires_at <= ?",
+            (namespace, self._timer()),
+        )
+        surplus = self.count(namespace) - self.maxsize
+        if surplus > 0:
+            # Entries that never expire sort first, as NULL, and go first
+            conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND key IN"
+                " (SELECT key FROM entries WHERE namespace = ? ORDER BY expires_at LIMIT ?)",
+                (namespace, namespace, surplus),
+            )
+
+
+class SharedTTLCache(TTLCache):
+    """
+    TTLCache backed by a SharedStore namespace.
+
+    Values must be picklable. Without a store it behaves exactly like TTLCache.
+    Failures of the shared database are logged and treated as misses, so they
+    never fail a request.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        store: Optional[SharedStore],
+        maxsize: int = 256,
+        ttl: Optional[float] = 300.0,
+        timer: Callable[[], float] = time.monotonic,
+        owner: Optional[Callable[[Hashable], str]] = None,
+    ):
+        """
+        Initialize the cache.
+        :param owner: (Optional) Function returning the owner of a key, whose entries
+            'purge' removes at once
+        """
+        super().__init__(maxsize=maxsize, ttl=ttl, timer=timer)
+        self.namespace = namespace
+        self.store = store
+        self.owner = owner
+        self.shared_hits = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for 'key' from this process or, failing that, the store."""
+        value = super().get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.store is None or self.ttl == 0:
+            return default
+        try:
+            shared = self.store.get(self.namespace, key)
+        except sqlite3.Error as e:
+            logger.warning(f"Error reading the shared {self.namespace} cache: {e}")
+            return default
+        if shared is None:
+            return default
+        value, remaining = shared
+        super().set(key, value, remaining)
+        with self._lock:
+            self.shared_hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store 'value' under 'key' in this process and in the store."""
+        super().set(key, value, ttl)
+        ttl = self.ttl if ttl is None else ttl
+        if self.store is None or ttl == 0:
+            return
+        try:
+            owner = self.owner(key) if self.owner is not None else None
+            self.store.set(self.namespace, key, value, ttl, owner)
+        except (sqlite3.Error, pickle.PicklingError, TypeError, AttributeError) as e:
+            logger.warning(f"Error writing the shared {self.namespace} cache: {e}")
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove 'key' from this process and from the store."""
+        value = super().pop(key, default)
+        if self.store is not None:
+            try:
+                self.store.pop(self.namespace, key)
+            except sqlite3.Error as e:
+                logger.warning(f"Error removing from the shared {self.namespace} cache: {e}")
+        return value
+
+    def purge(self, owner: str) -> None:
+        """
+        Remove the entries of 'owner' from this process and from the store. Other processes
+        keep the copies they already hold until those expire.
+        """
+        if self.owner is None:
+            raise TypeError(f"The {self.namespace} cache does not track owners")
+        self.pop_where(lambda key: self.owner(key) == owner)
+        if self.store is not None:
+            try:
+                self.store.pop_owner(self.namespace, owner)
+            except sqlite3.Error as e:
+                logger.warning(f"Error purging the shared {self.namespace} cache: {e}")
+
+    def clear(self) -> None:
+        """Remove all entries, shared ones included, and reset the counters."""
+        super().clear()
+        self.shared_hits = 0
+        if self.store is not None:
+            self.store.clear(self.namespace)
+
+    def stats(self):
+        """Return a snapshot of the cache counters, with the hits answered by the store."""
+        stats = super().stats()
+        stats["shared_hits"] = self.shared_hits
+        return stats
+
+
+async def offload(cache: SharedTTLCache, fn: Callable[..., T], *args: Any) -> T:
+    """
+    Call 'fn', which reads or writes 'cache', in a thread when the cache has a store, so its
+    SQLite queries never block the event loop; in-memory caches are used in place.
+    """
+    if cache.store is None:
+        return fn(*args)
+    return await asyncio.to_thread(fn, *args)
+
+
+shared_store = SharedStore(SHARED_CACHE_PATH) if SHARED_CACHE_PATH else None
@@ -0,0 +1,122 @@
+"""Coalescing of identical concurrent calls into a single in-flight call."""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+import deadline
+from throttle import DeadlineExceeded
+
+
+class _Call:
+    """State of one in-flight call shared by its waiters."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+def _wait_time() -> Optional[float]:
+    """Return the seconds a follower may wait before its own deadline, None without one."""
+    left = deadline.remaining()
+    return None if left is None else max(left, 0.0)
+
+
+def _outlived(error: Optional[BaseException]) -> bool:
+    """Tell whether 'error' is the leader's deadline passing while the caller still has time."""
+    left = deadline.remaining()
+    return isinstance(error, DeadlineExceeded) and (left is None or left > 0)
+
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time.
+
+    Callers arriving while a call with the same key is in flight wait for it
+    and receive its result (or exception) instead of making their own call.
+    A caller waits no longer than its own deadline, and makes the call itself
+    when the leader ran out of its, possibly shorter, time. The shared result
+    is the same object for every caller, so it must be treated as read-only.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._futures: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Call 'fn', or wait for the in-flight call with the same key."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if not call.done.wait(_wait_time()):
+                raise DeadlineExceeded()
+            if call.error is not None:
+                if _outlived(call.error):
+                    return self.do(key, fn)
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await 'fn()', or the in-flight call with the same key on this event loop."""
+        loop_key = (id(asyncio.get_running_loop()), key)
+        future = self._futures.get(loop_key)
+        if future is not None:
+            self.coalesced += 1
+            done, _ = await asyncio.wait((future,), timeout=_wait_time())
+            if not done:
+                raise DeadlineExceeded()
+            if not future.cancelled() and _outlived(future.exception()):
+                return await self.do_async(key, fn)
+            return future.result()
+
+        future = asyncio.get_running_loop().create_future()
+        self._futures[loop_key] = future
+        self.calls += 1
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._futures[loop_key]
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of upstream calls made and of callers that shared one."""
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls) + len(self._futures),
+        }
+
+
+upstream_flight = SingleFlight()
@@ -0,0 +1,277 @@
+"""
+Activity statistics aggregated server-side.
+
+Activities are reduced to columns (date, type, distance, duration) bucketed by
+calendar month. Months that are over never change, so their columns are cached
+and only the current month is read from Garmin again; aggregates are computed
+from the columns on every request, which takes milliseconds even for years.
+"""
+
+import datetime
+import math
+import os
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from shared_cache import SharedTTLCache, offload, shared_store
+
+# Maximum number of finished account months kept in memory
+STATS_CACHE_SIZE = int(os.getenv("STATS_CACHE_SIZE", "20000"))
+# Longest date range, in days, one /activities/stats request may cover
+STATS_MAX_DAYS = int(os.getenv("STATS_MAX_DAYS", "3660"))
+# Days covered when no 'start' is given
+STATS_DEFAULT_DAYS = 365
+
+GROUPS = ("type", "week", "month")
+METRICS = ("distance", "duration")
+DEFAULT_PERCENTILES = (50.0, 90.0)
+
+# A month is over everywhere once it has ended in the westernmost time zone (UTC-12)
+LATEST_UTC_OFFSET = datetime.timedelta(hours=12)
+
+# Columns of finished months, keyed by display name and month (YYYY-MM)
+stats_cache = SharedTTLCache("stats", shared_store, maxsize=STATS_CACHE_SIZE, ttl=None)
+
+
+class MonthColumns:
+    """Columns of the activities started in one calendar month."""
+
+    __slots__ = ("dates", "types", "distance", "duration")
+
+    def __init__(self):
+        self.dates: List[str] = []
+        self.types: List[Optional[str]] = []
+        self.distance: List[Optional[float]] = []
+        self.duration: List[Optional[float]] = []
+
+    def append(self, activity: Dict[str, Any]) -> None:
+        self.dates.append(activity_date(activity))
+        self.types.append((activity.get("activityType") or {}).get("typeKey"))
+        self.distance.append(activity.get("distance"))
+        self.duration.append(activity.get("duration"))
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+
+def activity_date(activity: Dict[str, Any]) -> str:
+    """Return the local start date (YYYY-MM-DD) of an activity."""
+    return (activity.get("startTimeLocal") or activity.get("startTimeGMT") or "")[:10]
+
+
+def parse_group(value: Optional[str]) -> str:
+    """Validate the 'group' query value, 'month' by default."""
+    value = (value or "").strip() or "month"
+    if value not in GROUPS:
+        raise ValueError(f"Parameter 'group' must be one of {', '.join(GROUPS)}")
+    return value
+
+
+def parse_percentiles(value: Optional[str]) -> Tuple[float, ...]:
+    """Parse the comma-separated 'percentiles' query value, e.g. '50,90,99'."""
+    if not value:
+        return DEFAULT_PERCENTILES
+    try:
+        percentiles = tuple(float(part) for part in value.split(",") if part.strip())
+    except ValueError:
+        raise ValueError("Parameter 'percentiles' must be numbers between 0 and 100") from None
+    if any(not 0 <= p <= 100 for p in percentiles):
+        raise ValueError("Parameter 'percentiles' must be numbers between 0 and 100")
+    return percentiles
+
+
+def parse_period(
+    start: Optional[str], end: Optional[str], today: Optional[datetime.date] = None
+) -> Tuple[datetime.date, datetime.date]:
+    """
+    Parse the 'start' and 'end' dates (YYYY-MM-DD, inclusive).
+    'end' defaults to today and 'start' to STATS_DEFAULT_DAYS before 'end'.
+    """
+    try:
+        last = datetime.date.fromisoformat(end) if end else (today or datetime.date.today())
+        first = (
+            datetime.date.fromisoformat(start)
+            if start
+            else last - datetime.timedelta(days=STATS_DEFAULT_DAYS - 1)
+        )
+    except ValueError:
+        raise ValueError(
+            "Parameters 'start' and 'end' must be dates formatted YYYY-MM-DD"
+        ) from None
+    if first > last:
+        raise ValueError("Parameter 'start' must not be after 'end'")
+    if (last - first).days + 1 > STATS_MAX_DAYS:
+        raise ValueError(f"Date range must not exceed {STATS_MAX_DAYS} days")
+    return first, last
+
+
+def months_between(first: datetime.date, last: datetime.date) -> List[str]:
+    """Return the months (YYYY-MM) from 'first' to 'last', oldest first."""
+    months = []
+    year, month = first.year, first.month
+    while (year, month) <= (last.year, last.month):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def month_is_closed(month: str, now: Optional[datetime.datetime] = None) -> bool:
+    """Check whether 'month' (YYYY-MM) has ended in every time zone."""
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    year, number = int(month[:4]), int(month[5:7])
+    year, number = (year + 1, 1) if number == 12 else (year, number + 1)
+    end = datetime.datetime(year, number, 1, tzinfo=datetime.timezone.utc)
+    return now >= end + LATEST_UTC_OFFSET
+
+
+def percentile(ordered: Sequence[float], share: float) -> Optional[float]:
+    """Percentile of sorted values with linear interpolation, 'share' from 0 to 100."""
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * share / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values: Iterable[Optional[float]], percentiles: Sequence[float]) -> Dict[str, Any]:
+    """Sum, mean and percentiles of the values that are set."""
+    ordered = sorted(value for value in values if value is not None)
+    total = math.fsum(ordered)
+    summary = {"sum": total, "mean": total / len(ordered) if ordered else None}
+    for share in percentiles:
+        summary[f"p{share:g}"] = percentile(ordered, share)
+    return summary
+
+
+def group_key(group: str, date: str, activity_type: Optional[str]) -> Optional[str]:
+    if group == "type":
+        return activity_type
+    if group == "month":
+        return date[:7]
+    year, week, _ = datetime.date.fromisoformat(date).isocalendar()
+    return f"{year:04d}-W{week:02d}"
+
+
+def aggregate(
+    months: Dict[str, MonthColumns],
+    first: datetime.date,
+    last: datetime.date,
+    group: str,
+    percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+) -> List[Dict[str, Any]]:
+    """
+    Aggregate the activities started from 'first' to 'last' by 'group'.
+    :return: One entry per group with the activity count and a summary per metric,
+        periods in chronological order and types by descending count
+    """
+    start, end = first.isoformat(), last.isoformat()
+    # Row indices per group, per month, so the metric columns are read in one pass
+    rows: Dict[Any, List[Tuple[MonthColumns, int]]] = {}
+    for columns in months.values():
+        for index, date in enumerate(columns.dates):
+            if start <= date <= end:
+                key = group_key(group, date, columns.types[index])
+                rows.setdefault(key, []).append((columns, index))
+
+    groups = []
+    for key, members in rows.items():
+        entry: Dict[str, Any] = {"key": key, "count": len(members)}
+        for metric in METRICS:
+            entry[metric] = summarize(
+                (getattr(columns, metric)[index] for columns, index in members), percentiles
+            )
+        groups.append(entry)
+
+    if group == "type":
+        groups.sort(key=lambda entry: (-entry["count"], entry["key"] or ""))
+    else:
+        groups.sort(key=lambda entry: entry["key"])
+    return groups
+
+
+def _cached_months(display_name: str, months: Sequence[str]) -> Dict[str, MonthColumns]:
+    found = {}
+    for month in months:
+        columns = stats_cache.get((display_name, month))
+        if columns is not None:
+            found[month] = columns
+    return found
+
+
+def _bucket(oldest: str) -> Tuple[Dict[str, MonthColumns], Callable[[Dict[str, Any]], bool]]:
+    """
+    Return month buckets and a function adding an activity to them.
+    The function returns False once activities are older than 'oldest'.
+    """
+    buckets: Dict[str, MonthColumns] = {}
+
+    def add(activity: Dict[str, Any]) -> bool:
+        month = activity_date(activity)[:7]
+        if month < oldest:
+            return False
+        buckets.setdefault(month, MonthColumns()).append(activity)
+        return True
+
+    return buckets, add
+
+
+def _store(
+    display_name: str, buckets: Dict[str, MonthColumns], months: Sequence[str]
+) -> Dict[str, MonthColumns]:
+    """Cache the finished months read from Garmin and return the requested ones."""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    # Every month from the oldest requested one up to today was read completely
+    for month in months_between(datetime.date.fromisoformat(f"{months[0]}-01"), now.date()):
+        if month_is_closed(month, now):
+            stats_cache.set((display_name, month), buckets.get(month) or MonthColumns())
+    return {month: buckets.get(month) or MonthColumns() for month in months}
+
+
+def load_months(
+    display_name: str, months: Sequence[str], activities: Iterator[Dict[str, Any]]
+) -> Dict[str, MonthColumns]:
+    """
+    Return the columns of 'months', reading only the months that are not cached.
+    :param activities: The account's activities, newest first; only consumed when needed
+    """
+    found = _cached_months(display_name, months)
+    missing = [month for month in months if month not in found]
+    if missing:
+        buckets, add = _bucket(missing[0])
+        for activity in activities:
+            if not add(activity):
+                break
+        found.update(_store(display_name, buckets, missing))
+    return found
+
+
+async def load_months_async(
+    display_name: str, months: Sequence[str], activities: AsyncIterator[Dict[str, Any]]
+) -> Dict[str, MonthColumns]:
+    """Like load_months, reading activities from an async iterator."""
+    found = await offload(stats_cache, _cached_months, display_name, months)
+    missing = [month for month in months if month not in found]
+    if missing:
+        buckets, add = _bucket(missing[0])
+        try:
+            async for activity in activities:
+                if not add(activity):
+                    break
+        finally:
+            # Stop the upstream pagination behind the iterator right away
+            aclose = getattr(activities, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        found.update(await offload(stats_cache, _store, display_name, buckets, missing))
+    return found
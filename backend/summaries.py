@@ -0,0 +1,206 @@
+"""Daily summaries over a date range, cached per day and returned as columns."""
+
+import asyncio
+import datetime
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import deadline
+from shared_cache import SharedTTLCache, offload, shared_store
+from throttle import UPSTREAM_ACCOUNT_BURST, UPSTREAM_ACCOUNT_RATE, UpstreamUnavailable
+
+# Days fetched from Garmin in parallel for one /summaries request
+SUMMARY_FETCH_CONCURRENCY = int(os.getenv("SUMMARY_FETCH_CONCURRENCY", "8"))
+# Longest date range, in days, one /summaries request may cover
+SUMMARY_MAX_DAYS = int(os.getenv("SUMMARY_MAX_DAYS", "366"))
+# Maximum number of finished days kept in memory across all accounts
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", "20000"))
+
+# Metrics returned by default, the ones the dashboard charts
+DAILY_FIELDS = (
+    "totalSteps",
+    "totalDistanceMeters",
+    "totalKilocalories",
+    "activeKilocalories",
+    "floorsAscended",
+    "restingHeartRate",
+    "minHeartRate",
+    "maxHeartRate",
+    "averageStressLevel",
+    "bodyBatteryHighestValue",
+    "bodyBatteryLowestValue",
+    "sleepingSeconds",
+    "moderateIntensityMinutes",
+    "vigorousIntensityMinutes",
+)
+
+PRESETS = {
+    "daily": DAILY_FIELDS,
+}
+
+# A day is over everywhere once it has ended in the westernmost time zone (UTC-12)
+LATEST_UTC_OFFSET = datetime.timedelta(hours=12)
+
+# Finished days never change, so they are kept until evicted; keyed by display name and date
+summary_cache = SharedTTLCache("summary", shared_store, maxsize=SUMMARY_CACHE_SIZE, ttl=None)
+
+
+def parse_date_range(start: Optional[str], end: Optional[str]) -> List[str]:
+    """
+    Expand 'start' and 'end' (YYYY-MM-DD, inclusive) into the dates between them.
+    :raise ValueError: When a date is missing or invalid, or the range is reversed or too long
+    """
+    if not start or not end:
+        raise ValueError("Parameters 'start' and 'end' are required")
+    try:
+        first = datetime.date.fromisoformat(start)
+        last = datetime.date.fromisoformat(end)
+    except ValueError:
+        raise ValueError(
+            "Parameters 'start' and 'end' must be dates formatted YYYY-MM-DD"
+        ) from None
+    days = (last - first).days + 1
+    if days < 1:
+        raise ValueError("Parameter 'start' must not be after 'end'")
+    if days > SUMMARY_MAX_DAYS:
+        raise ValueError(f"Date range must not exceed {SUMMARY_MAX_DAYS} days")
+    return [(first + datetime.timedelta(days=offset)).isoformat() for offset in range(days)]
+
+
+def parse_summary_fields(value: Optional[str]) -> Optional[Sequence[str]]:
+    """
+    Resolve a 'fields' query value into the metrics to return.
+    :return: Metric names, or None for every metric Garmin returned
+    """
+    value = (value or "").strip() or "daily"
+    if value == "all":
+        return None
+    if value in PRESETS:
+        return PRESETS[value]
+    return tuple(name.strip() for name in value.split(",") if name.strip())
+
+
+def day_is_over(day: str, now: Optional[datetime.datetime] = None) -> bool:
+    """Check whether 'day' has ended in every time zone, so its summary is final."""
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    end = datetime.datetime.combine(
+        datetime.date.fromisoformat(day) + datetime.timedelta(days=1),
+        datetime.time(),
+        tzinfo=datetime.timezone.utc,
+    )
+    return now >= end + LATEST_UTC_OFFSET
+
+
+def cached_summaries(display_name: str, dates: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    """Return the cached summaries of 'dates', by date."""
+    found = {}
+    for day in dates:
+        summary = summary_cache.get((display_name, day))
+        if summary is not None:
+            found[day] = summary
+    return found
+
+
+def summary_cacher(display_name: str) -> Callable[[str, Dict[str, Any]], None]:
+    """
+    Return a callback caching each fetched summary of a day that is over, so the days a
+    request fetched before failing, e.g. at its deadline, are not fetched again.
+    """
+
+    def cache(day: str, summary: Dict[str, Any]) -> None:
+        if day_is_over(day):
+            summary_cache.set((display_name, day), summary)
+
+    return cache
+
+
+def rate_budget_days(
+    seconds: Optional[float],
+    rate: float = UPSTREAM_ACCOUNT_RATE,
+    burst: int = UPSTREAM_ACCOUNT_BURST,
+) -> Optional[int]:
+    """
+    Return the days, one upstream call each, that an account's rate limit lets a request
+    fetch in 'seconds', or None when neither limits it.
+    """
+    if rate <= 0 or seconds is None:
+        return None
+    return max(int(burst + rate * max(seconds, 0)), 1)
+
+
+def budget_missing(missing: List[str]) -> List[str]:
+    """
+    Return the uncached days the request has time to fetch, all of 'missing' when its
+    deadline and rate limit allow.
+    """
+    budget = rate_budget_days(deadline.remaining())
+    return missing if budget is None else missing[:budget]
+
+
+def over_budget(fetched: int, missing: int) -> UpstreamUnavailable:
+    """Build the 503 telling a client to retry for the days its request had no time for."""
+    return UpstreamUnavailable(
+        f"Fetched {fetched} of {missing} uncached days within the Garmin rate limit, "
+        "retry for the rest",
+        UPSTREAM_ACCOUNT_BURST / UPSTREAM_ACCOUNT_RATE,
+    )
+
+
+def columnar(
+    dates: Sequence[str], summaries: Dict[str, Dict[str, Any]], fields: Optional[Sequence[str]]
+) -> Dict[str, List[Any]]:
+    """
+    Lay summaries out as one array per metric, aligned with 'calendarDate'.
+    Metrics a day does not have are null.
+    """
+    if fields is None:
+        names: Dict[str, None] = {}
+        for day in dates:
+            names.update(dict.fromkeys(summaries.get(day) or {}))
+        names.pop("calendarDate", None)
+        fields = tuple(names)
+
+    columns: Dict[str, List[Any]] = {"calendarDate": list(dates)}
+    rows = [summaries.get(day) or {} for day in dates]
+    for field in fields:
+        columns[field] = [row.get(field) for row in rows]
+    return columns
+
+
+def fetch_summaries(
+    garmin, dates: Sequence[str], concurrency: int = SUMMARY_FETCH_CONCURRENCY
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Return the summaries of 'dates' by date, fetching only the days that are not cached.
+    :raise UpstreamUnavailable: When more days are missing than the rate limit lets the
+        request fetch before its deadline; the days fetched are cached for the retry
+    """
+    display_name = garmin.display_name
+    summaries = cached_summaries(display_name, dates)
+    missing = [day for day in dates if day not in summaries]
+    fetch = budget_missing(missing)
+    if fetch:
+        cache = summary_cacher(display_name)
+        summaries.update(
+            zip(fetch, garmin.get_user_summaries(fetch, concurrency, on_summary=cache))
+        )
+    if len(fetch) < len(missing):
+        raise over_budget(len(fetch), len(missing))
+    return summaries
+
+
+async def fetch_summaries_async(
+    garmin, dates: Sequence[str], concurrency: int = SUMMARY_FETCH_CONCURRENCY
+) -> Dict[str, Dict[str, Any]]:
+    """Like fetch_summaries, without blocking the event loop."""
+    display_name = await asyncio.to_thread(lambda: garmin.display_name)
+    summaries = await offload(summary_cache, cached_summaries, display_name, dates)
+    missing = [day for day in dates if day not in summaries]
+    fetch = budget_missing(missing)
+    if fetch:
+        cache = summary_cacher(display_name)
+        fetched = await garmin.get_user_summaries_async(fetch, concurrency, on_summary=cache)
+        summaries.update(zip(fetch, fetched))
+    if len(fetch) < len(missing):
+        raise over_budget(len(fetch), len(missing))
+    return summaries
@@ -1,19 +1,25 @@
+import gzip
 import unittest
 from unittest.mock import patch, MagicMock
 import json
 import sys
 import os
 
+import brotli
+import msgpack
+
 # Add the parent directory to the path so we can import app
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from app import app
+from app import app, response_cache
+from throttle import UpstreamUnavailable
 
 
 class TestActivities(unittest.TestCase):
     def setUp(self):
         self.app = app.test_client()
         self.app.testing = True
+        response_cache.clear()
 
         # Sample activity data for mocking
         self.sample_activity = {
@@ -128,6 +134,141 @@ class TestActivities(unittest.TestCase):
         # Verify the mock was called with correct parameters
         mock_garmin.get_activities.assert_called_once_with(0, 5)
 
+    @patch("app.login_with_token")
+    def test_get_activities_summary_by_default(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.get_activities.return_value = [
+            {**activity, "splitSummaries": [{"distance": 1000}]}
+            for activity in self.sample_activities
+        ]
+        mock_login.return_value = mock_garmin
+
+        response = self.app.get("/activities", headers={"Authorization": "Bearer test_token_123"})
+        data = json.loads(response.data)
+        self.assertNotIn("splitSummaries", data[0])
+        self.assertEqual(data[0]["activityType"], {"typeId": 1, "typeKey": "running"})
+
+    @patch("app.login_with_token")
+    def test_get_activities_all_fields_passes_body_through(self, mock_login):
+        body = '[{"activityId": 1, "splitSummaries": []}]'
+        mock_garmin = MagicMock()
+        mock_garmin.get_activities_raw.return_value = body
+        mock_login.return_value = mock_garmin
+
+        response = self.app.get(
+            "/activities?num=3&fields=all", headers={"Authorization": "Bearer test_token_123"}
+        )
+
+        self.assertEqual(response.get_data(as_text=True), body)
+        mock_garmin.get_activities_raw.assert_called_once_with(0, 3)
+        mock_garmin.get_activities.assert_not_called()
+
+    @patch("app.login_with_token")
+    def test_get_activities_fields(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.get_activities.return_value = self.sample_activities
+        mock_login.return_value = mock_garmin
+
+        response = self.app.get(
+            "/activities?num=2&fields=activityId,activityType.typeKey",
+            headers={"Authorization": "Bearer test_token_123"},
+        )
+
+        data = json.loads(response.data)
+        self.assertEqual(
+            data[1], {"activityId": 9876543210, "activityType": {"typeKey": "cycling"}}
+        )
+
+    @patch("app.login_with_token")
+    def test_latest_activity_fields(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.get_last_activity.return_value = self.sample_activity
+        mock_login.return_value = mock_garmin
+
+        response = self.app.get(
+            "/activities/latest?fields=activityId",
+            headers={"Authorization": "Bearer test_token_123"},
+        )
+
+        self.assertEqual(json.loads(response.data), {"activityId": 1234567890})
+
+    @patch("app.login_with_token")
+    def test_upstream_unavailable(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.get_activities.side_effect = UpstreamUnavailable("Garmin Connect is down", 12.5)
+        mock_login.return_value = mock_garmin
+
+        response = self.app.get("/activities", headers={"Authorization": "Bearer test_token_123"})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "13")
+        self.assertEqual(json.loads(response.data)["error"], "Garmin Connect is down")
+
+    @patch("app.login_with_token")
+    def test_get_activities_streamed(self, mock_login):
+        # Mock a paginated Garmin API response
+        mock_garmin = MagicMock()
+        mock_garmin.iter_activities.return_value = iter(self.sample_activities)
+        mock_login.return_value = mock_garmin
+
+        # Request more activities than fit in one upstream page
+        response = self.app.get(
+            "/activities?num=1000", headers={"Authorization": "Bearer test_token_123"}
+        )
+
+        # Check the response
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        data = json.loads(response.data)
+        self.assertEqual([a["activityId"] for a in data], [1234567890, 9876543210])
+
+        # Verify the pages were iterated instead of fetched at once
+        mock_garmin.iter_activities.assert_called_once_with(0, 1000, page_size=100, concurrency=4)
+        mock_garmin.get_activities.assert_not_called()
+
+    @patch("app.login_with_token")
+    def test_get_activities_streamed_empty(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.iter_activities.return_value = iter([])
+        mock_login.return_value = mock_garmin
+
+        response = self.app.get(
+            "/activities?num=1000", headers={"Authorization": "Bearer test_token_123"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data), [])
+
+    @patch("app.login_with_token")
+    def test_get_activities_ndjson(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.iter_activities.return_value = iter(self.sample_activities)
+        mock_login.return_value = mock_garmin
+
+        response = self.app.get(
+            "/activities?num=2",
+            headers={"Authorization": "Bearer test_token_123", "Accept": "application/x-ndjson"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        lines = response.data.decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[1])["activityId"], 9876543210)
+
+    @patch("app.login_with_token")
+    def test_get_activities_streamed_error(self, mock_login):
+        # Errors on the first page are reported before streaming starts
+        mock_garmin = MagicMock()
+        mock_garmin.iter_activities.side_effect = Exception("API error")
+        mock_login.return_value = mock_garmin
+
+        response = self.app.get(
+            "/activities?num=1000", headers={"Authorization": "Bearer test_token_123"}
+        )
+
+        self.assertEqual(response.status_code, 500)
+
     @patch("app.login_with_token")
     def test_get_activities_error(self, mock_login):
         # Mock an error in the Garmin API
@@ -144,6 +285,120 @@ class TestActivities(unittest.TestCase):
         self.assertIn("error", data)
         self.assertEqual(data["error"], "API error")
 
+    @patch("app.login_with_token")
+    def test_get_activities_columns(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.get_activities.return_value = self.sample_activities
+        mock_login.return_value = mock_garmin
+
+        response = self.app.get(
+            "/activities?num=2&format=columns", headers={"Authorization": "Bearer test_token_123"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/vnd.gconnect.columns+json")
+        self.assertIn("Accept", response.vary)
+        data = json.loads(response.data)
+        self.assertEqual(data["activityId"], [1234567890, 9876543210])
+        self.assertEqual(data["activityType.typeKey"], ["running", "cycling"])
+
+    @patch("app.login_with_token")
+    def test_get_activities_msgpack_cached_per_format(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.get_activities.return_value = self.sample_activities
+        mock_login.return_value = mock_garmin
+        headers = {"Authorization": "Bearer test_token_123"}
+
+        as_json = self.app.get("/activities?num=2", headers=headers)
+        as_msgpack = self.app.get(
+            "/activities?num=2", headers={**headers, "Accept": "application/msgpack"}
+        )
+
+        self.assertEqual(as_json.mimetype, "application/json")
+        self.assertEqual(as_msgpack.mimetype, "application/msgpack")
+        self.assertEqual(msgpack.unpackb(as_msgpack.data)["distance"], [5000, 20000])
+        self.assertNotEqual(as_json.headers["ETag"], as_msgpack.headers["ETag"])
+
+    @patch("app.login_with_token")
+    def test_get_activities_filtered(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.iter_activities.return_value = iter(
+            [
+                {"activityId": 3, "startTimeLocal": "2024-01-09 07:00:00"},
+                {"activityId": 2, "startTimeLocal": "2024-01-03 07:00:00"},
+                {"activityId": 1, "startTimeLocal": "2023-12-30 07:00:00"},
+            ]
+        )
+        mock_login.return_value = mock_garmin
+
+        response = self.app.get(
+            "/activities?num=10&type=running&startDate=2024-01-01&endDate=2024-01-07",
+            headers={"Authorization": "Bearer test_token_123"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([a["activityId"] for a in json.loads(response.data)], [2])
+        # The filter is pushed down and pages are read one at a time until the range ends
+        mock_garmin.iter_activities.assert_called_once_with(
+            0,
+            None,
+            page_size=10,
+            concurrency=1,
+            activitytype="running",
+            start_date="2024-01-01",
+            end_date="2024-01-07",
+        )
+        mock_garmin.get_activities.assert_not_called()
+
+    def test_get_activities_invalid_filter(self):
+        response = self.app.get(
+            "/activities?startDate=yesterday", headers={"Authorization": "Bearer test_token_123"}
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("startDate", json.loads(response.data)["error"])
+
+    def test_get_activities_invalid_format(self):
+        response = self.app.get(
+            "/activities?format=xml", headers={"Authorization": "Bearer test_token_123"}
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    @patch("app.login_with_token")
+    def test_get_activities_compressed(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.get_activities.return_value = self.sample_activities * 20
+        mock_login.return_value = mock_garmin
+        headers = {"Authorization": "Bearer test_token_123", "Accept-Encoding": "gzip"}
+
+        response = self.app.get("/activities?num=40", headers=headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response.vary)
+        self.assertEqual(len(json.loads(gzip.decompress(response.data))), 40)
+        # The compressed representation keeps revalidating against the same content
+        etag = response.headers["ETag"]
+        self.assertTrue(etag.startswith("W/"))
+        revalidated = self.app.get("/activities?num=40", headers={**headers, "If-None-Match": etag})
+        self.assertEqual(revalidated.status_code, 304)
+
+    @patch("app.login_with_token")
+    def test_get_activities_streamed_compressed(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.iter_activities.return_value = iter(self.sample_activities)
+        mock_login.return_value = mock_garmin
+
+        response = self.app.get(
+            "/activities?num=1000",
+            headers={"Authorization": "Bearer test_token_123", "Accept-Encoding": "br"},
+        )
+
+        self.assertEqual(response.headers["Content-Encoding"], "br")
+        data = json.loads(brotli.decompress(response.data))
+        self.assertEqual([a["activityId"] for a in data], [1234567890, 9876543210])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,166 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add the parent directory to the path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from activity_store import ActivityStore
+from app import app, response_cache
+
+
+def make_activity(i):
+    return {
+        "activityId": 1000 + i,
+        "activityName": f"Run {i}",
+        "startTimeGMT": f"2023-01-{i + 1:02d} 12:00:00",
+    }
+
+
+class FakeGarmin:
+    """Serves activities newest first like the Garmin search endpoint."""
+
+    def __init__(self, count):
+        self.history = [make_activity(i) for i in reversed(range(count))]
+        self.calls = []
+
+    def add(self, i):
+        self.history.insert(0, make_activity(i))
+
+    def delete(self, i):
+        self.history.remove(make_activity(i))
+
+    def iter_activities(self, start=0, limit=None, page_size=100, end_date=None, **kwargs):
+        self.calls.append((start, limit, end_date))
+        history = [a for a in self.history if not end_date or a["startTimeGMT"][:10] <= end_date]
+        end = len(history) if limit is None else start + limit
+        yield from history[start:end]
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestActivityStore(unittest.TestCase):
+    def setUp(self):
+        response_cache.clear()
+        self.tmpdir = tempfile.mkdtemp()
+        self.timer = FakeTimer()
+        self.store = ActivityStore(
+            os.path.join(self.tmpdir, "activities.db"), sync_interval=60, timer=self.timer
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_initial_sync_backfills_minimum(self):
+        garmin = FakeGarmin(10)
+
+        pulled = self.store.sync(garmin, "runner", minimum=3)
+
+        self.assertEqual(pulled, 3)
+        payloads = [json.loads(p) for p in self.store.iter_payloads("runner", 3)]
+        self.assertEqual([a["activityId"] for a in payloads], [1009, 1008, 1007])
+
+    def test_incremental_sync_pulls_only_new(self):
+        garmin = FakeGarmin(5)
+        self.store.sync(garmin, "runner", minimum=5)
+
+        garmin.add(5)
+        self.timer.now = 61
+        pulled = self.store.sync(garmin, "runner", minimum=5)
+
+        self.assertEqual(pulled, 1)
+        self.assertEqual(self.store.count("runner"), 6)
+        newest = json.loads(next(self.store.iter_payloads("runner", 1)))
+        self.assertEqual(newest["activityId"], 1005)
+
+    def test_sync_is_throttled(self):
+        garmin = FakeGarmin(5)
+        self.store.sync(garmin, "runner", minimum=5)
+        garmin.calls.clear()
+
+        garmin.add(5)
+        self.store.sync(garmin, "runner", minimum=5)
+
+        self.assertEqual(garmin.calls, [])
+
+    def test_backfill_pages_back_from_oldest_stored(self):
+        garmin = FakeGarmin(10)
+        self.store.sync(garmin, "runner", minimum=3)
+
+        # An activity next to the stored ones is deleted upstream, and a new one uploaded
+        garmin.delete(6)
+        garmin.add(10)
+        self.store.sync(garmin, "runner", minimum=6)
+
+        stored = [json.loads(p)["activityId"] for p in self.store.iter_payloads("runner", 6)]
+        self.assertEqual(stored, [1009, 1008, 1007, 1005, 1004, 1003])
+        self.assertEqual(garmin.calls[-1][2], "2023-01-09")
+
+    def test_backfill_complete(self):
+        garmin = FakeGarmin(3)
+        self.store.sync(garmin, "runner", minimum=10)
+        garmin.calls.clear()
+
+        self.store.sync(garmin, "runner", minimum=10)
+
+        self.assertTrue(self.store.is_backfill_complete("runner"))
+        self.assertEqual(garmin.calls, [])
+
+    def test_empty_history_picks_up_new_activities(self):
+        garmin = FakeGarmin(0)
+        self.store.sync(garmin, "runner", minimum=5)
+
+        garmin.add(0)
+        self.timer.now = 61
+        self.store.sync(garmin, "runner", minimum=5)
+
+        self.assertEqual(self.store.count("runner"), 1)
+
+    def test_accounts_are_isolated(self):
+        self.store.sync(FakeGarmin(3), "runner", minimum=3)
+
+        self.assertEqual(self.store.count("cyclist"), 0)
+        self.assertEqual(list(self.store.iter_payloads("cyclist", 3)), [])
+
+    def test_read_payloads_pages(self):
+        self.store.sync(FakeGarmin(5), "runner", minimum=5)
+
+        pages, after = [], None
+        for _ in range(3):
+            payloads, after = self.store.read_payloads("runner", 2, after)
+            pages.append([json.loads(p)["activityId"] for p in payloads])
+
+        self.assertEqual(pages, [[1004, 1003], [1002, 1001], [1000]])
+        self.assertEqual(self.store.read_payloads("runner", 2, after), ([], after))
+
+    @patch("app.login_with_token")
+    def test_activities_served_from_store(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.display_name = "runner"
+        history = FakeGarmin(4)
+        mock_garmin.iter_activities.side_effect = history.iter_activities
+        mock_login.return_value = mock_garmin
+
+        with patch("app.activity_store", self.store):
+            response = app.test_client().get(
+                "/activities?num=2", headers={"Authorization": "Bearer test_token_123"}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual([a["activityId"] for a in data], [1003, 1002])
+        mock_garmin.get_activities.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,193 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import asyncio
+import sys
+import os
+
+import httpx
+
+# Add the parent directory to the path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import deadline
+from admission import AdmissionController, Overloaded, parse_route_limits
+from app import response_cache
+from asgi import application
+from throttle import DeadlineExceeded
+
+
+class TestAdmissionController(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.controller = AdmissionController(
+            route_limit=2, account_limit=1, queue_size=2, queue_timeout=0.5
+        )
+
+    def test_parse_route_limits(self):
+        self.assertEqual(
+            parse_route_limits("/activities/export=4, /summaries = 8,"),
+            {"/activities/export": 4, "/summaries": 8},
+        )
+        self.assertEqual(parse_route_limits(""), {})
+
+    async def test_account_limit(self):
+        async with self.controller.admit("/activities", "a"):
+            async with self.controller.admit("/activities", "b"):
+                with self.assertRaises(Overloaded):
+                    async with self.controller.admit("/summaries", "a", deadline=0):
+                        pass
+
+        self.assertEqual(self.controller.stats()["shed"], 1)
+        self.assertEqual(self.controller.stats()["active"], 0)
+
+    async def test_route_limit(self):
+        controller = AdmissionController(
+            route_limit=1, account_limit=0, queue_size=0, route_limits={"/summaries": 2}
+        )
+        async with controller.admit("/summaries", None), controller.admit("/summaries", None):
+            with self.assertRaises(Overloaded):
+                async with (
+                    controller.admit("/activities", None),
+                    controller.admit("/activities", None),
+                ):
+                    pass
+
+    async def test_waiter_gets_freed_slot(self):
+        order = []
+        release = asyncio.Event()
+
+        async def request(name):
+            async with self.controller.admit("/activities", "a"):
+                order.append(name)
+                await release.wait()
+
+        first = asyncio.create_task(request("first"))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(request("second"))
+        await asyncio.sleep(0)
+        self.assertEqual(order, ["first"])
+        self.assertEqual(self.controller.stats()["waiting"], 1)
+
+        release.set()
+        await asyncio.gather(first, second)
+
+        self.assertEqual(order, ["first", "second"])
+        self.assertEqual(self.controller.stats()["queued"], 1)
+        self.assertEqual(self.controller.stats()["active"], 0)
+
+    async def test_wait_times_out(self):
+        async with self.controller.admit("/activities", "a"):
+            with self.assertRaises(Overloaded):
+                async with self.controller.admit("/activities", "a", deadline=0.01):
+                    pass
+
+        self.assertEqual(self.controller.stats()["waiting"], 0)
+
+    async def test_full_queue_sheds_at_once(self):
+        async with self.controller.admit("/activities", "a"):
+            waiters = [
+                asyncio.create_task(self.controller.admit("/activities", "a").__aenter__())
+                for _ in range(2)
+            ]
+            await asyncio.sleep(0)
+
+            with self.assertRaises(Overloaded):
+                async with self.controller.admit("/activities", "a"):
+                    pass
+            for waiter in waiters:
+                waiter.cancel()
+            await asyncio.gather(*waiters, return_exceptions=True)
+
+        self.assertEqual(self.controller.stats()["active"], 0)
+        self.assertEqual(self.controller.stats()["waiting"], 0)
+
+
+class TestAsgiAdmission(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        response_cache.clear()
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=application), base_url="http://testserver"
+        )
+        self.headers = {"Authorization": "Bearer test_token_123"}
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    @patch("asgi.admission", AdmissionController(route_limit=1, queue_size=0))
+    @patch("app.login_with_token")
+    async def test_sheds_excess_requests(self, mock_login):
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_latest():
+            started.set()
+            await release.wait()
+            return {"activityId": 1}
+
+        mock_garmin = MagicMock()
+        mock_garmin.get_last_activity_async = slow_latest
+        mock_login.return_value = mock_garmin
+
+        first = asyncio.create_task(self.client.get("/activities/latest", headers=self.headers))
+        await started.wait()
+
+        shed = await self.client.get("/activities/latest", headers=self.headers)
+        health = await self.client.get("/health")
+        release.set()
+        admitted = await first
+
+        self.assertEqual(shed.status_code, 503)
+        self.assertEqual(shed.headers["Retry-After"], "1")
+        self.assertEqual(health.status_code, 200)
+        self.assertEqual(health.json(), {"status": "healthy"})
+        self.assertEqual(admitted.status_code, 200)
+
+    async def test_admitted_under_route_template(self):
+        controller = AdmissionController()
+
+        with (
+            patch("asgi.admission", controller),
+            patch.object(controller, "admit", wraps=controller.admit) as admit,
+        ):
+            await self.client.get("/summaries", headers=self.headers)
+            await self.client.get("/no-such-route-1234", headers=self.headers)
+            await self.client.post("/summaries", headers=self.headers)
+
+        # Client chosen paths must not mint admission keys or metric labels of their own
+        self.assertEqual(
+            [call.args[0] for call in admit.call_args_list],
+            ["/summaries", "unmatched", "unmatched"],
+        )
+
+    @patch("app.login_with_token")
+    async def test_request_timeout_header(self, mock_login):
+        seen = []
+
+        async def latest():
+            seen.append(deadline.remaining())
+            raise DeadlineExceeded()
+
+        mock_garmin = MagicMock()
+        mock_garmin.get_last_activity_async = latest
+        mock_login.return_value = mock_garmin
+
+        response = await self.client.get(
+            "/activities/latest", headers={**self.headers, "X-Request-Timeout": "0.5"}
+        )
+
+        self.assertEqual(response.status_code, 504)
+        self.assertIn("Retry-After", response.headers)
+        self.assertLessEqual(seen[0], 0.5)
+        self.assertIsNone(deadline.remaining())
+
+    async def test_metrics_not_admitted(self):
+        with patch("asgi.admission", AdmissionController(route_limit=0, queue_size=0)) as full:
+            full.admit = MagicMock(side_effect=AssertionError("admitted"))
+
+            response = await self.client.get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("gconnect_admission_requests", response.text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,405 @@
+import unittest
+from unittest.mock import ANY, patch, MagicMock, AsyncMock
+import asyncio
+import json
+import sys
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import httpx
+
+# Add the parent directory to the path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from activity_store import ActivityStore
+from app import response_cache
+from asgi import ThreadedWsgiToAsgi, application
+from metrics import registry
+from sessions import session_cache
+from stats import stats_cache
+from summaries import summary_cache
+from throttle import UpstreamUnavailable
+
+
+async def iterate(items):
+    for item in items:
+        yield item
+
+
+class TestAsgi(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        response_cache.clear()
+        registry.clear()
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=application), base_url="http://testserver"
+        )
+        self.headers = {"Authorization": "Bearer test_token_123"}
+        self.sample_activities = [
+            {"activityId": 1234567890, "activityName": "Test Running"},
+            {"activityId": 9876543210, "activityName": "Test Cycling"},
+        ]
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    async def test_health_served_by_flask(self):
+        response = await self.client.get("/health")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"status": "healthy"})
+
+    async def test_latest_activity_no_auth(self):
+        response = await self.client.get("/activities/latest")
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["error"], "Authorization header is required")
+
+    @patch("app.login_with_token")
+    async def test_latest_activity_invalid_token(self, mock_login):
+        mock_login.return_value = None
+
+        response = await self.client.get("/activities/latest", headers=self.headers)
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["error"], "Invalid or expired token")
+
+    @patch("app.login_with_token")
+    async def test_token_login_off_event_loop(self, mock_login):
+        threads = []
+        mock_login.side_effect = lambda auth_header: threads.append(threading.get_ident())
+
+        await self.client.get("/activities/latest", headers=self.headers)
+
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+
+    @patch("app.login_with_token")
+    async def test_latest_activity_async(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.get_last_activity_async = AsyncMock(return_value=self.sample_activities[0])
+        mock_login.return_value = mock_garmin
+
+        response = await self.client.get(
+            "/activities/latest", headers={**self.headers, "Origin": "http://localhost:3000"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["activityId"], 1234567890)
+        self.assertEqual(response.headers["access-control-allow-origin"], "http://localhost:3000")
+        mock_garmin.get_last_activity_async.assert_awaited_once()
+        mock_garmin.get_last_activity.assert_not_called()
+
+        # Revalidation is answered from the shared response cache
+        etag = response.headers["etag"]
+        response = await self.client.get(
+            "/activities/latest", headers={**self.headers, "If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, 304)
+        mock_login.assert_called_once()
+
+    @patch("app.login_with_token")
+    async def test_get_activities_async(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.get_activities_async = AsyncMock(return_value=self.sample_activities)
+        mock_login.return_value = mock_garmin
+
+        response = await self.client.get("/activities?num=5", headers=self.headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+        mock_garmin.get_activities_async.assert_awaited_once_with(0, 5)
+
+    @patch("app.login_with_token")
+    async def test_get_activities_all_fields_passes_body_through(self, mock_login):
+        body = '[{"activityId": 1, "splitSummaries": []}]'
+        mock_garmin = MagicMock()
+        mock_garmin.get_activities_raw_async = AsyncMock(return_value=body)
+        mock_login.return_value = mock_garmin
+
+        response = await self.client.get("/activities?num=3&fields=all", headers=self.headers)
+
+        self.assertEqual(response.text, body)
+        mock_garmin.get_activities_raw_async.assert_awaited_once_with(0, 3)
+
+    @patch("app.login_with_token")
+    async def test_native_route_metrics(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.get_activities_async = AsyncMock(return_value=self.sample_activities)
+        mock_login.return_value = mock_garmin
+
+        await self.client.get("/activities?num=2", headers=self.headers)
+        response = await self.client.get("/metrics")
+
+        self.assertIn(
+            'gconnect_http_requests_total{route="/activities",method="GET",status="200"} 1',
+            response.text,
+        )
+        self.assertIn('gconnect_http_requests_in_flight{route="/activities"} 0', response.text)
+
+    @patch("app.token_refresher")
+    async def test_refreshed_tokenstore_header(self, mock_refresher):
+        session_cache.clear()
+        garmin = MagicMock()
+        garmin.get_last_activity_async = AsyncMock(return_value=self.sample_activities[0])
+        session = session_cache.add_session("test_token_123", garmin)
+        session.tokenstore = "refreshed_token"
+
+        response = await self.client.get(
+            "/activities/latest", headers={**self.headers, "Origin": "http://localhost:3000"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["x-garmin-tokenstore"], "refreshed_token")
+        self.assertEqual(response.headers["access-control-expose-headers"], "X-Garmin-Tokenstore")
+        session_cache.clear()
+
+    @patch("app.login_with_token")
+    async def test_activity_stats(self, mock_login):
+        stats_cache.clear()
+        mock_garmin = MagicMock()
+        mock_garmin.display_name = "runner42"
+        mock_garmin.iter_activities_async.return_value = iterate(
+            [
+                {"startTimeLocal": "2024-01-09 07:00:00", "distance": 5000.0, "duration": 1500.0},
+                {"startTimeLocal": "2024-01-02 07:00:00", "distance": 3000.0, "duration": 900.0},
+                {"startTimeLocal": "2023-12-30 07:00:00", "distance": 1000.0, "duration": 300.0},
+            ]
+        )
+        mock_login.return_value = mock_garmin
+
+        response = await self.client.get(
+            "/activities/stats?start=2024-01-01&end=2024-01-31&group=week", headers=self.headers
+        )
+
+        self.assertEqual(response.status_code, 200)
+        groups = response.json()["groups"]
+        self.assertEqual([g["key"] for g in groups], ["2024-W01", "2024-W02"])
+        self.assertEqual(groups[1]["distance"]["sum"], 5000.0)
+
+    @patch("app.login_with_token")
+    async def test_get_summaries(self, mock_login):
+        summary_cache.clear()
+        mock_garmin = MagicMock()
+        mock_garmin.display_name = "runner42"
+        mock_garmin.get_user_summaries_async = AsyncMock(
+            return_value=[{"totalSteps": 1000}, {"totalSteps": 2000}]
+        )
+        mock_login.return_value = mock_garmin
+
+        response = await self.client.get(
+            "/summaries?start=2024-01-01&end=2024-01-02&fields=totalSteps", headers=self.headers
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {"calendarDate": ["2024-01-01", "2024-01-02"], "totalSteps": [1000, 2000]},
+        )
+        mock_garmin.get_user_summaries_async.assert_awaited_once_with(
+            ["2024-01-01", "2024-01-02"], 8, on_summary=ANY
+        )
+
+    @patch("app.login_with_token")
+    async def test_latest_activity_upstream_unavailable(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.get_last_activity_async = AsyncMock(
+            side_effect=UpstreamUnavailable("Garmin Connect is down", 3)
+        )
+        mock_login.return_value = mock_garmin
+
+        response = await self.client.get("/activities/latest", headers=self.headers)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["retry-after"], "3")
+
+    @patch("app.login_with_token")
+    async def test_get_activities_invalid_num(self, mock_login):
+        mock_login.return_value = MagicMock()
+
+        response = await self.client.get("/activities?num=0", headers=self.headers)
+
+        self.assertEqual(response.status_code, 400)
+
+    @patch("app.login_with_token")
+    async def test_get_activities_streamed(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.iter_activities_async.return_value = iterate(self.sample_activities)
+        mock_login.return_value = mock_garmin
+
+        response = await self.client.get("/activities?num=1000&format=ndjson", headers=self.headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "application/x-ndjson")
+        lines = response.text.splitlines()
+        self.assertEqual(json.loads(lines[1])["activityId"], 9876543210)
+
+    @patch("app.ACTIVITY_PAGE_SIZE", 2)
+    @patch("app.login_with_token")
+    async def test_get_activities_streamed_from_store(self, mock_login):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        store = ActivityStore(os.path.join(tmpdir, "activities.db"))
+        history = [
+            {"activityId": i, "startTimeGMT": f"2023-01-0{i} 12:00:00"} for i in range(5, 0, -1)
+        ]
+        store.add("runner", history)
+        mock_garmin = MagicMock()
+        mock_garmin.display_name = "runner"
+        mock_login.return_value = mock_garmin
+
+        with patch("app.activity_store", store), patch.object(store, "sync"):
+            response = await self.client.get(
+                "/activities?num=4&format=ndjson", headers=self.headers
+            )
+
+        self.assertEqual(response.status_code, 200)
+        ids = [json.loads(line)["activityId"] for line in response.text.splitlines()]
+        self.assertEqual(ids, [5, 4, 3, 2])
+
+    @patch("app.login_with_token")
+    async def test_get_activities_error(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.get_activities_async = AsyncMock(side_effect=Exception("API error"))
+        mock_login.return_value = mock_garmin
+
+        response = await self.client.get("/activities", headers=self.headers)
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json()["error"], "API error")
+
+    @patch("app.login_with_token")
+    async def test_get_activities_columns_compressed(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.get_activities_async = AsyncMock(return_value=self.sample_activities * 50)
+        mock_login.return_value = mock_garmin
+
+        response = await self.client.get(
+            "/activities?num=100",
+            headers={**self.headers, "Accept": "application/vnd.gconnect.columns+json"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "application/vnd.gconnect.columns+json")
+        self.assertEqual(response.headers["content-encoding"], "br")
+        self.assertIn("Accept-Encoding", response.headers["vary"])
+        self.assertTrue(response.headers["etag"].startswith("W/"))
+        self.assertEqual(response.json()["activityName"][:2], ["Test Running", "Test Cycling"])
+
+    @patch("app.login_with_token")
+    async def test_get_activities_filtered(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.iter_activities_async.return_value = iterate(
+            [
+                {"activityId": 2, "startTimeLocal": "2024-01-03 07:00:00"},
+                {"activityId": 1, "startTimeLocal": "2023-12-30 07:00:00"},
+            ]
+        )
+        mock_login.return_value = mock_garmin
+
+        response = await self.client.get(
+            "/activities?num=5&type=running&startDate=2024-01-01", headers=self.headers
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([a["activityId"] for a in response.json()], [2])
+        mock_garmin.iter_activities_async.assert_called_once_with(
+            0,
+            None,
+            page_size=5,
+            concurrency=1,
+            activitytype="running",
+            start_date="2024-01-01",
+            end_date=None,
+        )
+
+    async def test_get_activities_invalid_format(self):
+        response = await self.client.get("/activities?format=xml", headers=self.headers)
+
+        self.assertEqual(response.status_code, 400)
+
+
+class TestThreadedWsgiToAsgi(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_requests(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        def wsgi_app(environ, start_response):
+            # Only returns once both requests are being handled at the same time
+            barrier.wait()
+            start_response("200 OK", [("Content-Type", "text/plain")])
+            return [b"ok"]
+
+        transport = httpx.ASGITransport(app=ThreadedWsgiToAsgi(wsgi_app))
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            responses = await asyncio.gather(client.get("/"), client.get("/"))
+
+        self.assertEqual([response.status_code for response in responses], [200, 200])
+
+    async def test_body_cut_at_content_length_and_closed(self):
+        closed = threading.Event()
+
+        class Body(list):
+            def close(self):
+                closed.set()
+
+        def wsgi_app(environ, start_response):
+            start_response("200 OK", [("Content-Type", "text/plain"), ("Content-Length", "2")])
+            return Body([b"abc", b"def"])
+
+        transport = httpx.ASGITransport(app=ThreadedWsgiToAsgi(wsgi_app))
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            response = await client.get("/")
+
+        self.assertEqual(response.content, b"ab")
+        self.assertTrue(closed.is_set())
+
+    async def test_body_closed_after_disconnect(self):
+        closed = threading.Event()
+
+        class Endless:
+            def __iter__(self):
+                while True:
+                    time.sleep(0.01)
+                    yield b"data\n\n"
+
+            def close(self):
+                closed.set()
+
+        def wsgi_app(environ, start_response):
+            start_response("200 OK", [("Content-Type", "text/event-stream")])
+            return Endless()
+
+        messages = [{"type": "http.request", "body": b""}]
+        disconnect = asyncio.Event()
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+            if len(sent) == 3:
+                disconnect.set()
+
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/activities/stream",
+            "query_string": b"",
+            "headers": [],
+            "http_version": "1.1",
+        }
+        await asyncio.wait_for(ThreadedWsgiToAsgi(wsgi_app)(scope, receive, send), 5)
+
+        self.assertTrue(closed.is_set())
+        self.assertEqual(sent[-1], {"type": "http.response.body"})
+
+
+if __name__ == "__main__":
+    unittest.main()
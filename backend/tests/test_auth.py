@@ -7,13 +7,16 @@ import os
 # Add the parent directory to the path so we can import app
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from app import app
+from app import app, response_cache
+from sessions import auth_cache, session_cache
 
 
 class TestAuth(unittest.TestCase):
     def setUp(self):
         self.app = app.test_client()
         self.app.testing = True
+        auth_cache.clear()
+        session_cache.clear()
 
     @patch("app.init_api_reuse")
     def test_auth_success(self, mock_init_api):
@@ -65,6 +68,96 @@ class TestAuth(unittest.TestCase):
         response = self.app.post("/auth", json={})
         self.assertEqual(response.status_code, 400)
 
+    @patch("app.token_refresher")
+    @patch("app.init_api_reuse")
+    def test_repeated_login_reuses_session(self, mock_init_api, mock_refresher):
+        mock_garmin = MagicMock()
+        mock_garmin.garth.dumps.return_value = "test_token_123"
+        mock_garmin.refresh_token.return_value = False
+        mock_init_api.return_value = mock_garmin
+        credentials = {"email": "test@example.com", "password": "password123"}
+
+        first = self.app.post("/auth", json=credentials)
+        second = self.app.post("/auth", json={**credentials, "email": "Test@Example.com"})
+
+        self.assertEqual(json.loads(first.data)["token"], "test_token_123")
+        self.assertEqual(json.loads(second.data)["token"], "test_token_123")
+        mock_init_api.assert_called_once()
+        # The session created by the login also serves token requests
+        self.assertIs(session_cache.get_session("test_token_123").client, mock_garmin)
+
+        other = self.app.post("/auth", json={**credentials, "password": "other"})
+        self.assertEqual(other.status_code, 200)
+        self.assertEqual(mock_init_api.call_count, 2)
+
+    @patch("app.token_refresher")
+    @patch("app.init_api_reuse")
+    def test_repeated_login_returns_refreshed_token(self, mock_init_api, mock_refresher):
+        mock_garmin = MagicMock()
+        mock_garmin.garth.dumps.side_effect = ["test_token_123", "test_token_456"]
+        mock_garmin.refresh_token.return_value = True
+        mock_init_api.return_value = mock_garmin
+        credentials = {"email": "test@example.com", "password": "password123"}
+
+        self.app.post("/auth", json=credentials)
+        response = self.app.post("/auth", json=credentials)
+
+        self.assertEqual(json.loads(response.data)["token"], "test_token_456")
+        mock_init_api.assert_called_once()
+
+    @patch("app.token_refresher")
+    @patch("app.init_api_reuse")
+    def test_failed_refresh_logs_in_again(self, mock_init_api, mock_refresher):
+        mock_garmin = MagicMock()
+        mock_garmin.garth.dumps.return_value = "test_token_123"
+        mock_garmin.refresh_token.side_effect = Exception("refresh token expired")
+        mock_init_api.return_value = mock_garmin
+        credentials = {"email": "test@example.com", "password": "password123"}
+
+        self.app.post("/auth", json=credentials)
+        response = self.app.post("/auth", json=credentials)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_init_api.call_count, 2)
+
+    @patch("app.token_refresher")
+    @patch("app.init_api_reuse")
+    def test_logout_invalidates_session(self, mock_init_api, mock_refresher):
+        mock_garmin = MagicMock()
+        mock_garmin.garth.dumps.return_value = "test_token_123"
+        mock_garmin.refresh_token.return_value = False
+        mock_init_api.return_value = mock_garmin
+        credentials = {"email": "test@example.com", "password": "password123"}
+        self.app.post("/auth", json=credentials)
+
+        response = self.app.delete("/auth", headers={"Authorization": "Bearer test_token_123"})
+
+        self.assertEqual(response.status_code, 204)
+        self.assertIsNone(session_cache.get_session("test_token_123"))
+        self.app.post("/auth", json=credentials)
+        self.assertEqual(mock_init_api.call_count, 2)
+
+    @patch("app.login_with_token")
+    def test_logout_purges_cached_responses(self, mock_login):
+        response_cache.clear()
+        mock_garmin = MagicMock()
+        mock_garmin.get_last_activity.return_value = {"activityId": 1}
+        mock_login.return_value = mock_garmin
+        headers = {"Authorization": "Bearer test_token_123"}
+        self.app.get("/activities/latest", headers=headers)
+
+        self.app.delete("/auth", headers=headers)
+        mock_login.return_value = None
+        response = self.app.get("/activities/latest", headers=headers)
+
+        # The logged out token is no longer answered from the response cache
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout_requires_token(self):
+        response = self.app.delete("/auth")
+
+        self.assertEqual(response.status_code, 401)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,161 @@
+import unittest
+from unittest.mock import patch, MagicMock, AsyncMock
+import json
+import sys
+import os
+
+import httpx
+
+# Add the parent directory to the path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import app, response_cache
+from asgi import application
+from batch import BATCH_MAX_REQUESTS, SubRequest, SubResponse, batch_body, parse_batch
+
+
+class TestParseBatch(unittest.TestCase):
+    def test_parse_batch(self):
+        requests = parse_batch(
+            {
+                "requests": [
+                    {"id": "latest", "path": "/activities/latest"},
+                    {"path": "/activities?num=5", "params": {"fields": "summary"}},
+                ]
+            }
+        )
+
+        self.assertEqual(
+            requests,
+            [
+                SubRequest("latest", "/activities/latest", ""),
+                SubRequest(1, "/activities", "num=5&fields=summary"),
+            ],
+        )
+
+    def test_parse_batch_invalid(self):
+        invalid = [
+            None,
+            [],
+            {"requests": []},
+            {"requests": ["/activities"]},
+            {"requests": [{"path": "/auth"}]},
+            {"requests": [{"path": "/activities", "params": ["num"]}]},
+            {"requests": [{"path": "/activities"}] * (BATCH_MAX_REQUESTS + 1)},
+        ]
+        for data in invalid:
+            with self.subTest(data=data), self.assertRaises(ValueError):
+                parse_batch(data)
+
+    def test_batch_body(self):
+        requests = [SubRequest("a", "/activities", ""), SubRequest("b", "/activities", "")]
+        responses = [
+            SubResponse(200, "application/json", b'[{"activityId":1}]'),
+            SubResponse(200, "application/msgpack", b"\x91"),
+        ]
+
+        body = json.loads(batch_body(requests, responses, json.dumps))
+
+        self.assertEqual(
+            body["responses"][0], {"id": "a", "status": 200, "body": [{"activityId": 1}]}
+        )
+        self.assertEqual(body["responses"][1]["status"], 406)
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        response_cache.clear()
+        self.headers = {"Authorization": "Bearer test_token_123"}
+
+    def test_batch_no_auth(self):
+        response = self.app.post("/batch", json={"requests": [{"path": "/activities"}]})
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_batch_invalid_body(self):
+        response = self.app.post(
+            "/batch", json={"requests": [{"path": "/auth"}]}, headers=self.headers
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("cannot be batched", json.loads(response.data)["error"])
+
+    @patch("app.login_with_token")
+    def test_batch_invalid_token(self, mock_login):
+        mock_login.return_value = None
+
+        response = self.app.post(
+            "/batch", json={"requests": [{"path": "/activities"}]}, headers=self.headers
+        )
+
+        self.assertEqual(response.status_code, 401)
+
+    @patch("app.login_with_token")
+    def test_batch(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.get_last_activity.return_value = {"activityId": 2, "activityName": "Ride"}
+        mock_garmin.get_activities.return_value = [{"activityId": 2}, {"activityId": 1}]
+        mock_login.return_value = mock_garmin
+
+        response = self.app.post(
+            "/batch",
+            json={
+                "requests": [
+                    {"id": "latest", "path": "/activities/latest"},
+                    {"id": "recent", "path": "/activities", "params": {"num": 2}},
+                    {"id": "bad", "path": "/activities?num=0"},
+                ]
+            },
+            headers=self.headers,
+        )
+
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.data)["responses"]
+        self.assertEqual([result["id"] for result in results], ["latest", "recent", "bad"])
+        self.assertEqual(results[0]["status"], 200)
+        self.assertEqual(results[0]["body"]["activityId"], 2)
+        self.assertEqual(results[1]["body"], [{"activityId": 2}, {"activityId": 1}])
+        self.assertEqual(results[2]["status"], 400)
+        mock_garmin.get_activities.assert_called_once_with(0, 2)
+
+
+class TestAsgiBatch(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        response_cache.clear()
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=application), base_url="http://testserver"
+        )
+        self.headers = {"Authorization": "Bearer test_token_123"}
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    async def test_batch_invalid_body(self):
+        response = await self.client.post("/batch", content=b"{", headers=self.headers)
+
+        self.assertEqual(response.status_code, 400)
+
+    @patch("app.login_with_token")
+    async def test_batch(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.get_last_activity_async = AsyncMock(return_value={"activityId": 2})
+        mock_garmin.get_activities_async = AsyncMock(return_value=[{"activityId": 2}])
+        mock_login.return_value = mock_garmin
+
+        response = await self.client.post(
+            "/batch",
+            json={"requests": [{"path": "/activities/latest"}, {"path": "/activities?num=1"}]},
+            headers=self.headers,
+        )
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["responses"]
+        self.assertEqual(results[0], {"id": 0, "status": 200, "body": {"activityId": 2}})
+        self.assertEqual(results[1], {"id": 1, "status": 200, "body": [{"activityId": 2}]})
+        mock_garmin.get_activities_async.assert_awaited_once_with(0, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
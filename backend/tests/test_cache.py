@@ -0,0 +1,92 @@
+import unittest
+import sys
+import os
+
+# Add the parent directory to the path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from cache import TTLCache
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache(unittest.TestCase):
+    def setUp(self):
+        self.timer = FakeTimer()
+        self.cache = TTLCache(maxsize=2, ttl=10, timer=self.timer)
+
+    def test_get_and_set(self):
+        self.cache.set("a", 1)
+
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_expiry(self):
+        self.cache.set("a", 1)
+        self.timer.now = 10
+
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.expirations, 1)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_peek_and_values(self):
+        self.cache.set("a", 1)
+        self.cache.set("b", 2, ttl=1)
+
+        self.assertEqual(self.cache.peek("a"), 1)
+        self.assertEqual(self.cache.hits, 0)
+        self.assertEqual(sorted(self.cache.values()), [1, 2])
+
+        self.timer.now = 1
+        self.assertIsNone(self.cache.peek("b"))
+        self.assertEqual(self.cache.values(), [1])
+
+    def test_per_entry_ttl(self):
+        self.cache.set("a", 1, ttl=100)
+        self.timer.now = 50
+
+        self.assertEqual(self.cache.get("a"), 1)
+
+    def test_lru_eviction(self):
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        # Touch "a" so "b" becomes the least recently used entry
+        self.cache.get("a")
+        self.cache.set("c", 3)
+
+        self.assertIn("a", self.cache)
+        self.assertNotIn("b", self.cache)
+        self.assertIn("c", self.cache)
+        self.assertEqual(self.cache.evictions, 1)
+
+    def test_pop_where(self):
+        self.cache.set(("token", 1), 1)
+        self.cache.set(("other", 1), 2)
+
+        self.assertEqual(self.cache.pop_where(lambda key: key[0] == "token"), 1)
+        self.assertNotIn(("token", 1), self.cache)
+        self.assertIn(("other", 1), self.cache)
+
+    def test_stats_and_clear(self):
+        self.cache.set("a", 1)
+        self.cache.get("a")
+
+        stats = self.cache.stats()
+        self.assertEqual(stats["size"], 1)
+        self.assertEqual(stats["hits"], 1)
+
+        self.cache.clear()
+        self.assertEqual(self.cache.stats()["size"], 0)
+        self.assertEqual(self.cache.stats()["hits"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import gzip
+import unittest
+import zlib
+import sys
+import os
+
+import brotli
+
+# Add the parent directory to the path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from compression import choose_encoding, compress, iter_compressed
+
+
+class TestCompression(unittest.TestCase):
+    def test_choose_encoding(self):
+        self.assertEqual(choose_encoding("gzip, deflate, br", "application/json"), "br")
+        self.assertEqual(choose_encoding("gzip", "application/json"), "gzip")
+        self.assertEqual(choose_encoding("br;q=0.5, gzip", "application/json"), "gzip")
+        self.assertIsNone(choose_encoding("gzip;q=0", "application/json"))
+        self.assertIsNone(choose_encoding("identity", "application/json"))
+        self.assertIsNone(choose_encoding(None, "application/json"))
+        self.assertIsNone(choose_encoding("gzip", "application/zip"))
+
+    def test_compress(self):
+        body = b'{"activityId": 1}' * 100
+
+        self.assertEqual(gzip.decompress(compress(body, "gzip")), body)
+        self.assertEqual(brotli.decompress(compress(body, "br")), body)
+        self.assertLess(len(compress(body, "gzip")), len(body) // 10)
+
+    def test_iter_compressed_closes_body(self):
+        closed = []
+
+        def body():
+            try:
+                yield "["
+                yield b"1,2"
+                yield "]"
+            finally:
+                closed.append(True)
+
+        chunks = body()
+        compressed = b"".join(iter_compressed(chunks, "gzip"))
+
+        self.assertEqual(gzip.decompress(compressed), b"[1,2]")
+        self.assertEqual(closed, [True])
+
+    def test_iter_compressed_flushes_every_chunk(self):
+        rows = [b'{"activityId": %d}\n' % i for i in range(3)]
+        decoders = {"gzip": zlib.decompressobj(31), "br": brotli.Decompressor()}
+
+        for encoding, decoder in decoders.items():
+            with self.subTest(encoding=encoding):
+                decode = decoder.decompress if encoding == "gzip" else decoder.process
+                for row, compressed in zip(rows, iter_compressed(iter(rows), encoding)):
+                    self.assertEqual(decode(compressed), row)
+
+
+if __name__ == "__main__":
+    unittest.main()
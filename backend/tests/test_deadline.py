@@ -0,0 +1,126 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+import threading
+
+# Add the parent directory to the path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import deadline
+from app import app, response_cache
+from garmin_client import GarminClient
+
+
+class TestDeadline(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(deadline.reset, deadline.start(None))
+
+    @patch("deadline.REQUEST_TIMEOUT", 30)
+    def test_request_timeout(self):
+        self.assertEqual(deadline.request_timeout(None), 30)
+        self.assertEqual(deadline.request_timeout("2.5"), 2.5)
+        # Clients may only ask for less time
+        self.assertEqual(deadline.request_timeout("60"), 30)
+        for invalid in ("soon", "0", "-1", "inf", "nan"):
+            with self.subTest(header=invalid):
+                self.assertEqual(deadline.request_timeout(invalid), 30)
+
+    @patch("deadline.REQUEST_TIMEOUT", 0)
+    def test_request_timeout_disabled(self):
+        self.assertIsNone(deadline.request_timeout(None))
+        self.assertEqual(deadline.request_timeout("5"), 5)
+
+    def test_timeout(self):
+        self.assertIsNone(deadline.remaining())
+        self.assertEqual(deadline.timeout(10), 10)
+
+        deadline.start(2)
+        self.assertLessEqual(deadline.timeout(10), 2)
+        self.assertEqual(deadline.timeout(1), 1)
+
+        deadline.start(-1)
+        self.assertEqual(deadline.timeout(10), deadline.MIN_TIMEOUT)
+
+    def test_within(self):
+        deadline.start(10)
+
+        with deadline.within(1):
+            self.assertLessEqual(deadline.remaining(), 1)
+            # A later deadline never extends the current one
+            with deadline.within(20):
+                self.assertLessEqual(deadline.remaining(), 1)
+        self.assertGreater(deadline.remaining(), 1)
+
+    def test_bound(self):
+        deadline.start(5)
+        seen = []
+
+        def record():
+            seen.append(deadline.remaining())
+
+        threads = [threading.Thread(target=record), threading.Thread(target=deadline.bound(record))]
+        for thread in threads:
+            thread.start()
+            thread.join()
+
+        self.assertIsNone(seen[0])
+        self.assertLessEqual(seen[1], 5)
+
+    def test_garmin_call_timeout(self):
+        client = GarminClient()
+        seen = []
+
+        def connectapi(path, **kwargs):
+            seen.append(client.garth.timeout)
+            return {}
+
+        with patch.object(client.garth, "connectapi", side_effect=connectapi):
+            client.connectapi("/userprofile-service/socialProfile", params={"a": 1})
+            client.connectapi("/userprofile-service/socialProfile", timeout=2)
+            deadline.start(1)
+            client.connectapi("/userprofile-service/socialProfile")
+
+        self.assertEqual(seen[0], client.garth._timeout)
+        self.assertLessEqual(seen[1], 2)
+        self.assertGreater(seen[1], 1)
+        self.assertLessEqual(seen[2], 1)
+
+    def test_garmin_client_created_under_deadline(self):
+        deadline.start(1)
+
+        client = GarminClient()
+
+        deadline.clear()
+        self.assertEqual(client.garth.timeout, 10)
+
+
+class TestFlaskDeadline(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        response_cache.clear()
+
+    @patch("app.login_with_token")
+    def test_request_deadline(self, mock_login):
+        seen = []
+
+        def latest():
+            seen.append(deadline.remaining())
+            return {"activityId": 1}
+
+        mock_garmin = MagicMock()
+        mock_garmin.get_last_activity.side_effect = latest
+        mock_login.return_value = mock_garmin
+
+        response = self.app.get(
+            "/activities/latest",
+            headers={"Authorization": "Bearer test_token_123", "X-Request-Timeout": "2"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(seen[0], 2)
+        self.assertIsNone(deadline.remaining())
+
+
+if __name__ == "__main__":
+    unittest.main()
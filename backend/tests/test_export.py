@@ -0,0 +1,130 @@
+import datetime
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+import zipfile
+from unittest.mock import MagicMock, patch
+
+# Add the parent directory to the path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import app
+from export import export_to_directory, iter_zip, parse_ids, select_activity_ids
+
+
+def make_garmin(missing=()):
+    garmin = MagicMock()
+    garmin.activity_file_path.side_effect = lambda activity_id, file_format: (
+        f"/download-service/export/{file_format}/activity/{activity_id}"
+    )
+
+    def iter_download(path, chunk_size):
+        activity_id = int(path.rsplit("/", 1)[1])
+        if activity_id in missing:
+            raise Exception("404 Not Found")
+        content = f"<gpx id='{activity_id}'>".encode() + b"x" * 100
+        for offset in range(0, len(content), chunk_size):
+            yield content[offset : offset + chunk_size]
+
+    garmin.iter_download.side_effect = iter_download
+    return garmin
+
+
+class TestExport(unittest.TestCase):
+    def test_parse_ids(self):
+        self.assertEqual(parse_ids("1, 2,3"), [1, 2, 3])
+        self.assertIsNone(parse_ids(None))
+        with self.assertRaises(ValueError):
+            parse_ids("1,a")
+
+    def test_select_activity_ids(self):
+        activities = iter(
+            [
+                {"activityId": 4, "startTimeLocal": "2024-03-01 08:00:00"},
+                {"activityId": 3, "startTimeLocal": "2024-02-10 08:00:00"},
+                {"activityId": 2, "startTimeLocal": "2024-02-01 08:00:00"},
+                {"activityId": 1, "startTimeLocal": "2024-01-31 08:00:00"},
+                {"activityId": 0, "startTimeLocal": "2024-01-01 08:00:00"},
+            ]
+        )
+
+        ids = select_activity_ids(activities, datetime.date(2024, 2, 1), datetime.date(2024, 2, 29))
+
+        self.assertEqual(ids, [3, 2])
+        self.assertEqual(next(activities)["activityId"], 0)
+
+    def test_export_to_directory_resumes(self):
+        garmin = make_garmin(missing={3})
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "1.gpx"), "wb") as f:
+                f.write(b"already exported")
+
+            result = export_to_directory(garmin, [1, 2, 3], directory, "gpx", chunk_size=16)
+
+            self.assertEqual(result["downloaded"], 1)
+            self.assertEqual(result["skipped"], 1)
+            self.assertEqual(list(result["failed"]), [3])
+            self.assertEqual(sorted(os.listdir(directory)), ["1.gpx", "2.gpx", "3.gpx.part"])
+            with open(os.path.join(directory, "2.gpx"), "rb") as f:
+                self.assertTrue(f.read().startswith(b"<gpx id='2'>"))
+
+    def test_iter_zip(self):
+        garmin = make_garmin(missing={2})
+
+        chunks = list(iter_zip(garmin, [1, 2, 3, 4], "gpx", concurrency=2, chunk_size=16))
+
+        self.assertGreater(len(chunks), 2)
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+            self.assertEqual(archive.namelist(), ["1.gpx", "3.gpx", "4.gpx", "errors.txt"])
+            self.assertTrue(archive.read("4.gpx").startswith(b"<gpx id='4'>"))
+            self.assertEqual(archive.read("errors.txt"), b"2: 404 Not Found\n")
+
+    def test_iter_zip_closed_early(self):
+        garmin = make_garmin()
+
+        chunks = iter_zip(garmin, range(1, 100), "gpx", concurrency=4, chunk_size=16)
+        next(chunks)
+        chunks.close()
+
+        self.assertLess(garmin.iter_download.call_count, 10)
+
+
+class TestExportRoute(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.app = app.test_client()
+        self.headers = {"Authorization": "Bearer test_token_123"}
+
+    @patch("app.login_with_token")
+    def test_export_by_date(self, mock_login):
+        garmin = make_garmin()
+        garmin.iter_activities.return_value = iter(
+            [
+                {"activityId": 2, "startTimeLocal": "2024-01-02 08:00:00"},
+                {"activityId": 1, "startTimeLocal": "2023-12-31 08:00:00"},
+            ]
+        )
+        mock_login.return_value = garmin
+
+        response = self.app.get(
+            "/activities/export?format=tcx&start=2024-01-01&end=2024-01-31", headers=self.headers
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/zip")
+        self.assertIn("activities-tcx.zip", response.headers["Content-Disposition"])
+        with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+            self.assertEqual(archive.namelist(), ["2.tcx"])
+
+    def test_export_invalid_format(self):
+        response = self.app.get("/activities/export?ids=1&format=pdf", headers=self.headers)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("'format'", json.loads(response.data)["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
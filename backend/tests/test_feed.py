@@ -0,0 +1,199 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+# Add the parent directory to the path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import app
+from asgi import application
+from feed import ActivityFeed
+from throttle import UpstreamUnavailable
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_garmin(*activity_ids):
+    garmin = MagicMock()
+    garmin.display_name = "runner"
+    garmin.get_last_activity.side_effect = [
+        {"activityId": activity_id, "activityName": "Run", "ownerFullName": "Runner"}
+        for activity_id in activity_ids
+    ]
+    return garmin
+
+
+def event_ids(events):
+    return [int(event.split("\n", 1)[0].removeprefix("id: ")) for event in events]
+
+
+class TestActivityFeed(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.object(ActivityFeed, "_start")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.clock = FakeClock()
+        self.feed = ActivityFeed(min_interval=30, max_interval=300, timer=self.clock)
+
+    def poll_due(self):
+        due = self.feed.run_due()
+        for poller in due:
+            self.feed.poll(poller)
+        return due
+
+    def test_one_poller_per_account(self):
+        garmin = make_garmin(1, 1, 2)
+        first, second = [], []
+        self.feed.subscribe("runner", garmin, first.append)
+        self.feed.subscribe("runner", garmin, second.append)
+
+        self.assertEqual(len(self.poll_due()), 1)
+        self.clock.now += 30
+        self.poll_due()
+        self.clock.now += 45
+        self.poll_due()
+
+        self.assertEqual(garmin.get_last_activity.call_count, 3)
+        self.assertEqual(event_ids(first), [1, 2])
+        self.assertEqual(event_ids(second), [1, 2])
+        event = first[0].split("\n")
+        self.assertEqual(event[1], "event: activity")
+        self.assertEqual(
+            json.loads(event[2].removeprefix("data: ")), {"activityId": 1, "activityName": "Run"}
+        )
+        self.assertEqual(self.feed.accounts(), 1)
+        self.assertEqual(self.feed.subscribers(), 2)
+
+    def test_new_subscriber_gets_latest(self):
+        garmin = make_garmin(1)
+        self.feed.subscribe("runner", garmin, [].append)
+        self.poll_due()
+
+        late, resumed = [], []
+        self.feed.subscribe("runner", garmin, late.append)
+        self.feed.subscribe("runner", garmin, resumed.append, last_event_id="1")
+
+        self.assertEqual(event_ids(late), [1])
+        self.assertEqual(resumed, [])
+        self.assertEqual(self.poll_due(), [])
+
+    def test_interval_adapts(self):
+        garmin = make_garmin(1, 1, 1, 1, 2)
+        self.feed.subscribe("runner", garmin, [].append)
+        intervals = []
+        for _ in range(5):
+            (poller,) = self.poll_due()
+            intervals.append(poller.interval)
+            self.clock.now = poller.next_poll
+
+        self.assertEqual(intervals, [30, 45, 67.5, 101.25, 30])
+
+    def test_error_backs_off(self):
+        garmin = MagicMock()
+        garmin.get_last_activity.side_effect = UpstreamUnavailable("Garmin Connect is down", 120)
+        self.feed.subscribe("runner", garmin, [].append)
+
+        (poller,) = self.poll_due()
+
+        self.assertEqual(poller.interval, 120)
+        self.assertEqual(poller.next_poll, self.clock.now + 120)
+
+    def test_last_unsubscribe_stops_polling(self):
+        garmin = make_garmin(1)
+        subscription = self.feed.subscribe("runner", garmin, [].append)
+        (poller,) = self.feed.run_due()
+
+        self.feed.unsubscribe(subscription)
+        self.feed.poll(poller)
+
+        self.assertEqual(self.feed.accounts(), 0)
+        self.clock.now += 1000
+        self.assertEqual(self.feed.run_due(), [])
+
+
+class TestActivityStreamRoute(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.object(ActivityFeed, "_start")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.feed = ActivityFeed(min_interval=30, max_interval=300)
+        self.headers = {"Authorization": "Bearer test_token_123"}
+        self.garmin = make_garmin(1)
+        self.feed.subscribe("runner", self.garmin, [].append)
+        for poller in self.feed.run_due():
+            self.feed.poll(poller)
+
+    def test_no_auth(self):
+        response = app.test_client().get("/activities/stream")
+
+        self.assertEqual(response.status_code, 401)
+
+    @patch("app.login_with_token")
+    def test_stream(self, mock_login):
+        mock_login.return_value = self.garmin
+
+        with patch("app.activity_feed", self.feed):
+            response = app.test_client().get(
+                "/activities/stream", headers=self.headers, buffered=False
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.mimetype, "text/event-stream")
+            chunks = response.iter_encoded()
+            self.assertEqual(next(chunks), b"retry: 10000\n\n")
+            self.assertTrue(next(chunks).startswith(b"id: 1\nevent: activity\n"))
+            self.assertEqual(self.feed.subscribers(), 2)
+            response.close()
+
+        self.assertEqual(self.feed.subscribers(), 1)
+
+    @patch("app.login_with_token")
+    def test_stream_async(self, mock_login):
+        mock_login.return_value = self.garmin
+        sent = []
+
+        async def run():
+            disconnect = asyncio.Event()
+            messages = iter([{"type": "http.request", "body": b""}])
+
+            async def receive():
+                message = next(messages, None)
+                if message is None:
+                    await disconnect.wait()
+                    return {"type": "http.disconnect"}
+                return message
+
+            async def send(message):
+                sent.append(message)
+                if b"event: activity" in message.get("body", b""):
+                    disconnect.set()
+
+            scope = {
+                "type": "http",
+                "method": "GET",
+                "path": "/activities/stream",
+                "query_string": b"",
+                "headers": [(b"authorization", b"Bearer test_token_123")],
+            }
+            await asyncio.wait_for(application(scope, receive, send), 5)
+
+        with patch("asgi.activity_feed", self.feed):
+            asyncio.run(run())
+
+        self.assertEqual(sent[0]["status"], 200)
+        self.assertIn((b"content-type", b"text/event-stream"), sent[0]["headers"])
+        self.assertEqual(sent[1]["body"], b"retry: 10000\n\n")
+        self.assertTrue(sent[2]["body"].startswith(b"id: 1\n"))
+        self.assertEqual(self.feed.subscribers(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
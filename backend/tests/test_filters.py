@@ -0,0 +1,115 @@
+import unittest
+import sys
+import os
+
+# Add the parent directory to the path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from filters import ActivityFilter, afilter_activities, filter_activities, parse_filter
+
+
+def activity(activity_id, day):
+    return {"activityId": activity_id, "startTimeLocal": f"{day} 08:00:00"}
+
+
+# Newest first, like Garmin's search
+HISTORY = [
+    activity(5, "2024-03-10"),
+    activity(4, "2024-03-02"),
+    activity(3, "2024-02-20"),
+    activity(2, "2024-02-01"),
+    activity(1, "2024-01-15"),
+]
+
+
+class Consumed:
+    """Iterator recording how far it was read and whether it was closed."""
+
+    def __init__(self, items):
+        self.items = iter(items)
+        self.read = 0
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = next(self.items)
+        self.read += 1
+        return item
+
+    def close(self):
+        self.closed = True
+
+
+class TestParseFilter(unittest.TestCase):
+    def test_no_filter(self):
+        self.assertIsNone(parse_filter(None, None, ""))
+
+    def test_parse_filter(self):
+        self.assertEqual(
+            parse_filter(" Running ", "2024-02-01", "2024-02-29"),
+            ActivityFilter("running", "2024-02-01", "2024-02-29"),
+        )
+        self.assertEqual(
+            parse_filter(None, "2024-02-01", None).search(),
+            {"activitytype": None, "start_date": "2024-02-01", "end_date": None},
+        )
+
+    def test_parse_filter_invalid(self):
+        for values in [
+            ("running&limit=1", None, None),
+            (None, "02/01/2024", None),
+            (None, None, "2024-13-01"),
+            (None, "2024-03-01", "2024-02-01"),
+        ]:
+            with self.subTest(values=values), self.assertRaises(ValueError):
+                parse_filter(*values)
+
+
+class TestFilterActivities(unittest.TestCase):
+    def test_stops_before_start_date(self):
+        activities = Consumed(HISTORY)
+
+        matched = list(filter_activities(activities, ActivityFilter(None, "2024-02-15"), 10))
+
+        self.assertEqual([a["activityId"] for a in matched], [5, 4, 3])
+        # Reading stopped at the first activity before the range
+        self.assertEqual(activities.read, 4)
+        self.assertTrue(activities.closed)
+
+    def test_skips_after_end_date(self):
+        search = ActivityFilter(None, "2024-02-01", "2024-02-29")
+
+        matched = list(filter_activities(iter(HISTORY), search, 10))
+
+        self.assertEqual([a["activityId"] for a in matched], [3, 2])
+
+    def test_stops_at_limit(self):
+        activities = Consumed(HISTORY)
+
+        matched = list(filter_activities(activities, ActivityFilter("running"), 2))
+
+        self.assertEqual([a["activityId"] for a in matched], [5, 4])
+        self.assertEqual(activities.read, 2)
+        self.assertTrue(activities.closed)
+
+
+class TestFilterActivitiesAsync(unittest.IsolatedAsyncioTestCase):
+    async def test_stops_before_start_date(self):
+        read = []
+
+        async def activities():
+            for item in HISTORY:
+                read.append(item["activityId"])
+                yield item
+
+        search = ActivityFilter(None, "2024-02-15", "2024-03-05")
+        matched = [a async for a in afilter_activities(activities(), search, 10)]
+
+        self.assertEqual([a["activityId"] for a in matched], [4, 3])
+        self.assertEqual(read, [5, 4, 3, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import sys
+import os
+
+import msgpack
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+# Add the parent directory to the path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from formats import encode_columns, negotiate_format, to_columns
+
+
+def accept(header):
+    return parse_accept_header(header, MIMEAccept)
+
+
+class TestFormats(unittest.TestCase):
+    def test_format_parameter_wins(self):
+        self.assertEqual(negotiate_format("columns", accept("application/x-ndjson")), "columns")
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            negotiate_format("xml", accept(None))
+
+    def test_accept_header(self):
+        self.assertEqual(negotiate_format(None, accept(None)), "json")
+        self.assertEqual(negotiate_format(None, accept("*/*")), "json")
+        self.assertEqual(negotiate_format(None, accept("text/html")), "json")
+        self.assertEqual(negotiate_format(None, accept("application/x-ndjson")), "ndjson")
+        self.assertEqual(negotiate_format(None, accept("application/x-msgpack")), "msgpack")
+        self.assertEqual(
+            negotiate_format(
+                None, accept("application/json;q=0.5, application/vnd.gconnect.columns+json")
+            ),
+            "columns",
+        )
+
+    def test_to_columns(self):
+        activities = [
+            {"activityId": 1, "activityType": {"typeKey": "running"}, "distance": 5000},
+            {"activityId": 2, "activityType": {"typeKey": "cycling"}, "calories": 300},
+            {"activityId": 3, "splits": [{"distance": 1000}]},
+        ]
+
+        columns = to_columns(activities)
+
+        self.assertEqual(
+            columns,
+            {
+                "activityId": [1, 2, 3],
+                "activityType.typeKey": ["running", "cycling", None],
+                "distance": [5000, None, None],
+                "calories": [None, 300, None],
+                "splits": [None, None, [{"distance": 1000}]],
+            },
+        )
+        self.assertEqual(to_columns([]), {})
+
+    def test_encode_columns(self):
+        columns = {"activityId": [1, 2], "distance": [5000.5, None]}
+
+        self.assertEqual(encode_columns(columns, "columns", str), str(columns))
+        self.assertEqual(msgpack.unpackb(encode_columns(columns, "msgpack", str)), columns)
+
+
+if __name__ == "__main__":
+    unittest.main()
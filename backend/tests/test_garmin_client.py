@@ -0,0 +1,406 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+import httpx
+import requests
+from garth.auth_tokens import OAuth2Token
+from garth.exc import GarthHTTPError
+
+# Add the parent directory to the path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from garmin_client import GarminClient, gather_or_cancel
+from singleflight import upstream_flight
+from throttle import CircuitBreaker, RateLimiter, UpstreamPolicy
+from transport import AsyncTransport
+
+LONG_TOKENSTORE = "x" * 600
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return GarthHTTPError(msg="Error in request", error=requests.HTTPError(response=response))
+
+
+def make_token(expires_in):
+    now = int(time.time())
+    return OAuth2Token(
+        scope="CONNECT_READ",
+        jti="jti",
+        token_type="Bearer",
+        access_token="access",
+        refresh_token="refresh",
+        expires_in=expires_in,
+        expires_at=now + expires_in,
+        refresh_token_expires_in=7200,
+        refresh_token_expires_at=now + 7200,
+    )
+
+
+def make_client(**kwargs):
+    client = GarminClient(**kwargs)
+    client.garth = MagicMock()
+    client.garth.profile = {"displayName": "runner42", "fullName": "Test Runner"}
+    client.garth.connectapi.return_value = {"userData": {"measurementSystem": "metric"}}
+    return client
+
+
+class TestGarminClientLogin(unittest.TestCase):
+    def test_token_login_eager(self):
+        client = make_client()
+
+        client.login(LONG_TOKENSTORE)
+
+        client.garth.loads.assert_called_once_with(LONG_TOKENSTORE)
+        client.garth.connectapi.assert_called_once_with(client.garmin_connect_user_settings_url)
+        self.assertEqual(client.display_name, "runner42")
+        self.assertEqual(client.unit_system, "metric")
+
+    def test_token_login_lazy_skips_settings(self):
+        client = make_client(lazy_profile=True)
+
+        client.login(LONG_TOKENSTORE)
+
+        client.garth.loads.assert_called_once_with(LONG_TOKENSTORE)
+        client.garth.connectapi.assert_not_called()
+
+    def test_lazy_unit_system_fetched_once(self):
+        client = make_client(lazy_profile=True)
+        client.login(LONG_TOKENSTORE)
+
+        self.assertEqual(client.get_unit_system(), "metric")
+        self.assertEqual(client.get_unit_system(), "metric")
+
+        client.garth.connectapi.assert_called_once_with(client.garmin_connect_user_settings_url)
+
+    def test_lazy_profile_resolved_on_summary(self):
+        client = make_client(lazy_profile=True)
+        client.login(LONG_TOKENSTORE)
+        client.garth.connectapi.return_value = {"privacyProtected": False}
+
+        client.get_user_summary("2023-01-01")
+
+        client.garth.connectapi.assert_called_once_with(
+            f"{client.garmin_connect_daily_summary_url}/runner42",
+            params={"calendarDate": "2023-01-01"},
+        )
+        self.assertEqual(client.get_full_name(), "Test Runner")
+
+    def test_lazy_activities_single_call(self):
+        client = make_client(lazy_profile=True)
+        client.login(LONG_TOKENSTORE)
+        client.garth.connectapi.return_value = [{"activityId": 1}]
+
+        self.assertEqual(client.get_last_activity(), {"activityId": 1})
+        self.assertEqual(client.garth.connectapi.call_count, 1)
+
+    def test_refresh_token_within_margin(self):
+        client = make_client()
+        client.garth.oauth2_token = make_token(120)
+
+        self.assertFalse(client.refresh_token(margin=60))
+        client.garth.refresh_oauth2.assert_not_called()
+
+        self.assertTrue(client.refresh_token(margin=300))
+        client.garth.refresh_oauth2.assert_called_once()
+        self.assertAlmostEqual(client.token_expires_in(), 120, delta=2)
+
+
+class TestGarminClientActivities(unittest.TestCase):
+    def setUp(self):
+        self.client = make_client()
+        self.history = [{"activityId": i} for i in range(250)]
+
+        def search(url, params):
+            start, limit = int(params["start"]), int(params["limit"])
+            return self.history[start : start + limit]
+
+        self.client.garth.connectapi.side_effect = search
+
+    def test_iter_activities_pages(self):
+        activities = list(self.client.iter_activities(0, 230, page_size=100))
+
+        self.assertEqual([a["activityId"] for a in activities], list(range(230)))
+        limits = [c.kwargs["params"]["limit"] for c in self.client.garth.connectapi.call_args_list]
+        self.assertEqual(limits, ["100", "100", "30"])
+
+    def test_iter_activities_stops_at_end_of_history(self):
+        activities = list(self.client.iter_activities(page_size=100))
+
+        self.assertEqual(len(activities), 250)
+        self.assertEqual(self.client.garth.connectapi.call_count, 3)
+
+    def test_iter_activities_concurrent_batches(self):
+        activities = list(self.client.iter_activities(0, 230, page_size=50, concurrency=2))
+
+        self.assertEqual([a["activityId"] for a in activities], list(range(230)))
+        self.assertEqual(self.client.garth.connectapi.call_count, 5)
+
+    def test_get_activities_concurrent_in_order(self):
+        threads = set()
+        search = self.client.garth.connectapi.side_effect
+
+        def tracking_search(url, params):
+            threads.add(threading.get_ident())
+            return search(url, params)
+
+        self.client.garth.connectapi.side_effect = tracking_search
+
+        activities = self.client.get_activities(10, 200, page_size=20)
+
+        self.assertEqual([a["activityId"] for a in activities], list(range(10, 210)))
+        self.assertEqual(self.client.garth.connectapi.call_count, 10)
+        self.assertGreater(len(threads), 1)
+
+    def test_get_activities_concurrent_truncates_at_end(self):
+        activities = self.client.get_activities(200, 200, page_size=20)
+
+        self.assertEqual([a["activityId"] for a in activities], list(range(200, 250)))
+
+    @patch("throttle.time.sleep")
+    def test_get_activities_concurrent_page_retried_once_per_policy(self, mock_sleep):
+        self.client.policy = UpstreamPolicy(
+            limiter=RateLimiter(account_rate=0, process_rate=0),
+            breaker=CircuitBreaker(failure_threshold=100),
+            retries=2,
+            rng=lambda: 0,
+        )
+        search = self.client.garth.connectapi.side_effect
+        calls = []
+
+        def failing_search(url, params):
+            calls.append(params["start"])
+            if params["start"] == "40":
+                raise http_error(500)
+            return search(url, params)
+
+        self.client.garth.connectapi.side_effect = failing_search
+
+        with self.assertRaises(GarthHTTPError):
+            self.client.get_activities(0, 100, page_size=20)
+
+        # Only the policy retries: one call and two retries of the failed page
+        self.assertEqual(calls.count("40"), 3)
+
+    @patch("throttle.time.sleep")
+    def test_get_activities_concurrent_gives_up(self, mock_sleep):
+        self.client.garth.connectapi.side_effect = Exception("API error")
+
+        with self.assertRaises(Exception):
+            self.client.get_activities(0, 100, page_size=20)
+
+    def test_identical_concurrent_reads_are_coalesced(self):
+        release = threading.Event()
+        search = self.client.garth.connectapi.side_effect
+
+        def slow_search(url, params):
+            release.wait(5)
+            return search(url, params)
+
+        self.client.garth.connectapi.side_effect = slow_search
+        coalesced = upstream_flight.coalesced
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.client.get_last_activity()))
+            for _ in range(3)
+        ]
+        threads[0].start()
+        while self.client.garth.connectapi.call_count < 1:
+            pass
+        for thread in threads[1:]:
+            thread.start()
+        while upstream_flight.coalesced < coalesced + 2:
+            pass
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [{"activityId": 0}] * 3)
+        self.assertEqual(self.client.garth.connectapi.call_count, 1)
+
+    def test_get_activities_raw(self):
+        self.client.garth.request.return_value = MagicMock(status_code=200, text="[]")
+
+        self.assertEqual(self.client.get_activities_raw(0, 5), "[]")
+        self.client.garth.request.assert_called_once_with(
+            "GET",
+            "connectapi",
+            "/activitylist-service/activities/search/activities",
+            api=True,
+            params={"start": "0", "limit": "5"},
+        )
+        self.client.garth.connectapi.assert_not_called()
+
+    def test_iter_activities_pushes_filters_down(self):
+        list(
+            self.client.iter_activities(
+                0,
+                150,
+                "running",
+                page_size=100,
+                concurrency=2,
+                start_date="2024-01-01",
+                end_date="2024-01-31",
+            )
+        )
+
+        for call in self.client.garth.connectapi.call_args_list:
+            params = call.kwargs["params"]
+            self.assertEqual(params["activityType"], "running")
+            self.assertEqual(params["startDate"], "2024-01-01")
+            self.assertEqual(params["endDate"], "2024-01-31")
+
+    def test_iter_activities_is_lazy(self):
+        activities = self.client.iter_activities(0, 1000, page_size=100)
+
+        next(activities)
+
+        self.assertEqual(self.client.garth.connectapi.call_count, 1)
+
+    def test_get_user_summaries_in_order(self):
+        self.client.garth.connectapi.side_effect = lambda url, params: {
+            "calendarDate": params["calendarDate"],
+            "privacyProtected": False,
+        }
+        days = [f"2024-01-{day:02d}" for day in range(1, 11)]
+
+        received = {}
+
+        summaries = self.client.get_user_summaries(
+            days, concurrency=4, on_summary=received.__setitem__
+        )
+
+        self.assertEqual([s["calendarDate"] for s in summaries], days)
+        self.assertEqual(self.client.garth.connectapi.call_count, 10)
+        self.assertEqual(
+            {day: s["calendarDate"] for day, s in received.items()}, dict(zip(days, days))
+        )
+
+    def test_iter_download_streams_chunks(self):
+        response = MagicMock()
+        response.iter_content.return_value = iter([b"abc", b"de"])
+        self.client.garth.request.return_value = response
+        path = self.client.activity_file_path(42, "gpx")
+
+        chunks = list(self.client.iter_download(path, chunk_size=3))
+
+        self.assertEqual(chunks, [b"abc", b"de"])
+        self.assertEqual(path, "/download-service/export/gpx/activity/42")
+        self.client.garth.request.assert_called_once_with(
+            "GET", "connectapi", path, api=True, stream=True
+        )
+        response.iter_content.assert_called_once_with(3)
+        response.close.assert_called_once()
+
+
+class TestGarminClientAsync(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.requests = []
+        self.history = [{"activityId": i} for i in range(250)]
+        self.statuses = []
+
+        def handler(request):
+            self.requests.append(request)
+            if self.statuses:
+                return httpx.Response(self.statuses.pop(0))
+            if request.url.path == "/userprofile-service/socialProfile":
+                return httpx.Response(
+                    200, json={"displayName": "runner42", "fullName": "Test Runner"}
+                )
+            if request.url.path == "/userprofile-service/userprofile/user-settings":
+                return httpx.Response(200, json={"userData": {"measurementSystem": "metric"}})
+            if request.url.path.startswith("/usersummary-service/usersummary/daily/"):
+                day = request.url.params["calendarDate"]
+                return httpx.Response(200, json={"calendarDate": day, "privacyProtected": False})
+            start = int(request.url.params["start"])
+            limit = int(request.url.params["limit"])
+            return httpx.Response(200, json=self.history[start : start + limit])
+
+        transport = AsyncTransport(transport=httpx.MockTransport(handler))
+        self.client = GarminClient(async_transport=transport, policy=UpstreamPolicy(backoff=0))
+        self.client.garth.oauth2_token = "Bearer test"
+        self.client.garth.backoff_factor = 0
+
+    async def test_failed_fan_out_cancels_the_rest(self):
+        cancelled = asyncio.Event()
+
+        async def slow():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def failing():
+            raise ValueError("429")
+
+        with self.assertRaises(ValueError):
+            await gather_or_cancel(slow(), failing())
+
+        # The sibling is stopped before the error reaches the caller
+        self.assertTrue(cancelled.is_set())
+
+    async def test_connectapi_async_sends_auth(self):
+        await self.client.get_activities_async(0, 5)
+
+        request = self.requests[0]
+        self.assertEqual(request.url.host, "connectapi.garmin.com")
+        self.assertEqual(request.headers["Authorization"], "Bearer test")
+        self.assertEqual(request.url.params["limit"], "5")
+
+    async def test_get_activities_async_pages(self):
+        activities = await self.client.get_activities_async(0, 230, page_size=100)
+
+        self.assertEqual([a["activityId"] for a in activities], list(range(230)))
+        self.assertEqual(len(self.requests), 3)
+
+    async def test_iter_activities_async(self):
+        activities = [a async for a in self.client.iter_activities_async(page_size=100)]
+
+        self.assertEqual(len(activities), 250)
+
+    async def test_get_activities_raw_async(self):
+        body = await self.client.get_activities_raw_async(0, 2)
+
+        self.assertEqual(json.loads(body), [{"activityId": 0}, {"activityId": 1}])
+
+    async def test_get_user_summaries_async(self):
+        self.client._display_name = "runner42"
+        days = ["2024-01-01", "2024-01-02", "2024-01-03"]
+
+        received = {}
+
+        summaries = await self.client.get_user_summaries_async(
+            days, concurrency=2, on_summary=received.__setitem__
+        )
+
+        self.assertEqual([s["calendarDate"] for s in summaries], days)
+        self.assertEqual(sorted(received), days)
+        self.assertEqual(
+            self.requests[0].url.path, "/usersummary-service/usersummary/daily/runner42"
+        )
+
+    async def test_connectapi_async_retries(self):
+        self.statuses = [503]
+
+        activity = await self.client.get_last_activity_async()
+
+        self.assertEqual(activity, {"activityId": 0})
+        self.assertEqual(len(self.requests), 2)
+
+    async def test_connectapi_async_raises(self):
+        self.statuses = [404]
+
+        with self.assertRaises(httpx.HTTPStatusError):
+            await self.client.get_last_activity_async()
+
+
+if __name__ == "__main__":
+    unittest.main()
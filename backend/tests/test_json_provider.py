@@ -0,0 +1,56 @@
+import datetime
+import decimal
+import unittest
+import sys
+import os
+
+# Add the parent directory to the path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from json_provider import FastJSONProvider
+
+
+class TestFastJSONProvider(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.fast = FastJSONProvider(self.app)
+        self.default = DefaultJSONProvider(self.app)
+
+    def test_matches_default_provider(self):
+        data = {
+            "b": [1, 2.5, None, True],
+            "a": {"nested": "value"},
+            "date": datetime.datetime(2023, 1, 1, 13, 0),
+            "amount": decimal.Decimal("1.50"),
+        }
+
+        self.assertEqual(
+            self.fast.loads(self.fast.dumps(data)), self.default.loads(self.default.dumps(data))
+        )
+        self.assertEqual(
+            self.fast.dumps(data, separators=(",", ":")),
+            self.default.dumps(data, separators=(",", ":")),
+        )
+
+    def test_large_integers_fall_back_to_stdlib(self):
+        self.assertEqual(self.fast.dumps({"value": 2**70}), '{"value": 1180591620717411303424}')
+
+    def test_unsupported_arguments_fall_back_to_stdlib(self):
+        self.assertEqual(self.fast.dumps({"a": 1}, indent=4), '{\n    "a": 1\n}')
+
+    def test_jsonify_uses_provider(self):
+        self.app.json = self.fast
+        with self.app.app_context():
+            response = self.app.json.response({"name": "Łódź"})
+
+        self.assertEqual(response.get_data(as_text=True), '{"name":"Łódź"}\n')
+
+    def test_loads_bytes(self):
+        self.assertEqual(self.fast.loads(b'{"a": [1]}'), {"a": [1]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,9 +7,13 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from app import init_api_reuse, login_with_token
+from sessions import session_cache
 
 
 class TestLogin(unittest.TestCase):
+    def setUp(self):
+        session_cache.clear()
+
     @patch("app.GarminClient")
     def test_init_api_reuse_success(self, mock_garmin_class):
         # Setup mock
@@ -47,10 +51,27 @@ class TestLogin(unittest.TestCase):
         result = login_with_token("Bearer test_token_123")
 
         # Assertions
-        mock_garmin_class.assert_called_once()
+        mock_garmin_class.assert_called_once_with(lazy_profile=True)
         mock_garmin_instance.login.assert_called_once_with("test_token_123")
         self.assertEqual(result, mock_garmin_instance)
 
+    @patch("app.GarminClient")
+    def test_login_with_token_cached(self, mock_garmin_class):
+        # Setup mock
+        mock_garmin_instance = MagicMock()
+        mock_garmin_class.return_value = mock_garmin_instance
+
+        # Log in twice with the same token
+        first = login_with_token("Bearer test_token_123")
+        second = login_with_token("Bearer test_token_123")
+
+        # Assertions
+        mock_garmin_class.assert_called_once()
+        mock_garmin_instance.login.assert_called_once_with("test_token_123")
+        self.assertIs(first, second)
+        self.assertEqual(session_cache.hits, 1)
+        self.assertEqual(session_cache.misses, 1)
+
     @patch("app.GarminClient")
     def test_login_with_token_error(self, mock_garmin_class):
         # Setup mock to raise error
@@ -63,6 +84,7 @@ class TestLogin(unittest.TestCase):
 
         # Assertions
         self.assertIsNone(result)
+        self.assertEqual(len(session_cache), 0)
 
     def test_login_with_token_invalid_header(self):
         # Test with invalid header format
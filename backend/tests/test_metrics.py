@@ -0,0 +1,148 @@
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+
+# Add the parent directory to the path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import app, response_cache
+from garmin_client import GarminClient
+from metrics import Counter, Gauge, Histogram, Registry, registry, upstream_path
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+        self.requests = Counter(self.registry, "requests_total", "Requests.", ("route",))
+        self.latency = Histogram(
+            self.registry, "latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0)
+        )
+
+    def test_render(self):
+        self.requests.inc("/a")
+        self.requests.inc("/a")
+        self.latency.observe(0.05, "/a")
+        self.latency.observe(0.5, "/a")
+        self.latency.observe(5, "/a")
+
+        text = self.registry.render()
+
+        self.assertIn("# TYPE requests_total counter", text)
+        self.assertIn('requests_total{route="/a"} 2', text)
+        self.assertIn('latency_seconds_bucket{route="/a",le="0.1"} 1', text)
+        self.assertIn('latency_seconds_bucket{route="/a",le="1"} 2', text)
+        self.assertIn('latency_seconds_bucket{route="/a",le="+Inf"} 3', text)
+        self.assertIn('latency_seconds_sum{route="/a"} 5.55', text)
+        self.assertIn('latency_seconds_count{route="/a"} 3', text)
+
+    def test_threads_are_summed_and_retired(self):
+        def work():
+            for _ in range(1000):
+                self.requests.inc("/a")
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertIn('requests_total{route="/a"} 4000', self.registry.render())
+        self.assertEqual(len(self.registry._shards), 0)
+        self.assertIn('requests_total{route="/a"} 4000', self.registry.render())
+
+    def test_gauge_track(self):
+        in_flight = Gauge(self.registry, "in_flight", "In flight.")
+
+        with in_flight.track():
+            self.assertIn("in_flight 1", self.registry.render())
+        self.assertIn("in_flight 0", self.registry.render())
+
+    def test_upstream_path_labels(self):
+        self.assertEqual(
+            upstream_path("/activitylist-service/activities/search/activities"),
+            "activity_search",
+        )
+        self.assertEqual(upstream_path("/usersummary-service/usersummary/daily/x"), "daily_summary")
+        self.assertEqual(upstream_path("/unknown"), "other")
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        response_cache.clear()
+        registry.clear()
+
+    def test_route_metrics(self):
+        # Reading the body completes the response like a server would
+        self.app.get("/health").get_data()
+        self.app.get("/does-not-exist").get_data()
+
+        text = self.app.get("/metrics").get_data(as_text=True)
+
+        self.assertIn(
+            'gconnect_http_requests_total{route="/health",method="GET",status="200"} 1', text
+        )
+        self.assertIn(
+            'gconnect_http_requests_total{route="unmatched",method="GET",status="404"} 1', text
+        )
+        self.assertIn('gconnect_http_request_duration_seconds_count{route="/health"', text)
+        self.assertIn('gconnect_http_requests_in_flight{route="/health"} 0', text)
+        self.assertIn('gconnect_cache_entries{cache="session"}', text)
+
+    @patch("app.login_with_token")
+    def test_streamed_response_size(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.iter_activities.return_value = iter([{"activityId": 1}, {"activityId": 2}])
+        mock_login.return_value = mock_garmin
+
+        response = self.app.get(
+            "/activities?format=ndjson", headers={"Authorization": "Bearer test_token_123"}
+        )
+        size = len(response.get_data())
+
+        text = self.app.get("/metrics").get_data(as_text=True)
+        self.assertIn(f'gconnect_http_response_size_bytes_sum{{route="/activities"}} {size}', text)
+
+    def test_upstream_and_login_timing(self):
+        client = GarminClient()
+        client.garth = MagicMock()
+        client.garth.connectapi.return_value = {"userData": {"measurementSystem": "metric"}}
+        client.garth.profile = {"displayName": "runner42", "fullName": "Test Runner"}
+
+        client.login("x" * 600)
+
+        text = registry.render()
+        self.assertIn(
+            'gconnect_upstream_request_duration_seconds_count{path="user_settings",outcome="ok"} 1',
+            text,
+        )
+        self.assertIn(
+            'gconnect_upstream_request_duration_seconds_count{path="social_profile",'
+            'outcome="ok"} 1',
+            text,
+        )
+        self.assertIn(
+            'gconnect_login_duration_seconds_count{method="tokenstore",outcome="ok"} 1', text
+        )
+        self.assertIn("gconnect_token_decode_duration_seconds_count 1", text)
+
+    def test_upstream_errors(self):
+        client = GarminClient()
+        client.garth = MagicMock()
+        client.garth.connectapi.side_effect = Exception("boom")
+
+        with self.assertRaises(Exception):
+            client.get_activities(0, 1)
+
+        self.assertIn(
+            'gconnect_upstream_request_duration_seconds_count{path="activity_search",'
+            'outcome="error"} 1',
+            registry.render(),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import sys
+import os
+
+# Add the parent directory to the path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from projection import SUMMARY_FIELDS, parse_fields, project
+
+
+class TestProjection(unittest.TestCase):
+    def setUp(self):
+        self.activity = {
+            "activityId": 1234567890,
+            "activityName": "Test Running",
+            "activityType": {"typeId": 1, "typeKey": "running", "parentTypeId": 17},
+            "distance": 5000,
+            "duration": 1800,
+            "startTimeLocal": "2023-01-01 13:00:00",
+            "summarizedDiveInfo": {"summarizedDiveGases": []},
+            "splitSummaries": [{"distance": 1000}] * 5,
+        }
+
+    def test_all_keeps_whole_activity(self):
+        self.assertIsNone(parse_fields("all"))
+        self.assertIsNone(parse_fields(None))
+        self.assertIs(project(self.activity, None), self.activity)
+
+    def test_summary_preset(self):
+        tree = parse_fields(None, default="summary")
+
+        result = project(self.activity, tree)
+
+        self.assertEqual(result["activityType"], {"typeId": 1, "typeKey": "running"})
+        self.assertNotIn("splitSummaries", result)
+        self.assertTrue(set(result) <= {field.split(".")[0] for field in SUMMARY_FIELDS})
+
+    def test_explicit_fields(self):
+        tree = parse_fields("activityId, activityType.typeKey,missing")
+
+        result = project(self.activity, tree)
+
+        self.assertEqual(result, {"activityId": 1234567890, "activityType": {"typeKey": "running"}})
+
+    def test_whole_parent_wins_over_nested_field(self):
+        for value in ("activityType,activityType.typeKey", "activityType.typeKey,activityType"):
+            result = project(self.activity, parse_fields(value))
+            self.assertEqual(result["activityType"], self.activity["activityType"])
+
+    def test_project_does_not_modify_input(self):
+        project(self.activity, parse_fields("activityId"))
+
+        self.assertIn("splitSummaries", self.activity)
+
+
+if __name__ == "__main__":
+    unittest.main()
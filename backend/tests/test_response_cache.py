@@ -0,0 +1,92 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import json
+import sys
+import os
+
+# Add the parent directory to the path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import app, response_cache
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        response_cache.clear()
+
+        self.sample_activity = {"activityId": 1234567890, "activityName": "Test Running"}
+        self.headers = {"Authorization": "Bearer test_token_123"}
+
+    @patch("app.login_with_token")
+    def test_etag_and_cache_control(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.get_last_activity.return_value = self.sample_activity
+        mock_login.return_value = mock_garmin
+
+        response = self.app.get("/activities/latest", headers=self.headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.get_etag()[0])
+        self.assertIn("no-cache", response.headers["Cache-Control"])
+        self.assertIn("private", response.headers["Cache-Control"])
+
+    @patch("app.login_with_token")
+    def test_repeat_request_served_from_cache(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.get_last_activity.return_value = self.sample_activity
+        mock_login.return_value = mock_garmin
+
+        first = self.app.get("/activities/latest", headers=self.headers)
+        second = self.app.get("/activities/latest", headers=self.headers)
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first.get_etag(), second.get_etag())
+        mock_login.assert_called_once()
+        mock_garmin.get_last_activity.assert_called_once()
+
+    @patch("app.login_with_token")
+    def test_not_modified(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.get_activities.return_value = [self.sample_activity]
+        mock_login.return_value = mock_garmin
+
+        first = self.app.get("/activities?num=5", headers=self.headers)
+        etag = first.get_etag()[0]
+        second = self.app.get(
+            "/activities?num=5", headers={**self.headers, "If-None-Match": f'"{etag}"'}
+        )
+
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.data, b"")
+
+    @patch("app.login_with_token")
+    def test_cache_keyed_by_query_and_token(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.get_activities.return_value = [self.sample_activity]
+        mock_login.return_value = mock_garmin
+
+        self.app.get("/activities?num=5", headers=self.headers)
+        self.app.get("/activities?num=6", headers=self.headers)
+        self.app.get("/activities?num=5", headers={"Authorization": "Bearer other_token"})
+
+        self.assertEqual(mock_garmin.get_activities.call_count, 3)
+
+    @patch("app.login_with_token")
+    def test_errors_not_cached(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.get_last_activity.side_effect = [Exception("API error"), self.sample_activity]
+        mock_login.return_value = mock_garmin
+
+        first = self.app.get("/activities/latest", headers=self.headers)
+        second = self.app.get("/activities/latest", headers=self.headers)
+
+        self.assertEqual(first.status_code, 500)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(json.loads(second.data)["activityId"], 1234567890)
+
+
+if __name__ == "__main__":
+    unittest.main()
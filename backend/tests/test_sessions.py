@@ -0,0 +1,179 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+import tempfile
+import time
+
+# Add the parent directory to the path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import app, response_cache
+from sessions import AuthCache, SessionCache, TokenRefresher, refreshed_tokenstore, session_cache
+from shared_cache import SharedStore
+
+
+def make_client(tokenstores):
+    client = MagicMock()
+    client.refresh_token.return_value = True
+    client.garth.dumps.side_effect = tokenstores
+    client.get_last_activity.return_value = {"activityId": 1}
+    return client
+
+
+class TestTokenRefresher(unittest.TestCase):
+    def setUp(self):
+        session_cache.clear()
+        response_cache.clear()
+        self.refresher = TokenRefresher(session_cache, interval=0, margin=300, active_window=600)
+
+    def test_refreshes_active_sessions(self):
+        client = make_client(["new_token"])
+        session_cache.add_session("old_token", client)
+
+        self.assertEqual(self.refresher.run_once(), 1)
+
+        client.refresh_token.assert_called_once_with(300)
+        self.assertIs(session_cache.get_session("new_token").client, client)
+        self.assertIs(session_cache.get_session("old_token").client, client)
+        self.assertEqual(refreshed_tokenstore("old_token"), "new_token")
+        self.assertIsNone(refreshed_tokenstore("new_token"))
+
+    def test_skips_idle_and_fresh_sessions(self):
+        idle = make_client(["idle_new"])
+        session_cache.add_session("idle_token", idle).last_used = time.monotonic() - 601
+        fresh = make_client([])
+        fresh.refresh_token.return_value = False
+        session_cache.add_session("fresh_token", fresh)
+
+        self.assertEqual(self.refresher.run_once(), 0)
+
+        idle.refresh_token.assert_not_called()
+        fresh.refresh_token.assert_called_once()
+
+    def test_failed_refresh_keeps_sweeping(self):
+        failing = make_client([])
+        failing.refresh_token.side_effect = Exception("exchange failed")
+        session_cache.add_session("failing_token", failing)
+        session_cache.add_session("old_token", make_client(["new_token"]))
+
+        self.assertEqual(self.refresher.run_once(), 1)
+        self.assertIsNone(refreshed_tokenstore("failing_token"))
+
+    @patch("app.token_refresher")
+    def test_refreshed_tokenstore_header(self, mock_refresher):
+        app.config["TESTING"] = True
+        session_cache.add_session("old_token", make_client(["new_token"]))
+        self.refresher.run_once()
+
+        with app.test_client() as client:
+            stale = client.get("/activities/latest", headers={"Authorization": "Bearer old_token"})
+            swapped = client.get(
+                "/activities/latest", headers={"Authorization": "Bearer new_token"}
+            )
+
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(stale.headers["X-Garmin-Tokenstore"], "new_token")
+        self.assertEqual(swapped.status_code, 200)
+        self.assertNotIn("X-Garmin-Tokenstore", swapped.headers)
+
+    def test_invalidate_forgets_refreshed_tokenstores(self):
+        client = make_client(["new_token"])
+        session_cache.add_session("old_token", client)
+        self.refresher.run_once()
+
+        session_cache.invalidate("new_token")
+
+        self.assertIsNone(session_cache.get_session("old_token"))
+        self.assertIsNone(session_cache.get_session("new_token"))
+
+
+class TestAuthCache(unittest.TestCase):
+    def setUp(self):
+        session_cache.clear()
+        self.cache = AuthCache(session_cache)
+
+    def test_credential_key(self):
+        key = self.cache.credential_key(" User@Example.com", "secret")
+
+        self.assertEqual(key, self.cache.credential_key("user@example.com", "secret"))
+        self.assertNotEqual(key, self.cache.credential_key("user@example.com", "Secret"))
+        self.assertNotIn("secret", key)
+        # The salt differs per process, so keys cannot be precomputed
+        self.assertNotEqual(
+            key, AuthCache(session_cache).credential_key("user@example.com", "secret")
+        )
+
+    def test_references_session(self):
+        session = session_cache.add_session("token", make_client([]))
+        self.cache.add_login("user@example.com", "secret", session)
+
+        self.assertIs(self.cache.get_session("user@example.com", "secret"), session)
+        self.assertIsNone(self.cache.get_session("user@example.com", "other"))
+        self.assertNotIn("token", self.cache.values())
+
+    def test_entry_dies_with_session(self):
+        session = session_cache.add_session("token", make_client([]))
+        self.cache.add_login("user@example.com", "secret", session)
+
+        session_cache.invalidate("token")
+
+        self.assertIsNone(self.cache.get_session("user@example.com", "secret"))
+        self.assertEqual(len(self.cache), 0)
+
+
+class TestSharedSessions(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, "cache.db")
+        # Two caches on one store stand for two worker processes
+        self.first = SessionCache(shared=SharedStore(path))
+        self.second = SessionCache(shared=SharedStore(path))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_client(self, tokenstores=()):
+        client = make_client(list(tokenstores))
+        client.known_profile.return_value = {
+            "display_name": "runner",
+            "full_name": "Test Runner",
+            "unit_system": "metric",
+        }
+        return client
+
+    @patch("sessions.GarminClient")
+    def test_restore_session(self, mock_client_class):
+        self.first.add_session("token", self.make_client())
+
+        session = self.second.restore_session("token")
+
+        restored = mock_client_class.return_value
+        restored.login.assert_called_once_with("token")
+        restored.seed_profile.assert_called_once_with("runner", "Test Runner", "metric")
+        self.assertIs(session.client, restored)
+        self.assertIs(self.second.get_session("token"), session)
+        self.assertIsNone(self.second.restore_session("other"))
+
+    @patch("sessions.GarminClient")
+    def test_restore_refreshed_session(self, mock_client_class):
+        session = self.first.add_session("old_token", self.make_client(["new_token"]))
+        self.first.refresh_session(session, margin=300)
+
+        restored = self.second.restore_session("old_token")
+
+        mock_client_class.return_value.login.assert_called_once_with("new_token")
+        self.assertIs(self.second.get_session("new_token"), restored)
+
+    @patch("sessions.GarminClient")
+    def test_invalidated_session_is_not_restored(self, mock_client_class):
+        self.first.add_session("token", self.make_client())
+
+        self.first.invalidate("token")
+
+        self.assertIsNone(self.second.restore_session("token"))
+        mock_client_class.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
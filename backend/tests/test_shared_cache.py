@@ -0,0 +1,192 @@
+import asyncio
+import threading
+import unittest
+import sys
+import os
+import sqlite3
+import tempfile
+
+# Add the parent directory to the path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from shared_cache import SharedStore, SharedTTLCache, offload
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSharedTTLCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache.db")
+        self.clock = FakeTimer()
+        self.timer = FakeTimer()
+        # Two stores on one database stand for two worker processes
+        self.first = self.make_cache()
+        self.second = self.make_cache()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_cache(self, maxsize=100):
+        store = SharedStore(self.path, maxsize=maxsize, timer=self.clock)
+        return SharedTTLCache("test", store, maxsize=2, ttl=10, timer=self.timer)
+
+    def test_shared_between_processes(self):
+        self.first.set(("token", "/activities"), {"activityId": 1})
+
+        self.assertEqual(self.second.get(("token", "/activities")), {"activityId": 1})
+        self.assertIsNone(self.second.get(("token", "/summaries")))
+        self.assertEqual(self.second.stats()["shared_hits"], 1)
+        self.assertEqual(self.first.stats()["shared_hits"], 0)
+
+    def test_shared_entry_keeps_remaining_ttl(self):
+        self.first.set("a", 1)
+        self.clock.now = 6
+
+        self.assertEqual(self.second.get("a"), 1)
+
+        # The local copy expires with the shared entry, not a full ttl later
+        self.timer.now = 4
+        self.assertIsNone(self.second.peek("a"))
+
+    def test_expiry(self):
+        self.first.set("a", 1)
+        self.first.set("b", 2, ttl=100)
+        self.clock.now = 10
+
+        self.assertIsNone(self.second.get("a"))
+        self.assertEqual(self.second.get("b"), 2)
+
+    def test_pop_and_clear(self):
+        self.first.set("a", 1)
+        self.first.set("b", 2)
+        self.second.get("a")
+
+        self.second.pop("a")
+        self.assertIsNone(self.first.store.get("test", "a"))
+
+        self.first.clear()
+        self.assertIsNone(self.second.get("b"))
+        self.assertEqual(self.first.store.count("test"), 0)
+
+    def test_purge_owner(self):
+        first = SharedTTLCache(
+            "test", self.first.store, ttl=10, timer=self.timer, owner=lambda key: key[0]
+        )
+        second = SharedTTLCache(
+            "test", self.second.store, ttl=10, timer=self.timer, owner=lambda key: key[0]
+        )
+        first.set(("token", "/activities"), 1)
+        first.set(("token", "/summaries"), 2)
+        first.set(("other", "/activities"), 3)
+
+        first.purge("token")
+
+        self.assertIsNone(first.get(("token", "/activities")))
+        self.assertIsNone(second.get(("token", "/summaries")))
+        self.assertEqual(second.get(("other", "/activities")), 3)
+
+    def test_owner_column_added_to_old_database(self):
+        path = os.path.join(self.directory.name, "old.db")
+        with sqlite3.connect(path) as conn:
+            conn.execute(
+                "CREATE TABLE entries (namespace TEXT NOT NULL, key BLOB NOT NULL,"
+                " expires_at REAL, value BLOB NOT NULL, PRIMARY KEY (namespace, key))"
+            )
+        store = SharedStore(path)
+
+        store.set("test", "a", 1, None, owner="token")
+        store.pop_owner("test", "token")
+        self.assertIsNone(store.get("test", "a"))
+
+    def test_offload_runs_shared_caches_in_a_thread(self):
+        local = SharedTTLCache("test", None)
+
+        async def threads():
+            return (
+                await offload(self.first, threading.get_ident),
+                await offload(local, threading.get_ident),
+                threading.get_ident(),
+            )
+
+        shared, in_memory, loop = asyncio.run(threads())
+
+        self.assertNotEqual(shared, loop)
+        self.assertEqual(in_memory, loop)
+
+    def test_unsigned_entries_are_not_unpickled(self):
+        self.first.set("a", {"tokenstore": "secret"})
+        foreign = SharedStore(self.path, secret=b"another server")
+
+        self.assertIsNone(foreign.get("test", "a"))
+
+        # A value written behind the store's back is ignored too
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("UPDATE entries SET value = ?", (b"\x80\x04K\x01.",))
+        self.assertIsNone(self.second.store.get("test", "a"))
+
+    def test_database_is_private(self):
+        path = os.path.join(self.directory.name, "supplied.db")
+        with open(path, "w"):
+            pass
+        os.chmod(path, 0o644)
+
+        SharedStore(path)
+
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+    def test_sweep_trims_to_maxsize(self):
+        cache = self.make_cache(maxsize=2)
+        cache.set("soon", 1, ttl=5)
+        cache.set("later", 2, ttl=50)
+        cache.set("latest", 3, ttl=500)
+        cache.set("expired", 4, ttl=1)
+        self.clock.now = 2
+
+        cache.store.sweep("test")
+
+        self.assertEqual(cache.store.count("test"), 2)
+        self.assertIsNotNone(cache.store.get("test", "later"))
+        self.assertIsNotNone(cache.store.get("test", "latest"))
+
+    def test_zero_ttl_is_not_shared(self):
+        cache = SharedTTLCache("test", self.first.store, ttl=0)
+        cache.set("a", 1)
+
+        self.assertIsNone(self.second.get("a"))
+
+    def test_without_store(self):
+        cache = SharedTTLCache("test", None, ttl=10, timer=self.timer)
+        cache.set("a", 1)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["shared_hits"], 0)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires fork")
+    def test_forked_worker(self):
+        # Opens the connection the child inherits
+        self.first.get("a")
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                self.first.set("a", "from the child")
+                status = 0
+            finally:
+                os._exit(status)
+        _, status = os.waitpid(pid, 0)
+
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        self.assertEqual(self.first.get("a"), "from the child")
+
+
+if __name__ == "__main__":
+    unittest.main()
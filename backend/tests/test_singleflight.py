@@ -0,0 +1,232 @@
+import asyncio
+import threading
+import unittest
+import sys
+import os
+
+# Add the parent directory to the path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import deadline
+from singleflight import SingleFlight
+from throttle import DeadlineExceeded
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.flight = SingleFlight()
+
+    def run_concurrently(self, key, fn, callers=5):
+        results = []
+        errors = []
+
+        def worker():
+            try:
+                results.append(self.flight.do(key, fn))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        return threads, results, errors
+
+    def test_concurrent_calls_are_coalesced(self):
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return {"activityId": 1}
+
+        threads, results, errors = self.run_concurrently("latest", fetch)
+        # Wait until every follower is blocked on the leader's call
+        while self.flight.coalesced < 4:
+            pass
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"activityId": 1}] * 5)
+        self.assertEqual(self.flight.stats(), {"calls": 1, "coalesced": 4, "in_flight": 0})
+
+    def test_errors_are_shared(self):
+        release = threading.Event()
+
+        def fetch():
+            release.wait(5)
+            raise ValueError("API error")
+
+        threads, results, errors = self.run_concurrently("latest", fetch, callers=3)
+        while self.flight.coalesced < 2:
+            pass
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(errors), 3)
+        self.assertEqual(results, [])
+
+    def test_follower_waits_until_its_own_deadline(self):
+        release = threading.Event()
+        started = threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return 1
+
+        leader = threading.Thread(target=self.flight.do, args=("latest", slow))
+        leader.start()
+        started.wait(5)
+        token = deadline.start(0.05)
+        try:
+            with self.assertRaises(DeadlineExceeded):
+                self.flight.do("latest", slow)
+        finally:
+            deadline.reset(token)
+            release.set()
+            leader.join()
+
+    def test_follower_with_time_left_outlives_leader_deadline(self):
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            if len(calls) == 1:
+                # The leader's client asked for less time than the follower's
+                release.wait(5)
+                raise DeadlineExceeded()
+            return {"activityId": 1}
+
+        leader_errors = []
+
+        def lead():
+            try:
+                self.flight.do("latest", fetch)
+            except DeadlineExceeded as e:
+                leader_errors.append(e)
+
+        leader = threading.Thread(target=lead)
+        leader.start()
+        while not calls:
+            pass
+        results = []
+        token = deadline.start(30)
+        try:
+            follower = threading.Thread(
+                target=deadline.bound(lambda: results.append(self.flight.do("latest", fetch)))
+            )
+            follower.start()
+            while self.flight.coalesced < 1:
+                pass
+            release.set()
+            follower.join()
+        finally:
+            deadline.reset(token)
+        leader.join()
+
+        self.assertEqual(len(leader_errors), 1)
+        self.assertEqual(results, [{"activityId": 1}])
+        self.assertEqual(len(calls), 2)
+
+    def test_async_follower_outlives_leader_deadline(self):
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            if len(calls) == 1:
+                raise DeadlineExceeded()
+            return [1]
+
+        async def follow():
+            await asyncio.sleep(0)
+            token = deadline.start(30)
+            try:
+                return await self.flight.do_async("activities", fetch)
+            finally:
+                deadline.reset(token)
+
+        async def main():
+            return await asyncio.gather(
+                self.flight.do_async("activities", fetch), follow(), return_exceptions=True
+            )
+
+        leader, follower = asyncio.run(main())
+
+        self.assertIsInstance(leader, DeadlineExceeded)
+        self.assertEqual(follower, [1])
+        self.assertEqual(len(calls), 2)
+
+    def test_async_follower_waits_until_its_own_deadline(self):
+        async def slow():
+            await asyncio.sleep(1)
+            return 1
+
+        async def follow():
+            await asyncio.sleep(0)
+            token = deadline.start(0.05)
+            try:
+                return await self.flight.do_async("activities", slow)
+            finally:
+                deadline.reset(token)
+
+        async def main():
+            leader = asyncio.ensure_future(self.flight.do_async("activities", slow))
+            try:
+                return await follow()
+            finally:
+                leader.cancel()
+
+        with self.assertRaises(DeadlineExceeded):
+            asyncio.run(main())
+
+    def test_sequential_calls_are_not_coalesced(self):
+        self.assertEqual(self.flight.do("latest", lambda: 1), 1)
+        self.assertEqual(self.flight.do("latest", lambda: 2), 2)
+        self.assertEqual(self.flight.calls, 2)
+        self.assertEqual(self.flight.coalesced, 0)
+
+    def test_async_calls_are_coalesced(self):
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return [1, 2, 3]
+
+        async def main():
+            return await asyncio.gather(
+                *(self.flight.do_async("activities", fetch) for _ in range(4)),
+                self.flight.do_async("other", fetch),
+            )
+
+        results = asyncio.run(main())
+
+        self.assertEqual(results, [[1, 2, 3]] * 5)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.flight.coalesced, 3)
+
+    def test_async_errors_are_shared(self):
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise ValueError("API error")
+
+        async def main():
+            return await asyncio.gather(
+                *(self.flight.do_async("activities", fetch) for _ in range(3)),
+                return_exceptions=True,
+            )
+
+        results = asyncio.run(main())
+
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(self.flight.stats()["in_flight"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import datetime
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+# Add the parent directory to the path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import app, response_cache
+from stats import (
+    aggregate,
+    load_months,
+    month_is_closed,
+    months_between,
+    parse_percentiles,
+    parse_period,
+    percentile,
+    stats_cache,
+)
+
+
+def make_activity(date, type_key="running", distance=1000.0, duration=600.0):
+    return {
+        "startTimeLocal": f"{date} 08:00:00",
+        "activityType": {"typeKey": type_key},
+        "distance": distance,
+        "duration": duration,
+    }
+
+
+HISTORY = [
+    make_activity("2024-03-02", "cycling", 20000.0, 3600.0),
+    make_activity("2024-02-27", distance=5000.0),
+    make_activity("2024-02-03", distance=3000.0),
+    make_activity("2024-01-30", distance=None),
+    make_activity("2024-01-02", distance=1000.0),
+    make_activity("2023-12-31", distance=42000.0),
+]
+
+
+class TestStatsHelpers(unittest.TestCase):
+    def setUp(self):
+        stats_cache.clear()
+
+    def test_percentile(self):
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2.5)
+        self.assertEqual(percentile([1, 2, 3, 4], 100), 4)
+        self.assertEqual(percentile([7], 90), 7)
+        self.assertIsNone(percentile([], 50))
+
+    def test_parsing(self):
+        self.assertEqual(parse_percentiles("50, 99.9"), (50.0, 99.9))
+        with self.assertRaises(ValueError):
+            parse_percentiles("101")
+        first, last = parse_period(None, None, today=datetime.date(2023, 12, 31))
+        self.assertEqual((first, last), (datetime.date(2023, 1, 1), datetime.date(2023, 12, 31)))
+        with self.assertRaises(ValueError):
+            parse_period("2024-02-01", "2024-01-01")
+
+    def test_months(self):
+        self.assertEqual(
+            months_between(datetime.date(2023, 11, 15), datetime.date(2024, 1, 1)),
+            ["2023-11", "2023-12", "2024-01"],
+        )
+        utc = datetime.timezone.utc
+        self.assertTrue(month_is_closed("2023-12", datetime.datetime(2024, 1, 1, 12, tzinfo=utc)))
+        self.assertFalse(month_is_closed("2023-12", datetime.datetime(2024, 1, 1, 11, tzinfo=utc)))
+
+    def test_aggregate_by_month(self):
+        months = load_months("runner42", ["2024-01", "2024-02"], iter(HISTORY))
+
+        groups = aggregate(
+            months, datetime.date(2024, 1, 1), datetime.date(2024, 2, 29), "month", (50,)
+        )
+
+        self.assertEqual([g["key"] for g in groups], ["2024-01", "2024-02"])
+        self.assertEqual(groups[0]["count"], 2)
+        self.assertEqual(groups[0]["distance"], {"sum": 1000.0, "mean": 1000.0, "p50": 1000.0})
+        self.assertEqual(groups[1]["distance"], {"sum": 8000.0, "mean": 4000.0, "p50": 4000.0})
+        self.assertEqual(groups[1]["duration"]["sum"], 1200.0)
+
+    def test_aggregate_by_type_and_week(self):
+        months = load_months("runner42", ["2024-02", "2024-03"], iter(HISTORY))
+        first, last = datetime.date(2024, 2, 1), datetime.date(2024, 3, 31)
+
+        by_type = aggregate(months, first, last, "type")
+        by_week = aggregate(months, first, last, "week")
+
+        self.assertEqual(
+            [(g["key"], g["count"]) for g in by_type], [("running", 2), ("cycling", 1)]
+        )
+        self.assertEqual([g["key"] for g in by_week], ["2024-W05", "2024-W09"])
+        self.assertEqual(by_week[1]["count"], 2)
+
+    def test_closed_months_cached(self):
+        read = []
+
+        def activities():
+            for activity in HISTORY:
+                read.append(activity)
+                yield activity
+
+        load_months("runner42", ["2024-01", "2024-02"], activities())
+        self.assertEqual(len(read), 6)
+
+        read.clear()
+        months = load_months("runner42", ["2024-01", "2024-02", "2024-03"], activities())
+
+        self.assertEqual(read, [])
+        self.assertEqual(len(months["2024-03"]), 1)
+
+
+class TestStatsRoute(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.app = app.test_client()
+        self.headers = {"Authorization": "Bearer test_token_123"}
+        response_cache.clear()
+        stats_cache.clear()
+
+    @patch("app.login_with_token")
+    def test_activity_stats(self, mock_login):
+        mock_garmin = MagicMock()
+        mock_garmin.display_name = "runner42"
+        mock_garmin.iter_activities.return_value = iter(HISTORY)
+        mock_login.return_value = mock_garmin
+
+        response = self.app.get(
+            "/activities/stats?start=2024-01-01&end=2024-03-31&group=type&percentiles=90",
+            headers=self.headers,
+        )
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data["group"], "type")
+        self.assertEqual(data["start"], "2024-01-01")
+        self.assertEqual([g["key"] for g in data["groups"]], ["running", "cycling"])
+        self.assertEqual(data["groups"][0]["count"], 4)
+        self.assertEqual(sorted(data["groups"][0]["distance"]), ["mean", "p90", "sum"])
+
+    def test_activity_stats_invalid_group(self):
+        response = self.app.get("/activities/stats?group=year", headers=self.headers)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("'group'", json.loads(response.data)["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+import datetime
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+# Add the parent directory to the path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import app, response_cache
+from summaries import (
+    columnar,
+    day_is_over,
+    fetch_summaries,
+    parse_date_range,
+    parse_summary_fields,
+    rate_budget_days,
+    summary_cache,
+)
+from throttle import UpstreamUnavailable
+
+
+def make_summary(day):
+    return {"calendarDate": day, "totalSteps": int(day[-2:]) * 1000, "restingHeartRate": 50}
+
+
+def make_garmin(fail_on=None):
+    garmin = MagicMock()
+    garmin.display_name = "runner42"
+
+    def get_user_summaries(days, concurrency, on_summary=None):
+        summaries = []
+        for day in days:
+            if day == fail_on:
+                raise TimeoutError(day)
+            summaries.append(make_summary(day))
+            if on_summary is not None:
+                on_summary(day, summaries[-1])
+        return summaries
+
+    garmin.get_user_summaries.side_effect = get_user_summaries
+    return garmin
+
+
+class TestSummaryHelpers(unittest.TestCase):
+    def test_parse_date_range(self):
+        self.assertEqual(
+            parse_date_range("2024-02-28", "2024-03-01"),
+            ["2024-02-28", "2024-02-29", "2024-03-01"],
+        )
+        for start, end in [(None, "2024-01-01"), ("2024-01-02", "2024-01-01"), ("01/01", "x")]:
+            with self.assertRaises(ValueError):
+                parse_date_range(start, end)
+        with self.assertRaises(ValueError):
+            parse_date_range("2020-01-01", "2024-01-01")
+
+    def test_day_is_over(self):
+        utc = datetime.timezone.utc
+        self.assertTrue(day_is_over("2024-01-01", datetime.datetime(2024, 1, 2, 12, tzinfo=utc)))
+        self.assertFalse(day_is_over("2024-01-01", datetime.datetime(2024, 1, 2, 11, tzinfo=utc)))
+
+    def test_columnar(self):
+        days = ["2024-01-01", "2024-01-02"]
+        summaries = {"2024-01-01": make_summary("2024-01-01"), "2024-01-02": {"extra": 1}}
+
+        self.assertEqual(
+            columnar(days, summaries, ("totalSteps",)),
+            {"calendarDate": days, "totalSteps": [1000, None]},
+        )
+        self.assertEqual(
+            list(columnar(days, summaries, parse_summary_fields("all"))),
+            ["calendarDate", "totalSteps", "restingHeartRate", "extra"],
+        )
+
+    def test_past_days_cached(self):
+        summary_cache.clear()
+        garmin = make_garmin()
+        today = datetime.date.today().isoformat()
+        days = ["2024-01-01", "2024-01-02", today]
+
+        fetch_summaries(garmin, days)
+        summaries = fetch_summaries(garmin, days)
+
+        self.assertEqual(summaries[today]["calendarDate"], today)
+        self.assertEqual(garmin.get_user_summaries.call_args_list[1].args[0], [today])
+        self.assertEqual(len(summary_cache), 2)
+
+    def test_days_cached_before_failure(self):
+        summary_cache.clear()
+        days = ["2024-01-01", "2024-01-02", "2024-01-03"]
+
+        with self.assertRaises(TimeoutError):
+            fetch_summaries(make_garmin(fail_on="2024-01-03"), days)
+        garmin = make_garmin()
+        fetch_summaries(garmin, days)
+
+        # The retry only fetches the day the failed request did not get to
+        self.assertEqual(garmin.get_user_summaries.call_args.args[0], ["2024-01-03"])
+
+    def test_rate_budget_days(self):
+        self.assertEqual(rate_budget_days(30, rate=10, burst=20), 320)
+        self.assertEqual(rate_budget_days(-1, rate=10, burst=20), 20)
+        self.assertIsNone(rate_budget_days(None, rate=10, burst=20))
+        self.assertIsNone(rate_budget_days(30, rate=0, burst=20))
+
+    def test_range_not_limited_by_rate_budget(self):
+        self.assertEqual(len(parse_date_range("2024-01-01", "2024-12-31")), 366)
+
+    @patch("summaries.rate_budget_days", return_value=2)
+    def test_days_over_budget_fetched_on_retry(self, mock_budget):
+        summary_cache.clear()
+        days = ["2024-01-01", "2024-01-02", "2024-01-03"]
+        garmin = make_garmin()
+
+        with self.assertRaises(UpstreamUnavailable) as raised:
+            fetch_summaries(garmin, days)
+        summaries = fetch_summaries(garmin, days)
+
+        self.assertEqual(raised.exception.status, 503)
+        self.assertEqual(raised.exception.retry_after, 2.0)
+        self.assertEqual(
+            [call.args[0] for call in garmin.get_user_summaries.call_args_list],
+            [days[:2], days[2:]],
+        )
+        self.assertEqual(list(summaries), days)
+
+
+class TestSummariesRoute(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.app = app.test_client()
+        self.headers = {"Authorization": "Bearer test_token_123"}
+        response_cache.clear()
+        summary_cache.clear()
+
+    @patch("app.login_with_token")
+    def test_get_summaries(self, mock_login):
+        mock_login.return_value = make_garmin()
+
+        response = self.app.get(
+            "/summaries?start=2024-01-01&end=2024-01-03&fields=totalSteps", headers=self.headers
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            json.loads(response.data),
+            {
+                "calendarDate": ["2024-01-01", "2024-01-02", "2024-01-03"],
+                "totalSteps": [1000, 2000, 3000],
+            },
+        )
+
+    def test_get_summaries_invalid_range(self):
+        response = self.app.get("/summaries?start=2024-01-03&end=2024-01-01", headers=self.headers)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            json.loads(response.data)["error"], "Parameter 'start' must not be after 'end'"
+        )
+
+    def test_get_summaries_no_auth(self):
+        response = self.app.get("/summaries?start=2024-01-01&end=2024-01-01")
+
+        self.assertEqual(response.status_code, 401)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,251 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+import requests
+
+# Add the parent directory to the path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from garth.exc import GarthHTTPError
+
+import deadline
+from throttle import (
+    CircuitBreaker,
+    DeadlineExceeded,
+    RateLimiter,
+    TokenBucket,
+    UpstreamPolicy,
+    UpstreamUnavailable,
+    retry_after_seconds,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def http_error(status, retry_after=None):
+    response = requests.Response()
+    response.status_code = status
+    if retry_after is not None:
+        response.headers["Retry-After"] = retry_after
+    return GarthHTTPError(msg="Error in request", error=requests.HTTPError(response=response))
+
+
+class TestTokenBucket(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(rate=2, burst=3, timer=self.clock)
+
+    def test_burst_then_rate(self):
+        self.assertEqual([self.bucket.reserve() for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(self.bucket.reserve(), 0.5)
+        self.assertAlmostEqual(self.bucket.reserve(), 1.0)
+
+        self.clock.now += 10
+        self.assertEqual(self.bucket.reserve(), 0.0)
+
+    def test_max_wait_does_not_reserve(self):
+        for _ in range(3):
+            self.bucket.reserve()
+
+        self.assertAlmostEqual(self.bucket.reserve(max_wait=0.1), 0.5)
+        self.assertAlmostEqual(self.bucket.reserve(), 0.5)
+
+    def test_pause(self):
+        self.bucket.pause(5)
+
+        self.assertAlmostEqual(self.bucket.reserve(), 5.0)
+
+    def test_unlimited(self):
+        bucket = TokenBucket(rate=0, burst=1, timer=self.clock)
+
+        self.assertEqual([bucket.reserve() for _ in range(100)], [0.0] * 100)
+
+    def test_rate_limiter_accounts_are_independent(self):
+        limiter = RateLimiter(account_rate=1, account_burst=1, process_rate=0, timer=self.clock)
+
+        self.assertEqual(limiter.reserve("a"), 0.0)
+        self.assertEqual(limiter.reserve("b"), 0.0)
+        self.assertAlmostEqual(limiter.reserve("a"), 1.0)
+
+    def test_rate_limiter_refunds_account_when_process_rejects(self):
+        limiter = RateLimiter(
+            account_rate=1, account_burst=2, process_rate=1, process_burst=1, timer=self.clock
+        )
+        limiter.reserve("a")
+
+        self.assertAlmostEqual(limiter.reserve("b", max_wait=0), 1.0)
+        self.assertAlmostEqual(limiter.reserve("b", max_wait=0), 1.0)
+        # Both rejected calls left account 'b' its full burst
+        self.clock.now += 1
+        self.assertEqual(limiter.account("b").reserve(), 0.0)
+        self.assertEqual(limiter.account("b").reserve(), 0.0)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, timer=self.clock)
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.breaker.check()
+
+        self.breaker.record_failure()
+
+        with self.assertRaises(UpstreamUnavailable) as raised:
+            self.breaker.check()
+        self.assertEqual(raised.exception.retry_after, 30)
+
+    def test_half_open_probe(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.now += 31
+
+        self.breaker.check()
+        with self.assertRaises(UpstreamUnavailable):
+            self.breaker.check()
+
+        self.breaker.record_success()
+        self.breaker.check()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_failed_probe_reopens(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.clock.now += 31
+        self.breaker.check()
+
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(UpstreamUnavailable):
+            self.breaker.check()
+
+
+class TestUpstreamPolicy(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.policy = UpstreamPolicy(
+            limiter=RateLimiter(process_rate=0, timer=self.clock),
+            breaker=CircuitBreaker(failure_threshold=3, timer=self.clock),
+            retries=2,
+            backoff=1,
+            rng=lambda: 0.5,
+        )
+
+    def test_retry_after_header(self):
+        self.assertEqual(retry_after_seconds("7"), 7.0)
+        self.assertEqual(retry_after_seconds("Wed, 21 Oct 2015 07:28:10 GMT", now=1445412480), 10)
+        self.assertIsNone(retry_after_seconds("soon"))
+
+    @patch("throttle.time.sleep")
+    def test_retries_with_jittered_backoff(self, mock_sleep):
+        fn = MagicMock(side_effect=[http_error(503), http_error(502), "ok"])
+
+        self.assertEqual(self.policy.call("a", fn), "ok")
+        self.assertEqual([c.args[0] for c in mock_sleep.call_args_list], [0.5, 1.0])
+        self.assertEqual(self.policy.breaker.failures, 0)
+
+    @patch("throttle.time.sleep")
+    def test_honours_retry_after(self, mock_sleep):
+        fn = MagicMock(side_effect=[http_error(503, retry_after="2"), "ok"])
+
+        self.policy.call("a", fn)
+
+        mock_sleep.assert_called_once_with(2.0)
+
+    @patch("throttle.time.sleep")
+    def test_429_pauses_account(self, mock_sleep):
+        fn = MagicMock(side_effect=[http_error(429, retry_after="3"), "ok"])
+
+        self.policy.call("a", fn)
+
+        mock_sleep.assert_called_once_with(3.0)
+        self.assertEqual(self.policy.limiter.reserve("b"), 0.0)
+
+    @patch("throttle.time.sleep")
+    def test_429_does_not_open_circuit(self, mock_sleep):
+        fn = MagicMock(side_effect=http_error(429))
+
+        for _ in range(2):
+            with self.assertRaises(GarthHTTPError):
+                self.policy.call("a", fn)
+
+        self.assertEqual(self.policy.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.policy.breaker.failures, 0)
+
+    @patch("throttle.time.sleep")
+    def test_long_retry_after_fails_fast(self, mock_sleep):
+        fn = MagicMock(side_effect=http_error(503, retry_after="60"))
+
+        with self.assertRaises(UpstreamUnavailable) as raised:
+            self.policy.call("a", fn)
+
+        self.assertEqual(raised.exception.retry_after, 60)
+        mock_sleep.assert_not_called()
+
+    @patch("throttle.time.sleep")
+    def test_client_errors_not_retried(self, mock_sleep):
+        fn = MagicMock(side_effect=http_error(404))
+
+        with self.assertRaises(GarthHTTPError):
+            self.policy.call("a", fn)
+
+        self.assertEqual(fn.call_count, 1)
+        self.assertEqual(self.policy.breaker.failures, 0)
+
+    @patch("throttle.time.sleep")
+    def test_circuit_opens_and_fails_fast(self, mock_sleep):
+        fn = MagicMock(side_effect=http_error(500))
+
+        with self.assertRaises(GarthHTTPError):
+            self.policy.call("a", fn)
+        self.assertEqual(fn.call_count, 3)
+
+        with self.assertRaises(UpstreamUnavailable):
+            self.policy.call("a", fn)
+        self.assertEqual(fn.call_count, 3)
+
+    def test_deadline_passed_fails_fast(self):
+        self.addCleanup(deadline.reset, deadline.start(-1))
+        fn = MagicMock(return_value="ok")
+
+        with self.assertRaises(DeadlineExceeded) as raised:
+            self.policy.call("a", fn)
+        self.assertEqual(raised.exception.status, 504)
+        fn.assert_not_called()
+
+    def test_timeout_at_deadline_is_not_a_failure(self):
+        self.addCleanup(deadline.reset, deadline.start(10))
+
+        def fn():
+            # The deadline passes while the call is in flight
+            deadline.start(-1)
+            raise requests.ReadTimeout()
+
+        with self.assertRaises(DeadlineExceeded):
+            self.policy.call("a", fn)
+        self.assertEqual(self.policy.breaker.failures, 0)
+
+    @patch("throttle.time.sleep")
+    def test_no_retry_past_deadline(self, mock_sleep):
+        self.addCleanup(deadline.reset, deadline.start(1))
+        fn = MagicMock(side_effect=[http_error(503, retry_after="2"), "ok"])
+
+        with self.assertRaises(DeadlineExceeded):
+            self.policy.call("a", fn)
+        mock_sleep.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
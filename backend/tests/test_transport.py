@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+# Add the parent directory to the path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import garth
+from garth.auth_tokens import OAuth1Token, OAuth2Token
+from garmin_client import GarminClient
+import requests
+from requests.adapters import HTTPAdapter
+
+from transport import AsyncTransport, PooledGarthClient, SharedTransport, UpstreamAdapter
+
+
+class TestSharedTransport(unittest.TestCase):
+    def setUp(self):
+        self.transport = SharedTransport(pool_connections=4, pool_maxsize=8)
+
+    def tearDown(self):
+        self.transport.close()
+
+    def test_adapter_per_domain(self):
+        com = self.transport.adapter("garmin.com")
+
+        self.assertIs(self.transport.adapter("garmin.com"), com)
+        self.assertIsNot(self.transport.adapter("garmin.cn"), com)
+
+    def test_clients_share_adapter(self):
+        first = GarminClient(transport=self.transport)
+        second = GarminClient(transport=self.transport)
+
+        adapter = self.transport.adapter("garmin.com")
+        self.assertIs(first.garth.sess.get_adapter("https://connectapi.garmin.com"), adapter)
+        self.assertIs(second.garth.sess.get_adapter("https://connectapi.garmin.com"), adapter)
+        self.assertIsNot(first.garth.sess, second.garth.sess)
+
+    def test_reconfigure_keeps_shared_adapter(self):
+        client = GarminClient(transport=self.transport)
+
+        client.garth.configure(domain="garmin.cn")
+
+        self.assertIs(
+            client.garth.sess.get_adapter("https://connectapi.garmin.cn"),
+            self.transport.adapter("garmin.cn"),
+        )
+
+    def test_read_timeouts_not_retried(self):
+        retry = self.transport.adapter("garmin.com").max_retries
+
+        # A timed out read is left to UpstreamPolicy, which knows the request's deadline
+        self.assertIs(retry.read, False)
+        self.assertEqual(retry.total, garth.Client.retries)
+
+    def test_concurrent_clients_keep_their_tokens(self):
+        barrier = threading.Barrier(2, timeout=5)
+        sent = {}
+
+        def make_client(access_token):
+            client = PooledGarthClient(transport=self.transport)
+            client.oauth1_token = OAuth1Token(oauth_token="token", oauth_token_secret="secret")
+            client.oauth2_token = OAuth2Token(
+                scope="",
+                jti="",
+                token_type="Bearer",
+                access_token=access_token,
+                refresh_token="",
+                expires_in=3600,
+                expires_at=int(time.time()) + 3600,
+                refresh_token_expires_in=3600,
+                refresh_token_expires_at=int(time.time()) + 3600,
+            )
+
+            def send(method, url, headers, **kwargs):
+                # Both clients have set their header before either request goes out
+                barrier.wait()
+                sent[access_token] = headers["Authorization"]
+                return MagicMock()
+
+            client.sess.request = send
+            return client
+
+        clients = [make_client("first"), make_client("second")]
+        threads = [
+            threading.Thread(target=client.connectapi, args=("/userprofile-service",))
+            for client in clients
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sent, {"first": "Bearer first", "second": "Bearer second"})
+
+    def test_stats(self):
+        adapter = self.transport.adapter("garmin.com")
+        pool = adapter.poolmanager.connection_from_host("connectapi.garmin.com", 443, "https")
+        pool.num_connections = 2
+        pool.num_requests = 10
+
+        stats = self.transport.stats()
+
+        self.assertEqual(stats["pool_maxsize"], 8)
+        host = stats["hosts"]["https://connectapi.garmin.com"]
+        self.assertEqual(host["domain"], "garmin.com")
+        self.assertEqual(host["maxsize"], 8)
+        self.assertEqual(host["in_use"], 0)
+        self.assertEqual(host["reused"], 8)
+        self.assertEqual(host["saturation"], 0.0)
+
+
+class TestUpstreamOverride(unittest.TestCase):
+    def test_requests_sent_to_upstream_url(self):
+        transport = SharedTransport(upstream_url="http://127.0.0.1:8089")
+        adapter = transport.adapter("garmin.com")
+        request = requests.Request(
+            "GET", "https://connectapi.garmin.com/activitylist-service/activities?limit=1"
+        ).prepare()
+
+        with patch.object(HTTPAdapter, "send") as mock_send:
+            adapter.send(request)
+
+        self.assertIsInstance(adapter, UpstreamAdapter)
+        sent = mock_send.call_args[0][0]
+        self.assertEqual(sent.url, "http://127.0.0.1:8089/activitylist-service/activities?limit=1")
+
+    def test_async_clients_use_upstream_url(self):
+        transport = AsyncTransport(upstream_url="http://127.0.0.1:8089")
+
+        async def base_url():
+            client = transport.client("garmin.com")
+            await transport.aclose()
+            return client.base_url
+
+        self.assertEqual(str(asyncio.run(base_url())), "http://127.0.0.1:8089")
+
+
+if __name__ == "__main__":
+    unittest.main()
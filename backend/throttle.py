@@ -0,0 +1,401 @@
+"""
+Rate limiting, retry backoff and circuit breaking of Garmin Connect calls.
+
+Calls made for a request also respect its deadline (see deadline.py): they are
+neither delayed nor retried past it, and a call that timed out because the
+deadline ran out does not count as a Garmin failure.
+"""
+
+import asyncio
+import email.utils
+import logging
+import math
+import os
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+import httpx
+import requests
+from garth.exc import GarthHTTPError
+
+import deadline
+from metrics import upstream_rejections, upstream_retries
+
+logger = logging.getLogger(__name__)
+
+# Sustained upstream requests per second and burst size, per account and per process (0 = off)
+UPSTREAM_ACCOUNT_RATE = float(os.getenv("UPSTREAM_ACCOUNT_RATE", "10"))
+UPSTREAM_ACCOUNT_BURST = int(os.getenv("UPSTREAM_ACCOUNT_BURST", "20"))
+UPSTREAM_PROCESS_RATE = float(os.getenv("UPSTREAM_PROCESS_RATE", "100"))
+UPSTREAM_PROCESS_BURST = int(os.getenv("UPSTREAM_PROCESS_BURST", "200"))
+# Longest a call waits for the rate limiter or a retry before failing with a 503
+UPSTREAM_MAX_WAIT = float(os.getenv("UPSTREAM_MAX_WAIT", "5"))
+# Retries of throttled or failed calls, with full-jitter exponential backoff
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "3"))
+UPSTREAM_BACKOFF = float(os.getenv("UPSTREAM_BACKOFF", "0.5"))
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "4"))
+# Consecutive failures that open the circuit, and seconds before a probe call is let through
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+
+# Statuses meaning Garmin is throttling us or unhealthy
+RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling Garmin Connect while it is throttling us or unhealthy."""
+
+    # HTTP status of the response telling the client to retry
+    status = 503
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    """Raised when the request's deadline passes before Garmin Connect answered."""
+
+    status = 504
+
+    def __init__(self, message: str = "Request deadline exceeded waiting for Garmin Connect"):
+        super().__init__(message, 0.0)
+
+
+def retry_after_seconds(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Parse a Retry-After header given as seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(date.timestamp() - (time.time() if now is None else now), 0.0)
+
+
+def upstream_failure(error: BaseException) -> Tuple[Optional[int], Optional[float], bool]:
+    """
+    Classify an exception raised by an upstream call.
+    :return: HTTP status (if any), Retry-After in seconds (if any), and whether
+        the request failed at the transport level
+    """
+    if isinstance(error, GarthHTTPError):
+        error = error.error
+    response = getattr(error, "response", None)
+    if isinstance(error, (requests.HTTPError, httpx.HTTPStatusError)) and response is not None:
+        return response.status_code, retry_after_seconds(response.headers.get("Retry-After")), False
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, httpx.TransportError)):
+        return None, None, True
+    return None, None, False
+
+
+def timed_out(error: BaseException) -> bool:
+    """Tell whether an upstream call failed because its timeout elapsed."""
+    return isinstance(error, (requests.Timeout, httpx.TimeoutException))
+
+
+def deadline_passed() -> bool:
+    left = deadline.remaining()
+    return left is not None and left <= 0
+
+
+class TokenBucket:
+    """
+    Token bucket, implemented as the generic cell rate algorithm.
+
+    Callers reserve a slot and are told how long to wait for it, so bursts are
+    spread out instead of rejected.
+    """
+
+    def __init__(self, rate: float, burst: int, timer: Callable[[], float] = time.monotonic):
+        """
+        Initialize the bucket.
+        :param rate: Sustained calls per second, 0 for no limit
+        :param burst: Calls allowed back to back before the rate applies
+        """
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._timer = timer
+        self._interval = 1 / rate if rate > 0 else 0.0
+        self._tolerance = (self.burst - 1) * self._interval
+        self._tat = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: float = math.inf) -> float:
+        """
+        Reserve a call slot and return the seconds to wait before using it.
+        Nothing is reserved when the wait would exceed 'max_wait'.
+        """
+        if not self._interval:
+            return 0.0
+        with self._lock:
+            now = self._timer()
+            tat = max(self._tat, now)
+            wait = max(tat - self._tolerance - now, 0.0)
+            if wait <= max_wait:
+                self._tat = tat + self._interval
+            return wait
+
+    def refund(self) -> None:
+        """Give back the last slot reserved, for a call that is not made after all."""
+        if not self._interval:
+            return
+        with self._lock:
+            self._tat -= self._interval
+
+    def pause(self, seconds: float) -> None:
+        """Hold every call back for 'seconds', e.g. after a 429 with Retry-After."""
+        with self._lock:
+            until = self._timer() + seconds
+            self._tat = max(self._tat, until + self._tolerance)
+
+
+class RateLimiter:
+    """Token buckets for the whole process and for each upstream account."""
+
+    def __init__(
+        self,
+        account_rate: float = UPSTREAM_ACCOUNT_RATE,
+        account_burst: int = UPSTREAM_ACCOUNT_BURST,
+        process_rate: float = UPSTREAM_PROCESS_RATE,
+        process_burst: int = UPSTREAM_PROCESS_BURST,
+        max_accounts: int = 4096,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.account_rate = account_rate
+        self.account_burst = account_burst
+        self.max_accounts = max_accounts
+        self.process = TokenBucket(process_rate, process_burst, timer)
+        self._timer = timer
+        self._accounts: Dict[Hashable, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def account(self, account: Hashable) -> TokenBucket:
+        """Return the bucket of 'account', creating it on first use."""
+        bucket = self._accounts.get(account)
+        if bucket is None:
+            with self._lock:
+                bucket = self._accounts.get(account)
+                if bucket is None:
+                    if len(self._accounts) >= self.max_accounts:
+                        # Drop the oldest bucket; it refills to a full burst anyway
+                        self._accounts.pop(next(iter(self._accounts)))
+                    bucket = TokenBucket(self.account_rate, self.account_burst, self._timer)
+                    self._accounts[account] = bucket
+        return bucket
+
+    def reserve(self, account: Hashable, max_wait: float = math.inf) -> float:
+        """Reserve a call for 'account' and return the seconds to wait before making it."""
+        bucket = self.account(account)
+        wait = bucket.reserve(max_wait)
+        if wait > max_wait:
+            return wait
+        process_wait = self.process.reserve(max_wait)
+        if process_wait > max_wait:
+            # The call is rejected, so it must not use up the account's allowance
+            bucket.refund()
+        return max(wait, process_wait)
+
+
+class CircuitBreaker:
+    """
+    Fail fast while Garmin Connect keeps failing.
+
+    After 'failure_threshold' consecutive failures the circuit opens and calls
+    are rejected. Once 'reset_timeout' has passed, one probe call is let
+    through; its success closes the circuit and its failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = CIRCUIT_RESET_TIMEOUT,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._timer = timer
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Close the circuit and forget past failures."""
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._opened_at = 0.0
+            self._probe_started = 0.0
+
+    def check(self) -> None:
+        """Raise UpstreamUnavailable unless a call may go through now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            now = self._timer()
+            if self.state == self.OPEN:
+                remaining = self._opened_at + self.reset_timeout - now
+                if remaining > 0:
+                    raise UpstreamUnavailable("Garmin Connect is unavailable", remaining)
+                self.state = self.HALF_OPEN
+            elif now - self._probe_started < self.reset_timeout:
+                # A probe is in flight; a probe that never reported back is replaced
+                raise UpstreamUnavailable("Garmin Connect is unavailable", self.reset_timeout)
+            self._probe_started = now
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Opening circuit after {self.failures} upstream failures")
+                self.state = self.OPEN
+                self._opened_at = self._timer()
+
+
+class UpstreamPolicy:
+    """Rate limiter, retries with backoff and circuit breaker applied to every upstream call."""
+
+    def __init__(
+        self,
+        limiter: Optional[RateLimiter] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        retries: int = UPSTREAM_RETRIES,
+        backoff: float = UPSTREAM_BACKOFF,
+        backoff_max: float = UPSTREAM_BACKOFF_MAX,
+        max_wait: float = UPSTREAM_MAX_WAIT,
+        rng: Callable[[], float] = random.random,
+    ):
+        self.limiter = limiter or RateLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.max_wait = max_wait
+        self._rng = rng
+
+    def admit(self, account: Hashable) -> float:
+        """
+        Check the circuit and reserve a rate limit slot, returning the seconds to wait.
+        Nothing is reserved for a wait past the request's deadline.
+        """
+        left = deadline.remaining()
+        if left is not None and left <= 0:
+            upstream_rejections.inc("deadline")
+            raise DeadlineExceeded()
+        try:
+            self.breaker.check()
+        except UpstreamUnavailable:
+            upstream_rejections.inc("circuit_open")
+            raise
+        max_wait = self.max_wait if left is None else min(self.max_wait, left)
+        wait = self.limiter.reserve(account, max_wait)
+        if wait > self.max_wait:
+            upstream_rejections.inc("rate_limited")
+            raise UpstreamUnavailable("Too many requests to Garmin Connect", wait)
+        if wait > max_wait:
+            upstream_rejections.inc("deadline")
+            raise DeadlineExceeded()
+        return wait
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before retry number 'attempt' + 1."""
+        return self._rng() * min(self.backoff_max, self.backoff * 2**attempt)
+
+    def failed(self, account: Hashable, error: BaseException, attempt: int) -> Optional[float]:
+        """
+        Record a failed call and decide whether to retry it.
+        :return: Seconds to wait before retrying, or None to give up
+        """
+        status, retry_after, transport_error = upstream_failure(error)
+        if transport_error and timed_out(error) and deadline_passed():
+            # The timeout was the request's deadline, not a sign of an unhealthy Garmin
+            raise DeadlineExceeded() from error
+        if not transport_error and status not in RETRY_STATUSES:
+            if status is not None:
+                # Garmin answered, e.g. 401 or 404, so it is healthy
+                self.breaker.record_success()
+            return None
+
+        if status != 429:
+            # A 429 throttles one account, which its pause below handles; counted here it
+            # would let one heavy user open the circuit for every account
+            self.breaker.record_failure()
+        # Connection failures were already retried by the transport
+        if transport_error or attempt >= self.retries:
+            return None
+
+        if status == 429 and retry_after is not None:
+            # The account is throttled, hold back its other calls too; admit() waits
+            self.limiter.account(account).pause(retry_after)
+            delay = 0.0
+        elif retry_after is not None:
+            delay = retry_after
+        else:
+            delay = self.backoff_delay(attempt)
+        if delay > self.max_wait:
+            raise UpstreamUnavailable("Garmin Connect asked us to retry later", delay) from error
+        left = deadline.remaining()
+        if left is not None and delay >= left:
+            raise DeadlineExceeded() from error
+        upstream_retries.inc()
+        return delay
+
+    def call(self, account: Hashable, fn: Callable[[], Any]) -> Any:
+        """Call 'fn' under the policy, sleeping between retries."""
+        attempt = 0
+        while True:
+            wait = self.admit(account)
+            if wait:
+                time.sleep(wait)
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self.failed(account, e, attempt)
+                if delay is None:
+                    raise
+                logger.warning(f"Retrying upstream call in {delay:.2f}s: {e}")
+                if delay:
+                    time.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def call_async(self, account: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await 'fn()' under the policy without blocking the event loop."""
+        attempt = 0
+        while True:
+            wait = self.admit(account)
+            if wait:
+                await asyncio.sleep(wait)
+            try:
+                result = await fn()
+            except Exception as e:
+                delay = self.failed(account, e, attempt)
+                if delay is None:
+                    raise
+                logger.warning(f"Retrying upstream call in {delay:.2f}s: {e}")
+                if delay:
+                    await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+
+upstream_policy = UpstreamPolicy()
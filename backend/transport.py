@@ -0,0 +1,238 @@
+"""Process-wide pooled HTTP transport shared by all Garmin clients."""
+
+import asyncio
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+import garth
+import garth.sso
+import httpx
+from garth.http import USER_AGENT
+from requests.adapters import HTTPAdapter, Retry
+
+import deadline
+
+GARMIN_POOL_CONNECTIONS = int(os.getenv("GARMIN_POOL_CONNECTIONS", "20"))
+GARMIN_POOL_MAXSIZE = int(os.getenv("GARMIN_POOL_MAXSIZE", "20"))
+GARMIN_POOL_BLOCK = os.getenv("GARMIN_POOL_BLOCK", "false").lower() in ("1", "true", "yes")
+# Upper bound of concurrent upstream connections per domain in async mode
+GARMIN_ASYNC_MAX_CONNECTIONS = int(os.getenv("GARMIN_ASYNC_MAX_CONNECTIONS", "200"))
+# Base URL that replaces https://<service>.<domain> for every Garmin request,
+# used to run against a local stand-in such as benchmarks/fake_garmin.py
+GARMIN_UPSTREAM_URL = os.getenv("GARMIN_UPSTREAM_URL")
+
+if GARMIN_UPSTREAM_URL:
+    # garth fetches its OAuth consumer with a plain requests.get, outside any session
+    garth.sso.OAUTH_CONSUMER_URL = f"{GARMIN_UPSTREAM_URL.rstrip('/')}/oauth_consumer.json"
+
+
+class UpstreamAdapter(HTTPAdapter):
+    """HTTPAdapter that sends requests to 'upstream_url' instead of their own host."""
+
+    def __init__(self, upstream_url: str, **kwargs):
+        self.upstream = urlsplit(upstream_url)
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        request.url = urlunsplit(
+            (self.upstream.scheme, self.upstream.netloc, url.path, url.query, url.fragment)
+        )
+        return super().send(request, **kwargs)
+
+
+class SharedTransport:
+    """
+    Keep-alive connection pools shared by every client in the process.
+
+    One HTTPAdapter (and therefore one urllib3 pool manager) is kept per Garmin
+    domain. Clients mount it on their own requests session, so cookies and
+    per-client auth headers stay private while TCP/TLS connections are reused.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = GARMIN_POOL_CONNECTIONS,
+        pool_maxsize: int = GARMIN_POOL_MAXSIZE,
+        pool_block: bool = GARMIN_POOL_BLOCK,
+        upstream_url: Optional[str] = GARMIN_UPSTREAM_URL,
+    ):
+        """
+        Initialize the transport.
+        :param upstream_url: (Optional) Base URL to send every request to instead of Garmin
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.upstream_url = upstream_url
+        self._adapters: Dict[str, HTTPAdapter] = {}
+        self._lock = threading.Lock()
+
+    def adapter(self, domain: str) -> HTTPAdapter:
+        """Return the shared adapter for 'domain', creating it on first use."""
+        adapter = self._adapters.get(domain)
+        if adapter is not None:
+            return adapter
+
+        with self._lock:
+            adapter = self._adapters.get(domain)
+            if adapter is None:
+                # Only connection failures are retried here; throttled and failed responses,
+                # and read timeouts, are left to GarminClient's UpstreamPolicy, under its rate
+                # limiter and the request's deadline
+                retry = Retry(
+                    total=garth.Client.retries,
+                    read=False,
+                    status_forcelist=(),
+                    backoff_factor=garth.Client.backoff_factor,
+                )
+                options = dict(
+                    max_retries=retry,
+                    pool_connections=self.pool_connections,
+                    pool_maxsize=self.pool_maxsize,
+                    pool_block=self.pool_block,
+                )
+                if self.upstream_url:
+                    adapter = UpstreamAdapter(self.upstream_url, **options)
+                else:
+                    adapter = HTTPAdapter(**options)
+                self._adapters[domain] = adapter
+            return adapter
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return per-host pool statistics.
+
+        'reused' counts requests served over an already open connection and
+        'saturation' is the share of the pool currently checked out.
+        """
+        hosts = {}
+        for domain, adapter in list(self._adapters.items()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None or pool.pool is None:
+                    continue
+                maxsize = pool.pool.maxsize
+                in_use = max(maxsize - pool.pool.qsize(), 0)
+                hosts[f"{pool.scheme}://{pool.host}"] = {
+                    "domain": domain,
+                    "maxsize": maxsize,
+                    "in_use": in_use,
+                    "idle": sum(1 for conn in list(pool.pool.queue) if conn is not None),
+                    "connections_created": pool.num_connections,
+                    "requests": pool.num_requests,
+                    "reused": max(pool.num_requests - pool.num_connections, 0),
+                    "saturation": in_use / maxsize if maxsize else 0.0,
+                }
+        return {
+            "pool_connections": self.pool_connections,
+            "pool_maxsize": self.pool_maxsize,
+            "pool_block": self.pool_block,
+            "hosts": hosts,
+        }
+
+    def close(self) -> None:
+        """Close every pooled connection."""
+        with self._lock:
+            for adapter in self._adapters.values():
+                adapter.close()
+            self._adapters.clear()
+
+
+class PooledGarthClient(garth.Client):
+    """
+    garth client that sends its requests through a SharedTransport.
+
+    Its timeout shrinks to the time left before the current request's deadline,
+    so every garth call, the OAuth exchange included, gives up in time.
+    """
+
+    transport: Optional[SharedTransport] = None
+    _timeout: float = garth.Client.timeout
+
+    def __init__(self, transport: Optional[SharedTransport] = None, **kwargs):
+        self.transport = transport
+        # garth configures itself with the timeout it reads back, which must not be shortened
+        token = deadline.start(None)
+        try:
+            super().__init__(**kwargs)
+        finally:
+            deadline.reset(token)
+
+    @property
+    def timeout(self) -> float:
+        return deadline.timeout(self._timeout)
+
+    @timeout.setter
+    def timeout(self, value: float):
+        self._timeout = value
+
+    def request(self, method: str, subdomain: str, path: str, /, headers=None, **kwargs):
+        # garth writes the bearer token into its mutable default 'headers', which every
+        # client in the process would otherwise share across threads
+        return super().request(method, subdomain, path, headers=dict(headers or {}), **kwargs)
+
+    def configure(self, /, **kwargs):
+        """Apply garth settings, then keep the shared adapter mounted for the current domain."""
+        super().configure(**kwargs)
+        if self.transport is not None:
+            self.sess.mount("https://", self.transport.adapter(self.domain))
+
+
+class AsyncTransport:
+    """
+    httpx connection pools shared by async clients.
+
+    One AsyncClient is kept per event loop and Garmin domain, so every
+    coroutine in a worker multiplexes over the same keep-alive connections.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = GARMIN_ASYNC_MAX_CONNECTIONS,
+        max_keepalive_connections: int = GARMIN_POOL_MAXSIZE,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        upstream_url: Optional[str] = GARMIN_UPSTREAM_URL,
+    ):
+        """
+        Initialize the transport.
+        :param transport: (Optional) httpx transport to send requests through, used by tests
+        :param upstream_url: (Optional) Base URL to send every request to instead of Garmin
+        """
+        self.upstream_url = upstream_url
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self._transport = transport
+        self._clients: Dict[Tuple[int, str], httpx.AsyncClient] = {}
+
+    def client(self, domain: str) -> httpx.AsyncClient:
+        """Return the AsyncClient for 'domain' bound to the running event loop."""
+        key = (id(asyncio.get_running_loop()), domain)
+        client = self._clients.get(key)
+        if client is None:
+            # Like the requests adapter, retry connection failures only
+            transport = self._transport or httpx.AsyncHTTPTransport(
+                retries=garth.Client.retries, limits=self.limits
+            )
+            client = httpx.AsyncClient(
+                base_url=self.upstream_url or f"https://connectapi.{domain}",
+                headers=USER_AGENT,
+                transport=transport,
+            )
+            self._clients[key] = client
+        return client
+
+    async def aclose(self) -> None:
+        """Close the clients bound to the running event loop."""
+        loop_id = id(asyncio.get_running_loop())
+        for key in [key for key in self._clients if key[0] == loop_id]:
+            await self._clients.pop(key).aclose()
+
+
+shared_transport = SharedTransport()
+shared_async_transport = AsyncTransport()
@@ -36,7 +36,7 @@ interface ActivityContextType {
   selectedActivity: Activity | null;
   activities: Activity[];
   setSelectedActivity: (activity: Activity | null) => void;
-  setActivities: (activities: Activity[]) => void;
+  setActivities: React.Dispatch<React.SetStateAction<Activity[]>>;
 }
 
 const ActivityContext = createContext<ActivityContextType | undefined>(undefined);
@@ -1,4 +1,6 @@
 import React, { createContext, useState, useEffect, useContext, ReactNode } from 'react';
+import { TOKEN_REFRESHED_EVENT } from '../services/apiClient';
+import { logout as endSession } from '../services/authService';
 
 interface AuthContextType {
   token: string | null;
@@ -26,6 +28,17 @@ export const AuthProvider: React.FC<AuthProviderProps> = ({ children }) => {
     }
   }, []);
 
+  useEffect(() => {
+    // Swap in tokens the backend refreshed on our behalf
+    const onTokenRefreshed = (event: Event) => {
+      const refreshedToken = (event as CustomEvent<string>).detail;
+      localStorage.setItem('token', refreshedToken);
+      setToken(refreshedToken);
+    };
+    window.addEventListener(TOKEN_REFRESHED_EVENT, onTokenRefreshed);
+    return () => window.removeEventListener(TOKEN_REFRESHED_EVENT, onTokenRefreshed);
+  }, []);
+
   const login = (newToken: string) => {
     localStorage.setItem('token', newToken);
     setToken(newToken);
@@ -33,6 +46,8 @@ export const AuthProvider: React.FC<AuthProviderProps> = ({ children }) => {
   };
 
   const logout = () => {
+    // Let the backend drop the session so the next login starts afresh
+    endSession(token);
     localStorage.removeItem('token');
     setToken(null);
     setIsAuthenticated(false);
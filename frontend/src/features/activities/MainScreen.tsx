@@ -1,9 +1,9 @@
-import React, { useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { Container, Typography, Box, Button, Snackbar, Alert } from '@mui/material';
 import { useNavigate } from 'react-router-dom';
 import { useAuth } from '../../contexts/AuthContext';
 import { useActivity } from '../../contexts/ActivityContext';
-import { getLatestActivity, getActivities } from '../../services/activityService';
+import { getLatestActivity, getActivities, subscribeToActivities } from '../../services/activityService';
 import { isTokenExpired } from '../../services/authService';
 import ActivityList from './ActivityList';
 import { Activity } from '../../contexts/ActivityContext';
@@ -22,6 +22,28 @@ const MainScreen: React.FC = () => {
     severity: 'error' as 'error' | 'warning' | 'info' | 'success'
   });
 
+  const latestActivityId = useRef<number | null>(null);
+
+  useEffect(() => {
+    if (!token) {
+      return;
+    }
+    // The backend pushes the latest activity first, then every new one
+    return subscribeToActivities(token, (activity) => {
+      const isNew = latestActivityId.current !== null && latestActivityId.current !== activity.activityId;
+      latestActivityId.current = activity.activityId;
+      if (!isNew) {
+        return;
+      }
+      setActivities((current) => [activity, ...current]);
+      setSnackbar({
+        open: true,
+        message: `New activity: ${activity.activityName}`,
+        severity: 'info'
+      });
+    });
+  }, [token, setActivities]);
+
   const handleCloseSnackbar = () => {
     setSnackbar({ ...snackbar, open: false });
   };
@@ -1,14 +1,127 @@
-import { fetchWithAuth } from './apiClient';
+import { API_BASE_URL, fetchWithAuth } from './apiClient';
 import { Activity } from '../contexts/ActivityContext';
 
+// One array per field, nested fields under dotted names such as 'activityType.typeKey'
+type ActivityColumns = Record<string, unknown[]>;
+
+// Rebuild activities from the backend's column-oriented layout
+export function fromColumns(columns: ActivityColumns): Activity[] {
+  const names = Object.keys(columns);
+  const count = names.length ? columns[names[0]].length : 0;
+  const activities: Record<string, any>[] = Array.from({ length: count }, () => ({}));
+
+  for (const name of names) {
+    const path = name.split('.');
+    const leaf = path.pop() as string;
+    columns[name].forEach((value, index) => {
+      if (value === null) {
+        return;
+      }
+      let target = activities[index];
+      for (const part of path) {
+        target = target[part] ?? (target[part] = {});
+      }
+      target[leaf] = value;
+    });
+  }
+  return activities as Activity[];
+}
+
 export async function getLatestActivity(token: string | null) {
   return fetchWithAuth<Activity>('/activities/latest', {
     method: 'GET',
   }, token);
 }
 
-export async function getActivities(token: string | null, num: number = 5) {
-  return fetchWithAuth<Activity[]>(`/activities?num=${num}`, {
+// Filters applied by the backend; dates are YYYY-MM-DD, inclusive
+export interface ActivityFilter {
+  type?: string;
+  startDate?: string;
+  endDate?: string;
+}
+
+export async function getActivities(
+  token: string | null,
+  num: number = 5,
+  filter: ActivityFilter = {}
+) {
+  // Columns avoid repeating every key on every activity of long lists
+  const params = new URLSearchParams({ num: String(num), format: 'columns' });
+  Object.entries(filter).forEach(([name, value]) => {
+    if (value) {
+      params.set(name, value);
+    }
+  });
+  const response = await fetchWithAuth<ActivityColumns>(`/activities?${params}`, {
     method: 'GET',
   }, token);
-}
\ No newline at end of file
+  return { ...response, data: response.data && fromColumns(response.data) };
+}
+
+const STREAM_RETRY_MS = 10000;
+
+// Follow the account's new activities, pushed by the backend as Server-Sent Events.
+// EventSource cannot send the Authorization header, so the stream is read with fetch.
+// The first activity received is the current latest one. Returns a function that stops it.
+export function subscribeToActivities(
+  token: string | null,
+  onActivity: (activity: Activity) => void
+): () => void {
+  const controller = new AbortController();
+  let lastEventId: string | null = null;
+
+  const readStream = async () => {
+    const headers: Record<string, string> = { Authorization: `Bearer ${token}` };
+    if (lastEventId) {
+      headers['Last-Event-ID'] = lastEventId;
+    }
+    const response = await fetch(`${API_BASE_URL}/activities/stream`, {
+      headers,
+      signal: controller.signal,
+    });
+    if (response.status === 401 || !response.body) {
+      controller.abort();
+      return;
+    }
+
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = '';
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) {
+        return;
+      }
+      buffer += value;
+      let end;
+      while ((end = buffer.indexOf('\n\n')) >= 0) {
+        const fields: Record<string, string> = {};
+        for (const line of buffer.slice(0, end).split('\n')) {
+          const colon = line.indexOf(':');
+          if (colon > 0) {
+            fields[line.slice(0, colon)] = line.slice(colon + 1).trim();
+          }
+        }
+        buffer = buffer.slice(end + 2);
+        if (fields.event === 'activity' && fields.data) {
+          lastEventId = fields.id ?? lastEventId;
+          onActivity(JSON.parse(fields.data));
+        }
+      }
+    }
+  };
+
+  (async () => {
+    while (!controller.signal.aborted) {
+      try {
+        await readStream();
+      } catch (error) {
+        if (!controller.signal.aborted) {
+          console.error('Activity stream interrupted:', error);
+        }
+      }
+      await new Promise((resolve) => setTimeout(resolve, STREAM_RETRY_MS));
+    }
+  })();
+
+  return () => controller.abort();
+}
@@ -1,4 +1,8 @@
-const API_BASE_URL = process.env.REACT_APP_BACKEND_URL || 'http://localhost:5000';
+export const API_BASE_URL = process.env.REACT_APP_BACKEND_URL || 'http://localhost:5000';
+
+// The backend refreshes Garmin tokens ahead of expiry and returns the new token in this header
+export const TOKENSTORE_HEADER = 'X-Garmin-Tokenstore';
+export const TOKEN_REFRESHED_EVENT = 'tokenrefreshed';
 
 interface ApiResponse<T> {
   data?: T;
@@ -28,6 +32,11 @@ export async function fetchWithAuth<T>(
 
     const status = response.status;
 
+    const refreshedToken = response.headers.get(TOKENSTORE_HEADER);
+    if (refreshedToken && refreshedToken !== token) {
+      window.dispatchEvent(new CustomEvent(TOKEN_REFRESHED_EVENT, { detail: refreshedToken }));
+    }
+
     // For 204 No Content responses
     if (status === 204) {
       return { status };
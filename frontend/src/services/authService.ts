@@ -16,6 +16,12 @@ export async function login(credentials: AuthCredentials) {
   });
 }
 
+export async function logout(token: string | null) {
+  return fetchWithAuth<void>('/auth', {
+    method: 'DELETE',
+  }, token);
+}
+
 export function isTokenExpired(error: string): boolean {
   return error.toLowerCase().includes('invalid') || 
          error.toLowerCase().includes('expired') || 